@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Check that starting each gmsmetapost subcommand stays within its import time budget."""
+
+import argparse
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+
+logger = logging.getLogger()
+
+GMSMETAPOST: Path = Path(__file__).resolve().parents[1] / "bin" / "gmsmetapost"
+
+# Milliseconds spent importing modules before a subcommand parses its arguments,
+# pandas alone takes about half a second
+IMPORT_TIME_BUDGETS_MS: dict = {
+    "add-metadata": 1000,
+    "assembly-catalog": 150,
+    "blastdb": 300,
+    "candidate-catalog": 300,
+    "check-samplesheet": 150,
+    "cohort-matrix": 300,
+    "concat-tables": 1000,
+    "download-ref-genome": 500,
+    "genome-cache": 150,
+    "join-tables": 1000,
+    "kraken2-report": 1000,
+    "pick-a-genome": 150,
+    "postprocess": 1100,
+    "postprocess-table": 1000,
+    "remove-missing-taxids": 150,
+    "rpm-filter": 1000,
+    "table-io": 1000,
+    "taxonomy": 300,
+    "validate-taxids": 300,
+}
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Check that starting each gmsmetapost subcommand stays within its import time budget",
+        epilog="Example: python import_time_benchmark.py -s 2.0 -c rpm-filter taxonomy",
+    )
+    parser.add_argument(
+        "-c",
+        "--subcommands",
+        metavar="str",
+        nargs="+",
+        choices=list(IMPORT_TIME_BUDGETS_MS),
+        default=list(IMPORT_TIME_BUDGETS_MS),
+        help="Subcommands to measure (default all)",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        metavar="int",
+        type=int,
+        default=3,
+        help="How many times each subcommand is started, the best one is reported",
+    )
+    parser.add_argument(
+        "-s",
+        "--budget-scale",
+        metavar="float",
+        type=float,
+        default=1.0,
+        help="Multiply the budgets by this factor on slower or faster machines",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_import_times(importtime_log: str) -> dict:
+    """Parse the cumulative import times of top level imports from python -X importtime
+
+    Args:
+        importtime_log (str): Standard error of python -X importtime
+
+    Returns:
+        dict: Cumulative microseconds by name of a module imported at top level
+    """
+    import_times: dict = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented under the module importing them
+        if not name.startswith("  "):
+            import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+def measure_import_time(subcommand: str) -> dict:
+    """Start a subcommand with --help and measure the modules it imports
+
+    Args:
+        subcommand (str): Name of the gmsmetapost subcommand
+
+    Returns:
+        dict: Cumulative microseconds by name of a module imported at top level
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", str(GMSMETAPOST), subcommand, "--help"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return parse_import_times(process.stderr)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    over_budget: list[str] = []
+    print("\t".join(["subcommand", "import_ms", "budget_ms", "slowest_import"]))
+    for subcommand in args.subcommands:
+        best: dict = min(
+            (measure_import_time(subcommand) for _ in range(args.repeats)),
+            key=lambda import_times: sum(import_times.values()),
+        )
+        import_ms: float = sum(best.values()) / 1000
+        budget_ms: float = IMPORT_TIME_BUDGETS_MS[subcommand] * args.budget_scale
+        slowest: str = max(best, key=best.get)
+        print(
+            f"{subcommand}\t{import_ms:.1f}\t{budget_ms:.0f}\t"
+            f"{slowest} ({best[slowest] / 1000:.1f} ms)"
+        )
+        if import_ms > budget_ms:
+            over_budget.append(subcommand)
+    if over_budget:
+        logger.error("Over the import time budget: %s", ", ".join(over_budget))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
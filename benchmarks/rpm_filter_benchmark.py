@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""Micro-benchmark RPM calculation and filtering of rpm_filter.py by row count."""
+
+import argparse
+import logging
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import rpm_filter  # noqa: E402
+
+
+logger = logging.getLogger()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark RPM calculation and filtering of rpm_filter.py by row count",
+        epilog="Example: python rpm_filter_benchmark.py -n 1000 10000 100000",
+    )
+    parser.add_argument(
+        "-n",
+        "--row-counts",
+        metavar="int",
+        nargs="+",
+        type=int,
+        default=[1_000, 10_000, 100_000, 1_000_000],
+        help="Numbers of rows in the generated tables",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        metavar="int",
+        type=int,
+        default=5,
+        help="How many times each measurement is repeated, the best one is reported",
+    )
+    parser.add_argument(
+        "--row-wise",
+        action="store_true",
+        help="Also measure the former row-wise DataFrame.apply implementation",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def make_table(num_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Generate a kaiju-like table with geometrically distributed read counts
+
+    Args:
+        num_rows (int): Number of taxa in the table
+        seed (int, optional): Seed for the random number generator. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: Table with a 'reads_count' column
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "taxon_id": np.arange(num_rows).astype(str),
+            "reads_count": rng.geometric(0.01, num_rows),
+        }
+    )
+
+
+def row_wise_rpm(df: pd.DataFrame, col_sum_per_million: float, rpm_value: float):
+    """The former two-pass row-wise implementation, kept for comparison"""
+    df = df.copy()
+    df["RPM"] = df.apply(lambda row: row["reads_count"] * col_sum_per_million, axis=1)
+    df["RPM"] = df.apply(lambda row: round(row["RPM"], 1), axis=1)
+    return df[df["RPM"] >= rpm_value]
+
+
+def time_best(func, repeats: int) -> float:
+    """Get the best wall clock time in seconds of calling func
+
+    Args:
+        func (Callable): Function to measure
+        repeats (int): How many times to call the function
+
+    Returns:
+        float: The smallest measured time in seconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeats))
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    header: list[str] = ["rows", "vectorized_s", "rows_per_s"]
+    if args.row_wise:
+        header += ["row_wise_s", "speedup"]
+    print("\t".join(header))
+    for num_rows in args.row_counts:
+        df: pd.DataFrame = make_table(num_rows)
+        col_sum_per_million: float = df["reads_count"].sum() / 1000000
+        # Threshold at the median keeps roughly half of the rows
+        rpm_value: float = float(df["reads_count"].median() * col_sum_per_million)
+        vectorized: float = time_best(
+            lambda: rpm_filter.add_rpm_column_and_filter(
+                df, col_sum_per_million, rpm_value
+            ),
+            args.repeats,
+        )
+        row: list[str] = [
+            str(num_rows),
+            f"{vectorized:.6f}",
+            f"{num_rows / vectorized:.0f}",
+        ]
+        if args.row_wise:
+            row_wise: float = time_best(
+                lambda: row_wise_rpm(df, col_sum_per_million, rpm_value), 1
+            )
+            row += [f"{row_wise:.6f}", f"{row_wise / vectorized:.1f}x"]
+        print("\t".join(row))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Benchmark reading and writing hits tables through table_io.py against plain pandas."""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import table_io  # noqa: E402
+from schema import HITS_TABLE_SCHEMA  # noqa: E402
+
+
+logger = logging.getLogger()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark reading and writing hits tables through table_io.py against plain pandas",
+        epilog="Example: python table_io_benchmark.py assets/SRR12875570_pe-SRR12875570.tsv -n 1000000",
+    )
+    parser.add_argument(
+        "table",
+        metavar="TABLE",
+        type=Path,
+        help="A hits table which rows are repeated to the wanted size",
+    )
+    parser.add_argument(
+        "-n",
+        "--row-counts",
+        metavar="int",
+        nargs="+",
+        type=int,
+        default=[100_000, 1_000_000],
+        help="Numbers of rows in the generated tables",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        metavar="int",
+        type=int,
+        default=3,
+        help="How many times each measurement is repeated, the best one is reported",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def time_best(func, repeats: int) -> float:
+    """Get the best wall clock time in seconds of calling func
+
+    Args:
+        func (Callable): Function to measure
+        repeats (int): How many times to call the function
+
+    Returns:
+        float: The smallest measured time in seconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeats))
+
+
+def read_with(reader_name: str, tsv: Path) -> pd.DataFrame:
+    """Read a hits table with the given tsv parser of table_io.py
+
+    Args:
+        reader_name (str): Name of the parser in table_io.TSV_READERS
+        tsv (Path): Path to the hits table
+
+    Returns:
+        pd.DataFrame: The hits table
+    """
+    os.environ[table_io.TSV_READER_ENV] = reader_name
+    return table_io.read_table(tsv, index_col=False, dtype=HITS_TABLE_SCHEMA)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    sample: pd.DataFrame = table_io.read_table(
+        args.table, index_col=False, dtype=HITS_TABLE_SCHEMA
+    )
+    readers: list[str] = list(table_io.TSV_READERS)
+    print(
+        "\t".join(
+            ["rows", "to_csv_s", "write_tsv_s", "read_table_s"]
+            + [f"{name}_s" for name in readers]
+        )
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tsv = Path(tmp_dir) / "table.tsv"
+        for num_rows in args.row_counts:
+            df: pd.DataFrame = sample.sample(
+                num_rows, replace=True, random_state=0, ignore_index=True
+            )
+            row: list[str] = [
+                str(num_rows),
+                f"{time_best(lambda: df.to_csv(tsv, sep=chr(9), index=False), args.repeats):.3f}",
+                f"{time_best(lambda: table_io.write_tsv(df, tsv), args.repeats):.3f}",
+                f"{time_best(lambda: pd.read_table(tsv, index_col=False, dtype=HITS_TABLE_SCHEMA), args.repeats):.3f}",
+            ]
+            row += [
+                f"{time_best(lambda: read_with(name, tsv), args.repeats):.3f}"
+                for name in readers
+            ]
+            print("\t".join(row))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,10 @@ import sys
 from pathlib import Path
 import pandas as pd
 
+from schema import HITS_TABLE_SCHEMA, apply_schema
+from table_io import read_table, write_table
+
+
 logger = logging.getLogger()
 
 
@@ -26,7 +30,7 @@ def parse_args(argv=None):
         "output_file",
         metavar="OUTPUT-FILE",
         type=Path,
-        help="Output tsv file name",
+        help="Output file name, the format is chosen by the extension",
     )
     parser.add_argument(
         "-p",
@@ -53,6 +57,34 @@ def parse_args(argv=None):
     return parser.parse_args(argv)
 
 
+def read_input_table(tsv: Path) -> pd.DataFrame:
+    """Read input tsv file into a DataFrame
+
+    Args:
+        tsv (Path): Path to the tsv file
+
+    Returns:
+        pd.DataFrame: DataFrame of the tsv table
+    """
+    return read_table(tsv, index_col=False, dtype=HITS_TABLE_SCHEMA)
+
+
+def add_metadata(df: pd.DataFrame, pairing: str, sample_name: str) -> pd.DataFrame:
+    """Add pairing and sample name columns to a DataFrame
+
+    Args:
+        df (pd.DataFrame): DataFrame to augment with metadata
+        pairing (str): Was the sample single end or paired end
+        sample_name (str): Name of the sample
+
+    Returns:
+        pd.DataFrame: DataFrame with 'pairing' and 'sample_name' columns
+    """
+    df["pairing"] = pairing
+    df["sample_name"] = sample_name
+    return apply_schema(df, HITS_TABLE_SCHEMA)
+
+
 def main(argv=None):
     """Coordinate argument parsing and program execution."""
     args = parse_args(argv)
@@ -63,10 +95,8 @@ def main(argv=None):
         logger.error("The given input file %s was not found!", input_file)
         sys.exit(1)
 
-    df = pd.read_table(input_file, index_col=False)
-    df["pairing"] = args.pairing
-    df["sample_name"] = args.sample_name
-    df.to_csv(args.output_file, index=False, sep="\t")
+    df = add_metadata(read_input_table(input_file), args.pairing, args.sample_name)
+    write_table(df, args.output_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+"""Build and query an offline SQLite catalog of the best genome assembly of each taxid."""
+
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+from atomic_write import create_temp_file
+
+
+logger = logging.getLogger()
+
+# Assembly levels from the most to the least complete, other levels rank last
+ASSEMBLY_LEVELS: tuple = ("Complete Genome", "Chromosome", "Scaffold", "Contig")
+
+# Columns of the NCBI assembly_summary_*.txt files stored in the catalog
+SUMMARY_COLUMNS: tuple = (
+    "assembly_accession",
+    "taxid",
+    "species_taxid",
+    "organism_name",
+    "assembly_level",
+    "seq_rel_date",
+)
+
+INSERT_BATCH_SIZE: int = 10000
+
+# Columns of the assemblies table in insertion order
+CATALOG_COLUMNS: tuple = (
+    "accession",
+    "taxid",
+    "species_taxid",
+    "organism_name",
+    "assembly_level",
+    "level_rank",
+    "submission_date",
+)
+
+SCHEMA: str = """
+CREATE TABLE assemblies (
+    accession TEXT PRIMARY KEY,
+    taxid INTEGER NOT NULL,
+    species_taxid INTEGER,
+    organism_name TEXT,
+    assembly_level TEXT,
+    level_rank INTEGER NOT NULL,
+    submission_date TEXT NOT NULL
+);
+"""
+
+# Created once the rows are inserted, the best assembly is the first row of an index
+# range, of equally new ones the first inserted
+INDEXES: str = """
+CREATE INDEX assemblies_by_taxid ON assemblies (taxid, submission_date DESC);
+CREATE INDEX assemblies_by_taxid_level ON assemblies (taxid, level_rank, submission_date DESC);
+CREATE INDEX assemblies_by_species ON assemblies (species_taxid, submission_date DESC);
+CREATE INDEX assemblies_by_species_level ON assemblies (species_taxid, level_rank, submission_date DESC);
+"""
+
+
+def get_level_rank(assembly_level: str) -> int:
+    """Rank an assembly level by completeness
+
+    Args:
+        assembly_level (str): Assembly level, e.g. 'Complete Genome'
+
+    Returns:
+        int: 0 for the most complete level, len(ASSEMBLY_LEVELS) for unknown levels
+    """
+    try:
+        return ASSEMBLY_LEVELS.index(assembly_level)
+    except ValueError:
+        return len(ASSEMBLY_LEVELS)
+
+
+def open_text(path: Path) -> TextIO:
+    """Open a plain or gzip compressed text file for reading
+
+    Args:
+        path (Path): The file, gzip compressed if it ends with '.gz'
+
+    Returns:
+        TextIO: The opened file
+    """
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf8")
+    return open(path, encoding="utf8")
+
+
+def read_assembly_summary(summary_file: Path) -> Iterator[tuple]:
+    """Read the assemblies of an NCBI assembly_summary_refseq.txt or _genbank.txt file
+
+    Args:
+        summary_file (Path): The assembly summary
+
+    Raises:
+        ValueError: Error raised when the summary has no header line
+
+    Yields:
+        Iterator[tuple]: Accession, taxid, species taxid, organism name, assembly level,
+            level rank and submission date of each assembly
+    """
+    with open_text(summary_file) as summary_handle:
+        header: Optional[list[str]] = None
+        lines = iter(summary_handle)
+        # The header is the last comment line, e.g. '#assembly_accession\tbioproject...'
+        for line in lines:
+            if not line.startswith("#"):
+                break
+            header = line.lstrip("#").strip().split("\t")
+        else:
+            return
+        if header is None:
+            raise ValueError(f"No header line in {summary_file}")
+        columns: list[int] = [header.index(column) for column in SUMMARY_COLUMNS]
+        for line in itertools.chain([line], lines):
+            fields: list[str] = line.rstrip("\n").split("\t")
+            accession, taxid, species_taxid, organism_name, level, date = (
+                fields[column] for column in columns
+            )
+            if not taxid.isdigit():
+                logger.warning(
+                    "Skipping assembly %s with taxid %r in %s",
+                    accession,
+                    taxid,
+                    summary_file,
+                )
+                continue
+            yield (
+                accession,
+                int(taxid),
+                int(species_taxid) if species_taxid.isdigit() else None,
+                organism_name,
+                level,
+                get_level_rank(level),
+                # Dates are e.g. '2004/12/20', stored like datasets dates as '2004-12-20'
+                date.replace("/", "-"),
+            )
+
+
+def read_assembly_data_report(report_file: Path) -> Iterator[tuple]:
+    """Read the assemblies of a datasets assembly_data_report.jsonl file
+
+    Args:
+        report_file (Path): The one line json list report
+
+    Raises:
+        ValueError: Error raised when an assembly has no taxid
+
+    Yields:
+        Iterator[tuple]: Accession, taxid, species taxid, organism name, assembly level,
+            level rank and submission date of each assembly
+    """
+    with open_text(report_file) as report_handle:
+        for single_line_json in report_handle:
+            if not single_line_json.strip():
+                continue
+            record: dict = json.loads(single_line_json)
+            assembly_info: dict = record["assemblyInfo"]
+            # Newer reports nest the taxon under 'organism'
+            organism: dict = record.get("organism", {})
+            level: str = assembly_info.get("assemblyLevel", "")
+            taxid: Optional[str] = record.get("taxId") or organism.get("taxId")
+            if not taxid:
+                raise ValueError(
+                    f"No taxid for {assembly_info['assemblyAccession']} in {report_file}"
+                )
+            if not str(taxid).isdigit():
+                logger.warning(
+                    "Skipping assembly %s with taxid %r in %s",
+                    assembly_info["assemblyAccession"],
+                    taxid,
+                    report_file,
+                )
+                continue
+            yield (
+                assembly_info["assemblyAccession"],
+                int(taxid),
+                None,
+                record.get("organismName") or organism.get("organismName"),
+                level,
+                get_level_rank(level),
+                assembly_info["submissionDate"],
+            )
+
+
+def read_assemblies(dump_file: Path) -> Iterator[tuple]:
+    """Read the assemblies of an assembly summary or a datasets assembly data report
+
+    Args:
+        dump_file (Path): An assembly summary, or a '.jsonl' report, optionally gzip compressed
+
+    Returns:
+        Iterator[tuple]: Accession, taxid, species taxid, organism name, assembly level,
+            level rank and submission date of each assembly
+    """
+    if ".jsonl" in dump_file.suffixes:
+        return read_assembly_data_report(dump_file)
+    return read_assembly_summary(dump_file)
+
+
+def build_catalog(dump_files: list[Path], catalog: Path) -> int:
+    """Build a catalog from assembly dumps, replacing the catalog file when complete
+
+    Args:
+        dump_files (list[Path]): Assembly summaries or datasets assembly data reports,
+            of assemblies listed in several of them the last one is kept, in the
+            insertion order of the first one
+        catalog (Path): The SQLite catalog file
+
+    Returns:
+        int: Number of assemblies in the catalog
+    """
+    catalog.parent.mkdir(parents=True, exist_ok=True)
+    with create_temp_file(catalog) as temp_catalog:
+        pass
+    connection = sqlite3.connect(temp_catalog.name)
+    try:
+        # The file is only renamed into place once complete
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        for dump_file in dump_files:
+            logger.info("Reading assemblies from %s", dump_file)
+            assemblies: Iterator[tuple] = read_assemblies(dump_file)
+            while batch := list(itertools.islice(assemblies, INSERT_BATCH_SIZE)):
+                # An assembly read again is updated in place, keeping the rowid of
+                # its first insertion which breaks ties in best_assembly
+                connection.executemany(
+                    "INSERT INTO assemblies VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (accession) DO UPDATE SET "
+                    + ", ".join(
+                        f"{column} = excluded.{column}"
+                        for column in CATALOG_COLUMNS[1:]
+                    ),
+                    batch,
+                )
+        connection.executescript(INDEXES)
+        connection.commit()
+        (num_assemblies,) = connection.execute(
+            "SELECT COUNT(*) FROM assemblies"
+        ).fetchone()
+    except BaseException:
+        connection.close()
+        os.remove(temp_catalog.name)
+        raise
+    connection.close()
+    os.replace(temp_catalog.name, catalog)
+    logger.info("Wrote %d assemblies into %s", num_assemblies, catalog)
+    return num_assemblies
+
+
+class AssemblyCatalog:
+    """Read-only catalog of assemblies answering which is the best one of a taxid"""
+
+    def __init__(self, catalog: Path):
+        """Open a catalog built by build_catalog
+
+        Args:
+            catalog (Path): The SQLite catalog file
+
+        Raises:
+            FileNotFoundError: Error raised when the catalog does not exist
+        """
+        if not catalog.is_file():
+            raise FileNotFoundError(f"No assembly catalog found: {catalog}")
+        self.connection = sqlite3.connect(
+            f"{catalog.resolve().as_uri()}?mode=ro", uri=True
+        )
+
+    def best_assembly(
+        self, taxid: str, prefer_complete: bool = False
+    ) -> Optional[tuple[str, str, str]]:
+        """Find the newest assembly of a taxid, or of a species if there is none of the taxid
+
+        Args:
+            taxid (str): The taxid
+            prefer_complete (bool, optional): Take the newest of the most complete
+                assemblies instead of the newest one. Defaults to False.
+
+        Returns:
+            Optional[tuple[str, str, str]]: Accession, assembly level and submission date,
+                None when the catalog has no assembly of the taxid or it is not a number
+        """
+        if not taxid.isdigit():
+            logger.warning("Taxid %r is not a number", taxid)
+            return None
+        order: str = "level_rank, " if prefer_complete else ""
+        for column in ("taxid", "species_taxid"):
+            row: Optional[tuple] = self.connection.execute(
+                "SELECT accession, assembly_level, submission_date FROM assemblies "
+                f"WHERE {column} = ? ORDER BY {order}submission_date DESC, rowid LIMIT 1",
+                (int(taxid),),
+            ).fetchone()
+            if row is not None:
+                return row
+        return None
+
+    def best_accessions(self, taxids: list[str], prefer_complete: bool = False) -> dict:
+        """Find the accession of the newest assembly of each taxid
+
+        Args:
+            taxids (list[str]): The taxids
+            prefer_complete (bool, optional): Take the newest of the most complete
+                assemblies instead of the newest one. Defaults to False.
+
+        Returns:
+            dict: Accession by taxid, taxids without assemblies are left out
+        """
+        accessions: dict = {}
+        for taxid in taxids:
+            if best := self.best_assembly(taxid, prefer_complete):
+                accessions[taxid] = best[0]
+        return accessions
+
+    def close(self) -> None:
+        """Close the catalog"""
+        self.connection.close()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build and query an offline catalog of the best genome assembly of each taxid",
+        epilog="Example: python assembly_catalog.py build assemblies.sqlite assembly_summary_refseq.txt",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build", help="Build a catalog from NCBI assembly summaries or datasets reports"
+    )
+    build_parser.add_argument(
+        "catalog",
+        metavar="CATALOG",
+        type=Path,
+        help="The SQLite catalog file, replaced when it exists",
+    )
+    build_parser.add_argument(
+        "dumps",
+        metavar="DUMP",
+        type=Path,
+        nargs="+",
+        help="assembly_summary_*.txt or assembly_data_report.jsonl files, optionally gzip compressed",
+    )
+    best_parser = subparsers.add_parser(
+        "best", help="Write the best assembly of each taxid as a tsv table"
+    )
+    best_parser.add_argument("catalog", metavar="CATALOG", type=Path)
+    best_parser.add_argument("taxids", metavar="TAXID", nargs="+")
+    best_parser.add_argument(
+        "-c",
+        "--prefer-complete",
+        action="store_true",
+        help="Take the newest of the most complete assemblies instead of the newest one",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if args.command == "build":
+        for dump_file in args.dumps:
+            if not dump_file.is_file():
+                logger.error("The given input file %s was not found!", dump_file)
+                sys.exit(1)
+        try:
+            build_catalog(args.dumps, args.catalog)
+        except (KeyError, ValueError) as dump_error_msg:
+            logger.error("Could not read the assemblies:\n%s", dump_error_msg)
+            sys.exit(2)
+        return
+    if not args.catalog.is_file():
+        logger.error("The given input file %s was not found!", args.catalog)
+        sys.exit(1)
+    catalog = AssemblyCatalog(args.catalog)
+    print("taxid\taccession\tassembly_level\tsubmission_date")
+    for taxid in args.taxids:
+        best: Optional[tuple] = catalog.best_assembly(taxid, args.prefer_complete)
+        print("\t".join([taxid, *(best or ("", "", ""))]))
+    catalog.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Create temporary files which are renamed over the files they replace once complete."""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Optional
+
+
+def get_umask() -> int:
+    """Get the file mode creation mask of the process
+
+    Returns:
+        int: The umask, e.g. 0o022
+    """
+    umask: int = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once, as setting the umask to read it is not thread safe
+UMASK: int = get_umask()
+
+
+def create_temp_file(
+    path: Path, mode: str = "w+b", suffix: str = "", encoding: Optional[str] = None
+) -> IO:
+    """Create a temporary file beside a file, to be renamed over it with os.replace
+
+    NamedTemporaryFile creates files only their owner can read, which they stay
+    after the rename. The temporary file gets the permissions a newly created
+    file would get instead.
+
+    Args:
+        path (Path): The file which the temporary file replaces
+        mode (str, optional): Mode of the opened file. Defaults to "w+b".
+        suffix (str, optional): Suffix of the temporary file name. Defaults to "".
+        encoding (Optional[str], optional): Encoding of text mode. Defaults to None.
+
+    Returns:
+        IO: The opened temporary file, which is not deleted when closed
+    """
+    temp_file = tempfile.NamedTemporaryFile(
+        mode,
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=suffix,
+        encoding=encoding,
+        delete=False,
+    )
+    os.chmod(temp_file.name, 0o666 & ~UMASK)
+    return temp_file
@@ -0,0 +1,981 @@
+#!/usr/bin/env python
+"""Read BLAST version 5 nucleotide databases directly from their files."""
+
+import argparse
+import bisect
+import logging
+import mmap
+import shlex
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+import numpy as np
+
+
+logger = logging.getLogger()
+
+# The taxid lookup '.ntf' of a database is an LMDB environment, its named
+# database 'taxid2offset' is keyed by 4-byte taxids
+TAXID_LOOKUP_DB: bytes = b"taxid2offset"
+
+LMDB_MAGIC: int = 0xBEEFC0DE
+# Page header: page number, padding, flags, lower and upper bound of free space
+LMDB_PAGE_HEADER: struct.Struct = struct.Struct("<QHHHH")
+# Node header: low and high half of the data size or child page, flags, key size
+LMDB_NODE_HEADER: struct.Struct = struct.Struct("<HHHH")
+# Database record: padding (the page size in the free database), flags, depth,
+# branch, leaf and overflow page counts, entries and root page
+LMDB_DB: struct.Struct = struct.Struct("<IHHQQQQQ")
+# Meta page body: magic, version, fixed address and map size, followed by the
+# free and main database records, the last page and the transaction id
+LMDB_META: struct.Struct = struct.Struct("<IIQQ")
+LMDB_META_TAIL: struct.Struct = struct.Struct("<QQ")
+LMDB_BRANCH_PAGE: int = 0x01
+LMDB_LEAF_PAGE: int = 0x02
+LMDB_LEAF2_PAGE: int = 0x20
+LMDB_BIGDATA_NODE: int = 0x01
+LMDB_SUBDATA_NODE: int = 0x02
+LMDB_DUPDATA_NODE: int = 0x04
+LMDB_INTEGER_KEY: int = 0x08
+LMDB_INVALID_PAGE: int = 2**64 - 1
+
+# Volume index '.nin': format version, sequence type and, from version 5 on, the
+# volume number, followed by length prefixed strings
+VOLUME_INDEX_INT: struct.Struct = struct.Struct(">i")
+NUCLEOTIDE_SEQUENCE_TYPE: int = 0
+# Sequences are packed four bases per byte, the first base in the two most
+# significant bits, and the two least significant bits of the last byte tell
+# how many bases it holds
+NCBI2NA_BASES: bytes = b"ACGT"
+PACKED_BASES: np.ndarray = np.frombuffer(NCBI2NA_BASES, dtype=np.uint8)[
+    (np.arange(256)[:, None] >> np.array([6, 4, 2, 0])) & 3
+]
+# Ambiguous bases are stored apart from the packed sequence as runs of NCBI4na codes
+NCBI4NA_BASES: bytes = b"-ACMGRSVTWYHKDBN"
+# Seq-id choices which are a Textseq-id, e.g. genbank (4) and other (9, RefSeq)
+TEXTSEQ_ID_CHOICES: tuple = (4, 5, 6, 7, 9, 12, 13, 15, 16, 17, 18, 19)
+LOCAL_ID_CHOICE: int = 0
+GENERAL_ID_CHOICE: int = 10
+GI_ID_CHOICE: int = 11
+# Database tag of the ids of databases built without parsing sequence ids
+ORDINAL_ID_DB: str = "BL_ORD_ID"
+
+FASTA_LINE_LENGTH: int = 80
+
+
+def find_database(blastdb: Path) -> Path:
+    """Find the database of a directory like the pipeline modules do, from its first '.nhr' file
+
+    Args:
+        blastdb (Path): Directory of the database files, or the database path without extension
+
+    Raises:
+        FileNotFoundError: Error raised when the directory has no nucleotide database
+
+    Returns:
+        Path: The database path without extension, e.g. 'blastdb/nt' for 'blastdb/nt.00.nhr'
+    """
+    if not blastdb.is_dir():
+        return blastdb
+    header_files: list[Path] = sorted(blastdb.glob("*.nhr"))
+    if not header_files:
+        raise FileNotFoundError(f"No BLAST nucleotide database found in {blastdb}")
+    return blastdb / header_files[0].name.split(".", 1)[0]
+
+
+def read_lmdb_meta(buffer: mmap.mmap) -> tuple[int, int]:
+    """Read the page size and the main database root of an LMDB environment
+
+    Args:
+        buffer (mmap.mmap): The memory mapped data file of the environment
+
+    Raises:
+        ValueError: Error raised when the file is not an LMDB data file
+
+    Returns:
+        tuple[int, int]: Page size and root page of the main database
+    """
+    page_size: int = 0
+    metas: list[tuple[int, int]] = []
+    for meta_page in range(2):
+        # The page size is only known from the first meta page
+        meta_offset: int = meta_page * page_size + LMDB_PAGE_HEADER.size
+        magic, _, _, _ = LMDB_META.unpack_from(buffer, meta_offset)
+        if magic != LMDB_MAGIC:
+            raise ValueError("Not an LMDB data file")
+        free_db: tuple = LMDB_DB.unpack_from(buffer, meta_offset + LMDB_META.size)
+        main_db: tuple = LMDB_DB.unpack_from(
+            buffer, meta_offset + LMDB_META.size + LMDB_DB.size
+        )
+        _, txnid = LMDB_META_TAIL.unpack_from(
+            buffer, meta_offset + LMDB_META.size + 2 * LMDB_DB.size
+        )
+        page_size = page_size or free_db[0]
+        metas.append((txnid, main_db[-1]))
+    # The meta page of the latest committed transaction is the valid one
+    _, main_root = max(metas)
+    return page_size, main_root
+
+
+def iter_lmdb_leaf_pages(
+    buffer: mmap.mmap, page_size: int, root: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Walk the B+tree of an LMDB database and yield its leaf pages
+
+    Args:
+        buffer (mmap.mmap): The memory mapped data file of the environment
+        page_size (int): Page size of the environment
+        root (int): Root page of the database
+
+    Raises:
+        ValueError: Error raised when a page is neither a branch nor a leaf page
+
+    Yields:
+        Iterator[tuple[int, np.ndarray]]: Byte offset of each leaf page and the
+            offsets of its nodes within the page
+    """
+    if root == LMDB_INVALID_PAGE:
+        return
+    pages: list[int] = [root]
+    while pages:
+        page_offset: int = pages.pop() * page_size
+        _, _, flags, lower, _ = LMDB_PAGE_HEADER.unpack_from(buffer, page_offset)
+        node_offsets: np.ndarray = np.array(
+            struct.unpack_from(
+                f"<{(lower - LMDB_PAGE_HEADER.size) // 2}H",
+                buffer,
+                page_offset + LMDB_PAGE_HEADER.size,
+            ),
+            dtype=np.int64,
+        )
+        if flags & LMDB_LEAF_PAGE:
+            yield page_offset, node_offsets
+        elif flags & LMDB_BRANCH_PAGE:
+            # Child page numbers take the 48 bits of the node's size and flags fields
+            for node_offset in reversed(node_offsets.tolist()):
+                low, high, flags_high, _ = LMDB_NODE_HEADER.unpack_from(
+                    buffer, page_offset + node_offset
+                )
+                pages.append(low | high << 16 | flags_high << 32)
+        else:
+            raise ValueError(f"Unexpected LMDB page type {flags:#x}")
+
+
+def find_lmdb_database(
+    buffer: mmap.mmap, page_size: int, main_root: int, name: bytes
+) -> tuple:
+    """Find the root page of a named database of an LMDB environment
+
+    Args:
+        buffer (mmap.mmap): The memory mapped data file of the environment
+        page_size (int): Page size of the environment
+        main_root (int): Root page of the main database
+        name (bytes): Name of the database
+
+    Raises:
+        KeyError: Error raised when the environment has no such database
+
+    Returns:
+        tuple: The database record, its flags second and its root page last
+    """
+    for page_offset, node_offsets in iter_lmdb_leaf_pages(buffer, page_size, main_root):
+        for node_offset in node_offsets.tolist():
+            node: int = page_offset + node_offset
+            _, _, flags, key_size = LMDB_NODE_HEADER.unpack_from(buffer, node)
+            key_start: int = node + LMDB_NODE_HEADER.size
+            if (
+                flags & LMDB_SUBDATA_NODE
+                and buffer[key_start : key_start + key_size] == name
+            ):
+                return LMDB_DB.unpack_from(buffer, key_start + key_size)
+    raise KeyError(name.decode())
+
+
+def find_lmdb_node(
+    buffer: mmap.mmap, page_size: int, database: tuple, key: bytes
+) -> Optional[int]:
+    """Find the leaf node of a key in an LMDB database by descending its B+tree
+
+    Args:
+        buffer (mmap.mmap): The memory mapped data file of the environment
+        page_size (int): Page size of the environment
+        database (tuple): The database record from find_lmdb_database
+        key (bytes): The key
+
+    Returns:
+        Optional[int]: Byte offset of the node, None when the key is not in the database
+    """
+
+    def get_key(node: int) -> Union[bytes, int]:
+        _, _, _, key_size = LMDB_NODE_HEADER.unpack_from(buffer, node)
+        node_key: bytes = buffer[
+            node + LMDB_NODE_HEADER.size : node + LMDB_NODE_HEADER.size + key_size
+        ]
+        return int.from_bytes(node_key, "little") if integer_keys else node_key
+
+    # Keys are ordered as bytes unless the database has native integer keys
+    integer_keys: bool = bool(database[1] & LMDB_INTEGER_KEY)
+    search_key: Union[bytes, int] = (
+        int.from_bytes(key, "little") if integer_keys else key
+    )
+    page: int = database[-1]
+    while page != LMDB_INVALID_PAGE:
+        page_offset: int = page * page_size
+        _, _, flags, lower, _ = LMDB_PAGE_HEADER.unpack_from(buffer, page_offset)
+        nodes: list[int] = [
+            page_offset + node_offset
+            for node_offset in struct.unpack_from(
+                f"<{(lower - LMDB_PAGE_HEADER.size) // 2}H",
+                buffer,
+                page_offset + LMDB_PAGE_HEADER.size,
+            )
+        ]
+        if flags & LMDB_LEAF_PAGE:
+            keys: list = [get_key(node) for node in nodes]
+            index: int = bisect.bisect_left(keys, search_key)
+            if index < len(keys) and keys[index] == search_key:
+                return nodes[index]
+            return None
+        if not flags & LMDB_BRANCH_PAGE:
+            raise ValueError(f"Unexpected LMDB page type {flags:#x}")
+        # The first node of a branch page leads to all keys below the second one
+        child: int = nodes[
+            bisect.bisect_right([get_key(node) for node in nodes[1:]], search_key)
+        ]
+        low, high, flags_high, _ = LMDB_NODE_HEADER.unpack_from(buffer, child)
+        page = low | high << 16 | flags_high << 32
+    return None
+
+
+def read_lmdb_values(buffer: mmap.mmap, page_size: int, node: int) -> list[bytes]:
+    """Read the values of a leaf node, several if the database has sorted duplicates
+
+    Args:
+        buffer (mmap.mmap): The memory mapped data file of the environment
+        page_size (int): Page size of the environment
+        node (int): Byte offset of the node
+
+    Returns:
+        list[bytes]: The values
+    """
+    low, high, flags, key_size = LMDB_NODE_HEADER.unpack_from(buffer, node)
+    data_size: int = low | high << 16
+    data_start: int = node + LMDB_NODE_HEADER.size + key_size
+    if flags & LMDB_BIGDATA_NODE:
+        # The value is on overflow pages, the node holds their first page number
+        (overflow_page,) = struct.unpack_from("<Q", buffer, data_start)
+        data_start = overflow_page * page_size + LMDB_PAGE_HEADER.size
+    if not flags & LMDB_DUPDATA_NODE:
+        return [buffer[data_start : data_start + data_size]]
+    # Duplicates are the keys of a sub-database, which is either a sub-page
+    # inside the node or a B+tree of its own
+    sub_pages: Iterator[tuple[int, np.ndarray]]
+    if flags & LMDB_SUBDATA_NODE:
+        sub_pages = iter_lmdb_leaf_pages(
+            buffer, page_size, LMDB_DB.unpack_from(buffer, data_start)[-1]
+        )
+    else:
+        sub_pages = iter([(data_start, np.empty(0, dtype=np.int64))])
+    values: list[bytes] = []
+    for page_offset, _ in sub_pages:
+        _, value_size, page_flags, lower, _ = LMDB_PAGE_HEADER.unpack_from(
+            buffer, page_offset
+        )
+        num_values: int = (lower - LMDB_PAGE_HEADER.size) // 2
+        if page_flags & LMDB_LEAF2_PAGE:
+            # Fixed size duplicates are packed one after another, their size in the padding
+            values_start: int = page_offset + LMDB_PAGE_HEADER.size
+            values += [
+                buffer[
+                    values_start
+                    + value * value_size : values_start
+                    + (value + 1) * value_size
+                ]
+                for value in range(num_values)
+            ]
+            continue
+        for node_offset in struct.unpack_from(
+            f"<{num_values}H", buffer, page_offset + LMDB_PAGE_HEADER.size
+        ):
+            _, _, _, value_size = LMDB_NODE_HEADER.unpack_from(
+                buffer, page_offset + node_offset
+            )
+            value_start = page_offset + node_offset + LMDB_NODE_HEADER.size
+            values.append(buffer[value_start : value_start + value_size])
+    return values
+
+
+def read_taxids(database: Path) -> np.ndarray:
+    """Read the taxids which have sequences in a database from its taxid lookup
+
+    Args:
+        database (Path): The database path without extension
+
+    Raises:
+        FileNotFoundError: Error raised when the database has no '.ntf' taxid lookup
+        ValueError: Error raised when the taxid lookup cannot be read
+
+    Returns:
+        np.ndarray: Sorted unique taxids
+    """
+    lookup_file: Path = database.with_name(f"{database.name}.ntf")
+    if not lookup_file.is_file():
+        raise FileNotFoundError(
+            f"No taxid lookup found for the database: {lookup_file}"
+        )
+    with lookup_file.open("rb") as lookup_handle, mmap.mmap(
+        lookup_handle.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        page_size, main_root = read_lmdb_meta(buffer)
+        try:
+            root: int = find_lmdb_database(
+                buffer, page_size, main_root, TAXID_LOOKUP_DB
+            )[-1]
+        except KeyError as missing_db:
+            raise ValueError(f"No {missing_db} database in {lookup_file}") from None
+        # Node headers are followed by the 4-byte taxid keys, gathered page by page
+        data: np.ndarray = np.frombuffer(buffer, dtype=np.uint8)
+        key_bytes: np.ndarray = np.arange(4) + LMDB_NODE_HEADER.size
+        taxids: list[np.ndarray] = [
+            data[(page_offset + node_offsets)[:, None] + key_bytes]
+            .copy()
+            .view("<i4")
+            .ravel()
+            for page_offset, node_offsets in iter_lmdb_leaf_pages(
+                buffer, page_size, root
+            )
+        ]
+        del data
+    return np.unique(np.concatenate(taxids)) if taxids else np.empty(0, np.int32)
+
+
+def read_taxid_oids(database: Path, taxids: list[int]) -> dict:
+    """Find the sequences of taxids in a database from its taxid lookup
+
+    Args:
+        database (Path): The database path without extension
+        taxids (list[int]): The taxids
+
+    Raises:
+        FileNotFoundError: Error raised when the database has no '.ntf' and '.nto' taxid lookup
+        ValueError: Error raised when the taxid lookup cannot be read
+
+    Returns:
+        dict: Sorted OIDs of the sequences of each taxid, empty for taxids not in the database
+    """
+    lookup_file: Path = database.with_name(f"{database.name}.ntf")
+    oids_file: Path = database.with_name(f"{database.name}.nto")
+    for required_file in (lookup_file, oids_file):
+        if not required_file.is_file():
+            raise FileNotFoundError(
+                f"No taxid lookup found for the database: {required_file}"
+            )
+    offsets: dict = {}
+    with lookup_file.open("rb") as lookup_handle, mmap.mmap(
+        lookup_handle.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        page_size, main_root = read_lmdb_meta(buffer)
+        try:
+            lookup_db: tuple = find_lmdb_database(
+                buffer, page_size, main_root, TAXID_LOOKUP_DB
+            )
+        except KeyError as missing_db:
+            raise ValueError(f"No {missing_db} database in {lookup_file}") from None
+        for taxid in taxids:
+            node: Optional[int] = find_lmdb_node(
+                buffer, page_size, lookup_db, struct.pack("<i", taxid)
+            )
+            # Each value is the offset of an OID list in the '.nto' file
+            offsets[taxid] = (
+                []
+                if node is None
+                else [
+                    int.from_bytes(value, "little")
+                    for value in read_lmdb_values(buffer, page_size, node)
+                ]
+            )
+    oids: dict = {}
+    with oids_file.open("rb") as oids_handle, mmap.mmap(
+        oids_handle.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        for taxid, taxid_offsets in offsets.items():
+            # An OID list is its length followed by the OIDs, as 4-byte integers
+            oids[taxid] = np.unique(
+                np.array(
+                    [
+                        oid
+                        for offset in taxid_offsets
+                        for oid in struct.unpack_from(
+                            f"<{struct.unpack_from('<I', buffer, offset)[0]}I",
+                            buffer,
+                            offset + 4,
+                        )
+                    ],
+                    dtype=np.int64,
+                )
+            )
+    return oids
+
+
+def read_oid_taxids(database: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Read the taxids of every sequence of a database from its '.not' file
+
+    Args:
+        database (Path): The database path without extension
+
+    Raises:
+        FileNotFoundError: Error raised when the database has no '.not' file
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: End of the taxids of each OID in the taxids,
+            which start where those of the previous OID end, and the taxids
+    """
+    taxids_file: Path = database.with_name(f"{database.name}.not")
+    if not taxids_file.is_file():
+        raise FileNotFoundError(f"No OID taxids found for the database: {taxids_file}")
+    # The number of OIDs, the end of the taxids of each OID, then the taxids
+    (num_oids,) = np.fromfile(taxids_file, dtype="<u8", count=1)
+    ends: np.ndarray = np.fromfile(
+        taxids_file, dtype="<u8", count=int(num_oids), offset=8
+    ).astype(np.int64)
+    taxids: np.ndarray = np.fromfile(
+        taxids_file, dtype="<i4", offset=8 * (int(num_oids) + 1)
+    )
+    return ends, taxids
+
+
+def find_volumes(database: Path) -> list[Path]:
+    """Find the volumes of a database, from its alias file if it has several
+
+    Args:
+        database (Path): The database path without extension
+
+    Raises:
+        FileNotFoundError: Error raised when the database has no volumes
+
+    Returns:
+        list[Path]: Paths of the volumes without extension, in OID order
+    """
+    alias_file: Path = database.with_name(f"{database.name}.nal")
+    if alias_file.is_file():
+        for line in alias_file.read_text(encoding="utf8").splitlines():
+            if line.startswith("DBLIST"):
+                return [database.parent / name for name in shlex.split(line)[1:]]
+    if database.with_name(f"{database.name}.nin").is_file():
+        return [database]
+    volumes: list[Path] = [
+        index_file.with_suffix("")
+        for index_file in database.parent.glob(f"{database.name}.*.nin")
+    ]
+    if not volumes:
+        raise FileNotFoundError(f"No BLAST nucleotide volumes found for {database}")
+    return sorted(volumes, key=lambda volume: int(volume.suffix[1:]))
+
+
+def parse_ber(data: bytes, position: int = 0) -> tuple[int, Union[bytes, list], int]:
+    """Parse a BER encoded ASN.1 value, like the deflines of the '.nhr' headers
+
+    Args:
+        data (bytes): The encoded data
+        position (int, optional): Position of the value in the data. Defaults to 0.
+
+    Returns:
+        tuple[int, Union[bytes, list], int]: Tag, the content of a primitive value or
+            the tag and content pairs of a constructed value, and the end position
+    """
+    tag: int = data[position]
+    length: int = data[position + 1]
+    position += 2
+    indefinite: bool = length == 0x80
+    if length > 0x80:
+        length_bytes: int = length & 0x7F
+        length = int.from_bytes(data[position : position + length_bytes], "big")
+        position += length_bytes
+    if not tag & 0x20:
+        return tag, data[position : position + length], position + length
+    children: list = []
+    end: int = position + length
+    while (
+        data[position : position + 2] != b"\x00\x00" if indefinite else position < end
+    ):
+        child_tag, child_content, position = parse_ber(data, position)
+        children.append((child_tag, child_content))
+    return tag, children, position + 2 if indefinite else position
+
+
+def format_seqid(seqids: list) -> str:
+    """Format the most informative of the Seq-ids of a defline like blastdbcmd
+
+    Args:
+        seqids (list): Tag and content pairs of the Seq-id choices
+
+    Returns:
+        str: Accession.version, or gi, local or general id, '' for an ordinal id
+    """
+    formatted: list[str] = []
+    for tag, content in seqids:
+        choice: int = tag & 0x1F
+        if choice in TEXTSEQ_ID_CHOICES:
+            # Textseq-id: name [0], accession [1], release [2] and version [3]
+            fields: dict = {
+                field_tag & 0x1F: field_content[0][1]
+                for field_tag, field_content in content[0][1]
+            }
+            if 1 in fields:
+                accession: str = fields[1].decode("ascii")
+                if 3 in fields:
+                    return f"{accession}.{int.from_bytes(fields[3], 'big')}"
+                return accession
+        elif choice == GI_ID_CHOICE:
+            formatted.append(f"gi|{int.from_bytes(content[0][1], 'big')}")
+        elif choice == LOCAL_ID_CHOICE:
+            formatted.append(format_object_id(content[0]))
+        elif choice == GENERAL_ID_CHOICE:
+            # Dbtag: db [0] and tag [1]
+            db: str = content[0][1][0][1][0][1].decode("ascii")
+            if db != ORDINAL_ID_DB:
+                formatted.append(f"gnl|{db}|{format_object_id(content[0][1][1][1][0])}")
+    return formatted[0] if formatted else ""
+
+
+def format_object_id(object_id: tuple) -> str:
+    """Format an Object-id, either an id [0] or a str [1]
+
+    Args:
+        object_id (tuple): Tag and content of the Object-id choice
+
+    Returns:
+        str: The id or the string
+    """
+    tag, content = object_id
+    if tag & 0x1F == 0:
+        return str(int.from_bytes(content[0][1], "big", signed=True))
+    return content[0][1].decode("ascii")
+
+
+def parse_defline(header: bytes) -> tuple[str, str, Optional[int]]:
+    """Parse the first defline of a sequence header
+
+    Args:
+        header (bytes): BER encoded Blast-def-line-set of a sequence
+
+    Returns:
+        tuple[str, str, Optional[int]]: Sequence id, title and taxid
+    """
+    _, deflines, _ = parse_ber(header)
+    seqid: str = ""
+    title: str = ""
+    taxid: Optional[int] = None
+    for tag, content in deflines[0][1]:
+        if tag == 0xA0:
+            title = content[0][1].decode("utf8", errors="replace")
+        elif tag == 0xA1:
+            seqid = format_seqid(content[0][1])
+        elif tag == 0xA2:
+            taxid = int.from_bytes(content[0][1], "big", signed=True)
+    return seqid, title, taxid
+
+
+def apply_ambiguities(bases: np.ndarray, ambiguities: np.ndarray) -> None:
+    """Write the ambiguous bases of a sequence over its unpacked bases
+
+    Args:
+        bases (np.ndarray): Bases of the sequence as ASCII codes
+        ambiguities (np.ndarray): Big-endian 4-byte words of the ambiguity runs, the
+            first one counting the words, with its highest bit set for runs that
+            take two words
+    """
+    num_words: int = int(ambiguities[0])
+    two_word_runs: bool = bool(num_words & 0x80000000)
+    num_words &= 0x7FFFFFFF
+    word: int = 1
+    while word <= num_words:
+        run: int = int(ambiguities[word])
+        base: int = NCBI4NA_BASES[run >> 28]
+        if two_word_runs:
+            length: int = ((run >> 16) & 0xFFF) + 1
+            position: int = int(ambiguities[word + 1])
+            word += 2
+        else:
+            length = ((run >> 24) & 0xF) + 1
+            position = run & 0xFFFFFF
+            word += 1
+        bases[position : position + length] = base
+
+
+def format_fasta(
+    header: str, bases: np.ndarray, line_length: int = FASTA_LINE_LENGTH
+) -> bytes:
+    """Format a sequence as a fasta record
+
+    Args:
+        header (str): Header line without '>'
+        bases (np.ndarray): Bases of the sequence as ASCII codes
+        line_length (int, optional): Bases per line. Defaults to FASTA_LINE_LENGTH.
+
+    Returns:
+        bytes: The fasta record
+    """
+    num_lines, last_line_length = divmod(bases.size, line_length)
+    lines: np.ndarray = np.empty((num_lines, line_length + 1), dtype=np.uint8)
+    lines[:, :line_length] = bases[: num_lines * line_length].reshape(
+        num_lines, line_length
+    )
+    lines[:, line_length] = ord("\n")
+    return b"".join(
+        (
+            f">{header}\n".encode("utf8"),
+            lines.tobytes(),
+            bases[num_lines * line_length :].tobytes(),
+            b"\n" if last_line_length else b"",
+        )
+    )
+
+
+class NucleotideVolume:
+    """Memory mapped volume of a BLAST nucleotide database
+
+    The offsets are views of the '.nin' index, headers and sequences are read from
+    the '.nhr' and '.nsq' files only for the OIDs asked for.
+
+    Attributes:
+        num_oids (int): Number of sequences in the volume
+        title (str): Title of the database
+        date (str): Build date of the database
+        header_offsets (np.ndarray): Start of the header of each OID in '.nhr', and its end
+        sequence_offsets (np.ndarray): Start of the packed sequence of each OID in '.nsq', and its end
+        ambiguity_offsets (np.ndarray): Start of the ambiguities of each OID in '.nsq',
+            which end where the next sequence starts
+    """
+
+    def __init__(self, volume: Path) -> None:
+        """Open and memory map the files of a volume
+
+        Args:
+            volume (Path): The volume path without extension
+
+        Raises:
+            ValueError: Error raised when the volume is not a nucleotide volume
+        """
+        self._maps: dict = {}
+        for extension in ("nin", "nhr", "nsq"):
+            with volume.with_name(f"{volume.name}.{extension}").open("rb") as handle:
+                self._maps[extension] = mmap.mmap(
+                    handle.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        index: mmap.mmap = self._maps["nin"]
+        (version,) = VOLUME_INDEX_INT.unpack_from(index, 0)
+        (sequence_type,) = VOLUME_INDEX_INT.unpack_from(index, 4)
+        if sequence_type != NUCLEOTIDE_SEQUENCE_TYPE:
+            self.close()
+            raise ValueError(f"{volume} is not a nucleotide volume")
+        position: int = 12 if version >= 5 else 8
+        strings: list[str] = []
+        # Title, the LMDB file name from version 5 on and the date
+        for _ in range(3 if version >= 5 else 2):
+            (length,) = VOLUME_INDEX_INT.unpack_from(index, position)
+            strings.append(
+                index[position + 4 : position + 4 + length].rstrip(b"\x00").decode()
+            )
+            position += 4 + length
+        self.title: str = strings[0]
+        self.date: str = strings[-1]
+        (self.num_oids,) = VOLUME_INDEX_INT.unpack_from(index, position)
+        # The number of OIDs is followed by the 8-byte total length, the only
+        # little-endian number, and the 4-byte maximum length
+        position += 16
+        self.header_offsets: np.ndarray = np.frombuffer(
+            index, dtype=">u4", count=self.num_oids + 1, offset=position
+        )
+        position += 4 * (self.num_oids + 1)
+        self.sequence_offsets: np.ndarray = np.frombuffer(
+            index, dtype=">u4", count=self.num_oids + 1, offset=position
+        )
+        position += 4 * (self.num_oids + 1)
+        self.ambiguity_offsets: np.ndarray = np.frombuffer(
+            index, dtype=">u4", count=self.num_oids + 1, offset=position
+        )
+
+    def read_defline(self, oid: int) -> tuple[str, str, Optional[int]]:
+        """Read the first defline of a sequence
+
+        Args:
+            oid (int): OID of the sequence in the volume
+
+        Returns:
+            tuple[str, str, Optional[int]]: Sequence id, title and taxid
+        """
+        return parse_defline(
+            self._maps["nhr"][
+                int(self.header_offsets[oid]) : int(self.header_offsets[oid + 1])
+            ]
+        )
+
+    def read_sequence(self, oid: int) -> np.ndarray:
+        """Unpack a sequence, reading only its own bytes of the memory map
+
+        Args:
+            oid (int): OID of the sequence in the volume
+
+        Returns:
+            np.ndarray: Bases of the sequence as ASCII codes
+        """
+        start: int = int(self.sequence_offsets[oid])
+        ambiguity_start: int = int(self.ambiguity_offsets[oid])
+        end: int = int(self.sequence_offsets[oid + 1])
+        packed: np.ndarray = np.frombuffer(
+            self._maps["nsq"],
+            dtype=np.uint8,
+            count=ambiguity_start - start,
+            offset=start,
+        )
+        if not packed.size:
+            return np.empty(0, dtype=np.uint8)
+        length: int = (packed.size - 1) * 4 + int(packed[-1] & 3)
+        bases: np.ndarray = PACKED_BASES[packed].ravel()[:length]
+        if end > ambiguity_start:
+            apply_ambiguities(
+                bases,
+                np.frombuffer(
+                    self._maps["nsq"],
+                    dtype=">u4",
+                    count=(end - ambiguity_start) // 4,
+                    offset=ambiguity_start,
+                ),
+            )
+        return bases
+
+    def read_lengths(self) -> np.ndarray:
+        """Read the length of every sequence from the last byte of its packed bases
+
+        Returns:
+            np.ndarray: Length of each OID of the volume
+        """
+        starts: np.ndarray = self.sequence_offsets[:-1].astype(np.int64)
+        ends: np.ndarray = self.ambiguity_offsets[: self.num_oids].astype(np.int64)
+        last_bytes: np.ndarray = np.frombuffer(self._maps["nsq"], dtype=np.uint8)[
+            np.maximum(ends - 1, 0)
+        ]
+        return np.where(
+            ends > starts, (ends - starts - 1) * 4 + (last_bytes & 3), 0
+        ).astype(np.int64)
+
+    def close(self) -> None:
+        """Close the memory maps of the volume"""
+        # The offset arrays are views of the index map, which can only be closed without them
+        for offsets in ("header_offsets", "sequence_offsets", "ambiguity_offsets"):
+            self.__dict__.pop(offsets, None)
+        for buffer in self._maps.values():
+            buffer.close()
+
+
+class NucleotideDatabase:
+    """BLAST nucleotide database of one or more memory mapped volumes"""
+
+    def __init__(self, database: Path) -> None:
+        """Open the volumes of a database
+
+        Args:
+            database (Path): The database path without extension
+        """
+        self.database: Path = database
+        self.volumes: list[NucleotideVolume] = [
+            NucleotideVolume(volume) for volume in find_volumes(database)
+        ]
+        # OIDs number the sequences of all volumes one after another
+        self.first_oids: np.ndarray = np.cumsum(
+            [0] + [volume.num_oids for volume in self.volumes]
+        )
+
+    def locate(self, oid: int) -> tuple[NucleotideVolume, int]:
+        """Find the volume of a sequence
+
+        Args:
+            oid (int): OID of the sequence in the database
+
+        Returns:
+            tuple[NucleotideVolume, int]: The volume and the OID in the volume
+        """
+        volume: int = int(np.searchsorted(self.first_oids, oid, side="right")) - 1
+        return self.volumes[volume], oid - int(self.first_oids[volume])
+
+    def read_fasta(self, oid: int) -> tuple[str, bytes]:
+        """Read a sequence as a fasta record, with the header blastdbcmd writes
+
+        Args:
+            oid (int): OID of the sequence in the database
+
+        Returns:
+            tuple[str, bytes]: Sequence id, or the first word of the title when the
+                database has ordinal ids, and the fasta record
+        """
+        volume, volume_oid = self.locate(oid)
+        seqid, title, _ = volume.read_defline(volume_oid)
+        header: str = f"{seqid} {title}" if seqid else title
+        return header.split(maxsplit=1)[0] if header else "", format_fasta(
+            header, volume.read_sequence(volume_oid)
+        )
+
+    def write_fasta(
+        self, oids: list[int], fasta_handle: BinaryIO, threads: int = 1
+    ) -> list[str]:
+        """Write sequences as fasta records in the given order, decoding them on threads
+
+        Args:
+            oids (list[int]): OIDs of the sequences
+            fasta_handle (BinaryIO): File object to write the records to
+            threads (int, optional): Number of sequences decoded at a time. Defaults to 1.
+
+        Returns:
+            list[str]: Sequence id of each record
+        """
+        seqids: list[str] = []
+        # Batches bound the number of decoded records waiting to be written
+        batch_size: int = 4 * threads
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for batch_start in range(0, len(oids), batch_size):
+                for seqid, record in executor.map(
+                    self.read_fasta, oids[batch_start : batch_start + batch_size]
+                ):
+                    seqids.append(seqid)
+                    fasta_handle.write(record)
+        return seqids
+
+    def close(self) -> None:
+        """Close the volumes"""
+        for volume in self.volumes:
+            volume.close()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Read BLAST version 5 nucleotide databases directly from their files",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Examples:\n"
+            "  python blastdb.py taxids blastdb/\n"
+            "  python blastdb.py seqs blastdb/ -t 1511916 -o 1511916.fa"
+        ),
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    taxids_parser = subparsers.add_parser(
+        "taxids", help="Write the taxids which have sequences in a database"
+    )
+    taxids_parser.add_argument(
+        "blastdb",
+        metavar="BLASTDB",
+        type=Path,
+        help="Directory of the database files, or the database path without extension",
+    )
+    seqs_parser = subparsers.add_parser(
+        "seqs", help="Write the sequences of taxids as fasta, like blastdbcmd -taxids"
+    )
+    seqs_parser.add_argument(
+        "blastdb",
+        metavar="BLASTDB",
+        type=Path,
+        help="Directory of the database files, or the database path without extension",
+    )
+    seqs_parser.add_argument(
+        "-t",
+        "--taxids",
+        metavar="TAXID",
+        type=int,
+        nargs="+",
+        required=True,
+        help="Taxids of the sequences",
+    )
+    seqs_parser.add_argument(
+        "-o",
+        "--output-fasta",
+        type=Path,
+        help="Output fasta file (default standard output)",
+    )
+    seqs_parser.add_argument(
+        "-m",
+        "--taxid-map",
+        type=Path,
+        help="Also write the sequence id and taxid of each record, e.g. for pick_a_genome.py --taxid-map",
+    )
+    seqs_parser.add_argument(
+        "-p",
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of threads decoding sequences (default 1)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    database: Path = find_database(args.blastdb)
+    try:
+        if args.command == "taxids":
+            taxids: np.ndarray = read_taxids(database)
+        else:
+            taxid_oids: dict = read_taxid_oids(
+                database, list(dict.fromkeys(args.taxids))
+            )
+    except FileNotFoundError as missing_file_msg:
+        logger.error(missing_file_msg)
+        sys.exit(1)
+    except ValueError as lookup_error_msg:
+        logger.error("Could not read the taxid lookup:\n%s", lookup_error_msg)
+        sys.exit(2)
+    if args.command == "taxids":
+        sys.stdout.write("".join(f"{taxid}\n" for taxid in taxids.tolist()))
+        return
+
+    for taxid, oids in taxid_oids.items():
+        if not oids.size:
+            logger.warning("No sequences of taxid %d in the database", taxid)
+    # Sequences of several of the taxids are written once, in database order
+    oids: list[int] = np.unique(
+        np.concatenate([np.empty(0, dtype=np.int64), *taxid_oids.values()])
+    ).tolist()
+    if not oids:
+        logger.error("No sequences of the taxids found in %s", database)
+        sys.exit(2)
+    try:
+        blastdb = NucleotideDatabase(database)
+    except FileNotFoundError as missing_file_msg:
+        logger.error(missing_file_msg)
+        sys.exit(1)
+    except ValueError as volume_error_msg:
+        logger.error("Could not read the database:\n%s", volume_error_msg)
+        sys.exit(2)
+    if args.output_fasta:
+        with args.output_fasta.open("wb") as fasta_handle:
+            seqids: list[str] = blastdb.write_fasta(oids, fasta_handle, args.threads)
+    else:
+        seqids = blastdb.write_fasta(oids, sys.stdout.buffer, args.threads)
+    blastdb.close()
+    logger.info("Wrote %d sequences of %d taxids", len(oids), len(taxid_oids))
+    if args.taxid_map:
+        seqid_of_oid: dict = dict(zip(oids, seqids))
+        args.taxid_map.write_text(
+            "".join(
+                f"{seqid_of_oid[oid]} {taxid}\n"
+                for taxid, taxid_oid_list in taxid_oids.items()
+                for oid in taxid_oid_list.tolist()
+            ),
+            encoding="utf8",
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
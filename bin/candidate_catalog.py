@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+"""Build and query a catalog of the reference candidates of a BLAST database, keyed by its fingerprint."""
+
+import argparse
+import hashlib
+import itertools
+import logging
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+from atomic_write import create_temp_file
+from blastdb import (
+    NucleotideDatabase,
+    NucleotideVolume,
+    find_database,
+    find_volumes,
+    read_oid_taxids,
+)
+from pick_a_genome import COMPLETENESS_LEVELS, get_completeness_rank
+
+
+logger = logging.getLogger()
+
+INSERT_BATCH_SIZE: int = 10000
+
+# Files of a volume whose stats are part of the database fingerprint
+VOLUME_EXTENSIONS: tuple = ("nin", "nhr", "nsq")
+
+SCHEMA: str = """
+CREATE TABLE candidates (
+    oid INTEGER NOT NULL,
+    taxid INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    accession TEXT NOT NULL,
+    completeness_rank INTEGER NOT NULL
+);
+"""
+
+# Created once the rows are inserted, the best candidate of a taxid is the first row
+# of its index range, like pick_a_genome.py picks the first of the longest records
+# of the most complete level
+INDEXES: str = """
+CREATE INDEX candidates_by_taxid ON candidates (taxid, completeness_rank, length DESC, oid);
+"""
+
+
+class Candidate(NamedTuple):
+    """A sequence of a taxid in a BLAST database"""
+
+    oid: int
+    taxid: int
+    length: int
+    accession: str
+    completeness_rank: int
+
+
+def get_database_fingerprint(database: Path) -> str:
+    """Fingerprint a database without reading its files
+
+    The title and build date in the '.nin' header of every volume change whenever
+    the database is rebuilt, the sizes and modification times of the volume files
+    whenever they are replaced.
+
+    Args:
+        database (Path): The database path without extension
+
+    Returns:
+        str: Hexadecimal SHA-256 of the headers and file stats, in volume order
+    """
+    sha256 = hashlib.sha256()
+    for volume_path in find_volumes(database):
+        volume = NucleotideVolume(volume_path)
+        sha256.update(f"{volume.title}\t{volume.date}\n".encode())
+        volume.close()
+        for extension in VOLUME_EXTENSIONS:
+            stat: os.stat_result = volume_path.with_name(
+                f"{volume_path.name}.{extension}"
+            ).stat()
+            sha256.update(f"{stat.st_size}\t{stat.st_mtime_ns}\n".encode())
+    return sha256.hexdigest()
+
+
+def get_catalog_file(catalog_dir: Path, fingerprint: str) -> Path:
+    """Get the catalog file of a database fingerprint
+
+    Args:
+        catalog_dir (Path): The catalog directory
+        fingerprint (str): Fingerprint of the database
+
+    Returns:
+        Path: The SQLite catalog file
+    """
+    return catalog_dir / f"{fingerprint}.sqlite"
+
+
+def read_candidates(database: Path) -> Iterator[tuple]:
+    """Read the candidates of a database in one pass over its headers
+
+    Args:
+        database (Path): The database path without extension
+
+    Yields:
+        Iterator[tuple]: OID, taxid, length, accession and completeness rank of each
+            sequence and taxid, sequences of several taxids are candidates of each
+    """
+    taxid_ends, taxids = read_oid_taxids(database)
+    blastdb = NucleotideDatabase(database)
+    try:
+        for first_oid, volume in zip(blastdb.first_oids.tolist(), blastdb.volumes):
+            lengths: list[int] = volume.read_lengths().tolist()
+            for volume_oid, length in enumerate(lengths):
+                oid: int = first_oid + volume_oid
+                seqid, title, _ = volume.read_defline(volume_oid)
+                header: str = f"{seqid} {title}" if seqid else title
+                accession: str = header.split(maxsplit=1)[0] if header else ""
+                rank: int = get_completeness_rank(header)
+                taxids_start: int = int(taxid_ends[oid - 1]) if oid else 0
+                for taxid in taxids[taxids_start : taxid_ends[oid]].tolist():
+                    yield oid, taxid, length, accession, rank
+    finally:
+        blastdb.close()
+
+
+def build_catalog(database: Path, catalog_dir: Path) -> Path:
+    """Build the catalog of a database, replacing its catalog file when complete
+
+    Args:
+        database (Path): The database path without extension
+        catalog_dir (Path): The catalog directory
+
+    Returns:
+        Path: The SQLite catalog file
+    """
+    catalog: Path = get_catalog_file(catalog_dir, get_database_fingerprint(database))
+    catalog_dir.mkdir(parents=True, exist_ok=True)
+    with create_temp_file(catalog) as temp_catalog:
+        pass
+    connection = sqlite3.connect(temp_catalog.name)
+    try:
+        # The file is only renamed into place once complete
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        candidates: Iterator[tuple] = read_candidates(database)
+        while batch := list(itertools.islice(candidates, INSERT_BATCH_SIZE)):
+            connection.executemany(
+                "INSERT INTO candidates VALUES (?, ?, ?, ?, ?)", batch
+            )
+        connection.executescript(INDEXES)
+        connection.commit()
+        (num_candidates,) = connection.execute(
+            "SELECT COUNT(*) FROM candidates"
+        ).fetchone()
+    except BaseException:
+        connection.close()
+        os.remove(temp_catalog.name)
+        raise
+    connection.close()
+    os.replace(temp_catalog.name, catalog)
+    logger.info("Wrote %d candidates of %s into %s", num_candidates, database, catalog)
+    return catalog
+
+
+class CandidateCatalog:
+    """Read-only catalog answering which sequence of a database is the best one of a taxid"""
+
+    def __init__(self, catalog_dir: Path, database: Path):
+        """Open the catalog of a database built by build_catalog
+
+        Args:
+            catalog_dir (Path): The catalog directory
+            database (Path): The database path without extension
+
+        Raises:
+            FileNotFoundError: Error raised when there is no catalog of the database
+                as it is now, e.g. when it was rebuilt after the catalog
+        """
+        catalog: Path = get_catalog_file(
+            catalog_dir, get_database_fingerprint(database)
+        )
+        if not catalog.is_file():
+            raise FileNotFoundError(f"No candidate catalog of {database}: {catalog}")
+        self.connection = sqlite3.connect(
+            f"{catalog.resolve().as_uri()}?mode=ro", uri=True
+        )
+
+    def best_candidate(self, taxid: int) -> Optional[Candidate]:
+        """Find the longest sequence of the most complete level of a taxid
+
+        Args:
+            taxid (int): The taxid
+
+        Returns:
+            Optional[Candidate]: The best candidate, None when the taxid has no sequences
+        """
+        row: Optional[tuple] = self.connection.execute(
+            "SELECT oid, taxid, length, accession, completeness_rank FROM candidates "
+            "WHERE taxid = ? ORDER BY completeness_rank, length DESC, oid LIMIT 1",
+            (taxid,),
+        ).fetchone()
+        return Candidate(*row) if row is not None else None
+
+    def close(self) -> None:
+        """Close the catalog"""
+        self.connection.close()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build and query a catalog of the reference candidates of a BLAST database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Examples:\n"
+            "  python candidate_catalog.py build blastdb/ catalogs/\n"
+            "  python candidate_catalog.py best blastdb/ catalogs/ 1511916 -o . -s sample1"
+        ),
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build", help="Build the catalog of a database from its index and headers"
+    )
+    best_parser = subparsers.add_parser(
+        "best",
+        help="Write the best candidate of each taxid as a tsv table, and optionally its sequence",
+    )
+    for subparser in (build_parser, best_parser):
+        subparser.add_argument(
+            "blastdb",
+            metavar="BLASTDB",
+            type=Path,
+            help="Directory of the database files, or the database path without extension",
+        )
+        subparser.add_argument(
+            "catalog_dir",
+            metavar="CATALOG-DIR",
+            type=Path,
+            help="Directory of the catalogs, one '<fingerprint>.sqlite' file per database",
+        )
+    best_parser.add_argument("taxids", metavar="TAXID", type=int, nargs="+")
+    best_parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=Path,
+        help="Also write the best sequence of each taxid as '<taxid>_<sample>.fna' in this directory",
+    )
+    best_parser.add_argument(
+        "-s",
+        "--sample",
+        help="Sample name of the fasta files, '<taxid>.fna' without it",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    database: Path = find_database(args.blastdb)
+    try:
+        if args.command == "build":
+            build_catalog(database, args.catalog_dir)
+            return
+        catalog = CandidateCatalog(args.catalog_dir, database)
+    except FileNotFoundError as missing_file_msg:
+        logger.error(missing_file_msg)
+        sys.exit(1)
+    except ValueError as database_error_msg:
+        logger.error("Could not read the database:\n%s", database_error_msg)
+        sys.exit(2)
+    best_candidates: list[Candidate] = []
+    print("taxid\toid\taccession\tlength\tcompleteness_level")
+    for taxid in args.taxids:
+        best: Optional[Candidate] = catalog.best_candidate(taxid)
+        if best is None:
+            logger.warning("No sequences of taxid %d in the database", taxid)
+            print(f"{taxid}\t\t\t\t")
+            continue
+        best_candidates.append(best)
+        level: str = (
+            COMPLETENESS_LEVELS[best.completeness_rank]
+            if best.completeness_rank < len(COMPLETENESS_LEVELS)
+            else ""
+        )
+        print(f"{taxid}\t{best.oid}\t{best.accession}\t{best.length}\t{level}")
+    catalog.close()
+    if args.output_dir is None:
+        return
+
+    # Only the sequences of the best candidates are decoded
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    blastdb = NucleotideDatabase(database)
+    for best in best_candidates:
+        fasta: Path = args.output_dir / (
+            f"{best.taxid}_{args.sample}.fna" if args.sample else f"{best.taxid}.fna"
+        )
+        fasta.write_bytes(blastdb.read_fasta(best.oid)[1])
+        logger.info("Wrote %s of taxid %d into %s", best.accession, best.taxid, fasta)
+    blastdb.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
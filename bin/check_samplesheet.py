@@ -21,7 +21,7 @@ class RowChecker:
 
     """
 
-    VALID_FORMATS = (".tsv",)
+    VALID_FORMATS = (".tsv", ".tsv.gz", ".tsv.zst")
 
     def __init__(
         self,
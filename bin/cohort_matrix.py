@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+"""Build an incremental sparse sample x taxid matrix of RPM and reads counts from final hits tables."""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import logging
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple, Optional
+import numpy as np
+from file_lock import locked
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger()
+
+# Classifiers of the final hits tables, stored by their index in this tuple
+CLASSIFIERS: tuple = ("kaiju", "kraken2", "centrifuge")
+
+# Values of the matrix, named after the columns of the final hits tables
+VALUE_COLUMNS: tuple = ("rpm", "reads_count")
+
+# One non-zero cell per record, the records of a sample are contiguous and sorted by RPM
+ENTRY_DTYPE = np.dtype(
+    [
+        ("taxid_index", "<i4"),
+        ("classifier", "u1"),
+        ("rpm", "<f8"),
+        ("reads_count", "<i8"),
+    ]
+)
+
+# Files of a cohort directory
+ENTRIES_FILE: str = "entries.bin"
+LOCK_FILE: str = "cohort.lock"
+SAMPLES_FILE: str = "samples.tsv"
+TAXIDS_FILE: str = "taxids.tsv"
+SAMPLES_COLUMNS: tuple = ("sample_name", "offset", "count", "source")
+TAXIDS_COLUMNS: tuple = ("taxid", "taxon_name")
+
+
+class CohortSample(NamedTuple):
+    """Row of the matrix, i.e. the slice of the entries file holding one sample"""
+
+    sample_name: str
+    offset: int
+    count: int
+    source: str
+
+
+class Cohort(NamedTuple):
+    """Row and column indices of a cohort and its memory-mapped entries"""
+
+    samples: list[CohortSample]
+    taxids: list[int]
+    taxon_names: list[str]
+    entries: np.ndarray
+
+    def top_taxa(
+        self, sample: CohortSample, top_n: int, classifier: Optional[str] = None
+    ) -> np.ndarray:
+        """Get the entries of the top N taxa of a sample by RPM
+
+        The entries of a sample are stored by decreasing RPM, so only the beginning
+        of the sample's slice has to be read. A taxon found by several classifiers
+        counts once, with the entry of its highest RPM.
+
+        Args:
+            sample (CohortSample): The sample
+            top_n (int): Number of taxa to get
+            classifier (Optional[str], optional): Only use the entries of this classifier. Defaults to None.
+
+        Returns:
+            np.ndarray: At most top_n entries of ENTRY_DTYPE
+        """
+        sample_entries: np.ndarray = self.entries[
+            sample.offset : sample.offset + sample.count
+        ]
+        # Grow the read prefix until it holds enough distinct taxa
+        prefix_length: int = top_n
+        while True:
+            prefix: np.ndarray = sample_entries[:prefix_length]
+            if classifier is not None:
+                prefix = prefix[prefix["classifier"] == CLASSIFIERS.index(classifier)]
+            _, first_rows = np.unique(prefix["taxid_index"], return_index=True)
+            if len(first_rows) >= top_n or prefix_length >= len(sample_entries):
+                return prefix[np.sort(first_rows)[:top_n]]
+            prefix_length *= 2
+
+    def to_csr(
+        self, classifier: str, value: str
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, tuple[int, int]]:
+        """Get one classifier's values as a compressed sparse row matrix
+
+        Args:
+            classifier (str): Name of the classifier, e.g. kraken2
+            value (str): One of VALUE_COLUMNS
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, tuple[int, int]]: data, indices,
+                indptr and shape as taken by scipy.sparse.csr_matrix
+        """
+        counts: np.ndarray = np.array(
+            [sample.count for sample in self.samples], dtype=np.int64
+        )
+        rows: np.ndarray = np.repeat(np.arange(len(self.samples)), counts)
+        entries: np.ndarray = self.entries[: counts.sum()]
+        selected: np.ndarray = entries["classifier"] == CLASSIFIERS.index(classifier)
+        rows = rows[selected]
+        entries = entries[selected]
+        # Entries are grouped by sample already, sort the columns within each row
+        order: np.ndarray = np.lexsort((entries["taxid_index"], rows))
+        indptr: np.ndarray = np.zeros(len(self.samples) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.samples)), out=indptr[1:])
+        return (
+            entries[value][order],
+            entries["taxid_index"][order],
+            indptr,
+            (len(self.samples), len(self.taxids)),
+        )
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build an incremental sparse sample x taxid matrix of RPM and reads counts",
+        epilog="Example: python cohort_matrix.py add cohort SRR12875570_pe-SRR12875570.tsv SRR12875558_se-SRR12875558.tsv",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser(
+        "add", help="Append the final hits tables of samples to a cohort"
+    )
+    add_parser.add_argument(
+        "cohort",
+        metavar="COHORT",
+        type=Path,
+        help="Cohort directory, created when missing",
+    )
+    add_parser.add_argument(
+        "tables",
+        metavar="TABLE",
+        type=Path,
+        nargs="+",
+        help="Final hits tables, one per sample",
+    )
+    top_parser = subparsers.add_parser(
+        "top", help="Write the top N taxa of every sample by RPM"
+    )
+    top_parser.add_argument("cohort", metavar="COHORT", type=Path)
+    top_parser.add_argument(
+        "-n",
+        "--top-n",
+        metavar="int",
+        type=int,
+        default=10,
+        help="Number of taxa per sample (default 10)",
+    )
+    top_parser.add_argument(
+        "-c",
+        "--classifier",
+        choices=CLASSIFIERS,
+        help="Only rank the taxa found by this classifier",
+    )
+    top_parser.add_argument(
+        "-o",
+        "--output",
+        metavar="Path",
+        type=Path,
+        default=Path("top_taxa.tsv"),
+        help="The output tsv file (default top_taxa.tsv)",
+    )
+    export_parser = subparsers.add_parser(
+        "export", help="Write one classifier's values as a MatrixMarket file"
+    )
+    export_parser.add_argument("cohort", metavar="COHORT", type=Path)
+    export_parser.add_argument("-c", "--classifier", choices=CLASSIFIERS, required=True)
+    export_parser.add_argument(
+        "-v", "--value", choices=VALUE_COLUMNS, default="rpm", help="(default rpm)"
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        metavar="Path",
+        type=Path,
+        default=Path("matrix.mtx"),
+        help="The MatrixMarket file, rows and columns are ordered as in samples.tsv and taxids.tsv (default matrix.mtx)",
+    )
+    return parser.parse_args(argv)
+
+
+def read_index(index_file: Path, columns: tuple) -> list[dict]:
+    """Read a row or column index file of a cohort
+
+    Args:
+        index_file (Path): samples.tsv or taxids.tsv of a cohort
+        columns (tuple): Expected columns of the file
+
+    Returns:
+        list[dict]: Rows of the file, empty when the file does not exist
+    """
+    if not index_file.is_file():
+        return []
+    with index_file.open(newline="") as in_handle:
+        text: str = in_handle.read()
+    # A last line without line break is still being appended
+    if not text.endswith("\n"):
+        text = text[: text.rfind("\n") + 1]
+    with io.StringIO(text, newline="") as in_handle:
+        reader = csv.DictReader(in_handle, delimiter="\t")
+        if tuple(reader.fieldnames or ()) != columns:
+            raise ValueError(f"Expected columns {', '.join(columns)} in {index_file}")
+        return list(reader)
+
+
+def append_index(index_file: Path, columns: tuple, rows: list[tuple]) -> None:
+    """Append rows to a row or column index file of a cohort
+
+    Args:
+        index_file (Path): samples.tsv or taxids.tsv of a cohort
+        columns (tuple): Columns of the file, written as the header of a new file
+        rows (list[tuple]): Rows to append
+    """
+    write_header: bool = not index_file.is_file()
+    with index_file.open("a", newline="") as out_handle:
+        writer = csv.writer(out_handle, delimiter="\t", lineterminator="\n")
+        if write_header:
+            writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def load_cohort(cohort_dir: Path) -> Cohort:
+    """Load the indices of a cohort and memory-map its entries
+
+    Entries written after the last sample in samples.tsv, e.g. by an interrupted
+    or a running add, are not part of the cohort.
+
+    Args:
+        cohort_dir (Path): Cohort directory
+
+    Raises:
+        ValueError: Error raised when an index file has unexpected columns
+
+    Returns:
+        Cohort: The cohort, empty when the directory has no samples yet
+    """
+    samples: list[CohortSample] = [
+        CohortSample(
+            row["sample_name"], int(row["offset"]), int(row["count"]), row["source"]
+        )
+        for row in read_index(cohort_dir / SAMPLES_FILE, SAMPLES_COLUMNS)
+    ]
+    taxid_rows: list[dict] = read_index(cohort_dir / TAXIDS_FILE, TAXIDS_COLUMNS)
+    entries_file: Path = cohort_dir / ENTRIES_FILE
+    if entries_file.is_file() and entries_file.stat().st_size:
+        entries: np.ndarray = np.memmap(entries_file, dtype=ENTRY_DTYPE, mode="r")
+    else:
+        entries: np.ndarray = np.empty(0, dtype=ENTRY_DTYPE)
+    return Cohort(
+        samples=samples,
+        taxids=[int(row["taxid"]) for row in taxid_rows],
+        taxon_names=[row["taxon_name"] for row in taxid_rows],
+        entries=entries,
+    )
+
+
+def get_sample_name(df: pd.DataFrame, table: Path) -> str:
+    """Get the sample name of a final hits table
+
+    Args:
+        df (pd.DataFrame): The final hits table
+        table (Path): Path to the table
+
+    Returns:
+        str: The 'sample_name' column added by add_metadata.py, the file name without
+            extensions when the column is missing or empty
+    """
+    if "sample_name" in df.columns and df["sample_name"].notna().any():
+        return str(df["sample_name"].dropna().iloc[0])
+    return table.name.split(".")[0]
+
+
+def table_to_entries(
+    df: pd.DataFrame, taxid_columns: dict, new_taxids: list[tuple]
+) -> np.ndarray:
+    """Convert a final hits table into cohort entries sorted by decreasing RPM
+
+    Args:
+        df (pd.DataFrame): The final hits table
+        taxid_columns (dict): Column index by taxid, new taxids are added to it
+        new_taxids (list[tuple]): Taxid and taxon name of every added taxid are appended to it
+
+    Returns:
+        np.ndarray: Entries of ENTRY_DTYPE
+    """
+    # Taxids are missing e.g. for unclassified reads
+    taxids: pd.Series = df["taxid"]
+    df = df[taxids.notna() & df["classifier"].isin(CLASSIFIERS)]
+    taxids = taxids[df.index].astype(np.int64)
+    for taxid, taxon_name in zip(taxids, df["taxon_name"]):
+        if taxid not in taxid_columns:
+            taxid_columns[taxid] = len(taxid_columns)
+            new_taxids.append((taxid, taxon_name))
+    entries: np.ndarray = np.empty(len(df), dtype=ENTRY_DTYPE)
+    entries["taxid_index"] = taxids.map(taxid_columns).to_numpy()
+    entries["classifier"] = df["classifier"].map(CLASSIFIERS.index).to_numpy()
+    entries["rpm"] = df["rpm"].to_numpy()
+    entries["reads_count"] = df["reads_count"].to_numpy()
+    return entries[np.argsort(-entries["rpm"], kind="stable")]
+
+
+def add_tables(cohort_dir: Path, tables: list[Path]) -> int:
+    """Append samples to a cohort without rewriting the existing samples
+
+    Tables are read one at a time. The entries are appended first and a sample
+    becomes part of the cohort only once its row is appended to samples.tsv.
+    Concurrent adds to the same cohort wait for each other on its lock file.
+
+    Args:
+        cohort_dir (Path): Cohort directory, created when missing
+        tables (list[Path]): Final hits tables, one per sample
+
+    Raises:
+        ValueError: Error raised when a sample is already in the cohort
+
+    Returns:
+        int: Number of samples in the cohort
+    """
+    # Only adding samples reads tables, querying a cohort does not import pandas
+    from schema import HITS_TABLE_SCHEMA
+    from table_io import read_table
+
+    cohort_dir.mkdir(parents=True, exist_ok=True)
+    with locked(cohort_dir / LOCK_FILE):
+        cohort: Cohort = load_cohort(cohort_dir)
+        sample_names: set[str] = {sample.sample_name for sample in cohort.samples}
+        taxid_columns: dict = {
+            taxid: column for column, taxid in enumerate(cohort.taxids)
+        }
+        offset: int = (
+            cohort.samples[-1].offset + cohort.samples[-1].count
+            if cohort.samples
+            else 0
+        )
+        del cohort
+        with (cohort_dir / ENTRIES_FILE).open("ab") as entries_handle:
+            # Drop entries of an interrupted run
+            entries_handle.truncate(offset * ENTRY_DTYPE.itemsize)
+            for table in tables:
+                df: pd.DataFrame = read_table(
+                    table, index_col=False, dtype=HITS_TABLE_SCHEMA
+                )
+                sample_name: str = get_sample_name(df, table)
+                if sample_name in sample_names:
+                    raise ValueError(f"Sample {sample_name} is already in {cohort_dir}")
+                new_taxids: list[tuple] = []
+                entries: np.ndarray = table_to_entries(df, taxid_columns, new_taxids)
+                append_index(cohort_dir / TAXIDS_FILE, TAXIDS_COLUMNS, new_taxids)
+                entries.tofile(entries_handle)
+                entries_handle.flush()
+                append_index(
+                    cohort_dir / SAMPLES_FILE,
+                    SAMPLES_COLUMNS,
+                    [(sample_name, offset, len(entries), str(table))],
+                )
+                logger.info("Added %s with %d entries", sample_name, len(entries))
+                sample_names.add(sample_name)
+                offset += len(entries)
+    return len(sample_names)
+
+
+def write_top_taxa(
+    cohort: Cohort, top_n: int, classifier: Optional[str], output: Path
+) -> None:
+    """Write the top N taxa of every sample of a cohort into a tsv file
+
+    Args:
+        cohort (Cohort): The cohort
+        top_n (int): Number of taxa per sample
+        classifier (Optional[str]): Only rank the taxa found by this classifier
+        output (Path): The output tsv file
+    """
+    with output.open("w", newline="") as out_handle:
+        writer = csv.writer(out_handle, delimiter="\t", lineterminator="\n")
+        writer.writerow(
+            ("sample_name", "rank", "taxid", "taxon_name", "classifier") + VALUE_COLUMNS
+        )
+        for sample in cohort.samples:
+            for rank, entry in enumerate(
+                cohort.top_taxa(sample, top_n, classifier), start=1
+            ):
+                column: int = int(entry["taxid_index"])
+                writer.writerow(
+                    (
+                        sample.sample_name,
+                        rank,
+                        cohort.taxids[column],
+                        cohort.taxon_names[column],
+                        CLASSIFIERS[entry["classifier"]],
+                        round(float(entry["rpm"]), 1),
+                        int(entry["reads_count"]),
+                    )
+                )
+
+
+def write_matrix_market(
+    csr: tuple[np.ndarray, np.ndarray, np.ndarray, tuple[int, int]], output: Path
+) -> None:
+    """Write a compressed sparse row matrix as a MatrixMarket coordinate file
+
+    Args:
+        csr (tuple[np.ndarray, np.ndarray, np.ndarray, tuple[int, int]]): data, indices,
+            indptr and shape of the matrix
+        output (Path): The MatrixMarket file
+    """
+    data, indices, indptr, shape = csr
+    rows: np.ndarray = np.repeat(np.arange(shape[0]), np.diff(indptr))
+    field: str = "integer" if np.issubdtype(data.dtype, np.integer) else "real"
+    with output.open("w") as out_handle:
+        out_handle.write(f"%%MatrixMarket matrix coordinate {field} general\n")
+        out_handle.write(f"{shape[0]} {shape[1]} {len(data)}\n")
+        # MatrixMarket indices are 1-based
+        np.savetxt(
+            out_handle,
+            np.column_stack((rows + 1, indices + 1, data)),
+            fmt=("%d", "%d", "%d" if field == "integer" else "%.1f"),
+        )
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if args.command == "add":
+        for table in args.tables:
+            if not table.is_file():
+                logger.error("The given input file %s was not found!", table)
+                sys.exit(1)
+        try:
+            add_tables(args.cohort, args.tables)
+        except ValueError as add_error_msg:
+            logger.error(add_error_msg)
+            sys.exit(2)
+        return
+
+    if not (args.cohort / SAMPLES_FILE).is_file():
+        logger.error("The given cohort %s has no samples!", args.cohort)
+        sys.exit(1)
+    cohort: Cohort = load_cohort(args.cohort)
+    if args.command == "top":
+        write_top_taxa(cohort, args.top_n, args.classifier, args.output)
+    else:
+        write_matrix_market(cohort.to_csr(args.classifier, args.value), args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
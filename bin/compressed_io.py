@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Open tsv tables as streams, compressed with gzip or zstd by file extension."""
+
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+# Compression of tsv tables by file extension, e.g. 'table.tsv.gz'
+COMPRESSIONS: dict = {
+    ".gz": "gzip",
+    ".zst": "zstd",
+}
+
+# Compressed output is cut into blocks which are compressed in parallel into
+# consecutive gzip members or zstd frames, readable by gzip, zstd and pigz
+COMPRESSION_BLOCK_SIZE: int = 4 * 1024 * 1024
+COMPRESSION_LEVELS: dict = {"gzip": 6, "zstd": 3}
+
+# Environment variable with the number of compression threads, all CPUs by default
+COMPRESSION_THREADS_ENV: str = "GMSMETAPOST_COMPRESSION_THREADS"
+
+# Tsv tables are written through a buffer of WRITE_BUFFER_SIZE bytes
+WRITE_BUFFER_SIZE: int = 8 * 1024 * 1024
+
+
+def split_compression(path: Union[Path, str]) -> tuple[Path, Optional[str]]:
+    """Split the compression extension off a path
+
+    Args:
+        path (Union[Path, str]): Path to a file, e.g. 'table.tsv.gz'
+
+    Returns:
+        tuple[Path, Optional[str]]: The path without the compression extension and the
+            compression extension, None for uncompressed files
+    """
+    path = Path(path)
+    if path.suffix.lower() in COMPRESSIONS:
+        return path.with_suffix(""), path.suffix
+    return path, None
+
+
+def get_compression_threads() -> int:
+    """Get the number of threads for compressing output
+
+    Returns:
+        int: Value of the environment variable in COMPRESSION_THREADS_ENV, or the number of CPUs
+    """
+    threads: str = os.environ.get(COMPRESSION_THREADS_ENV, "")
+    return (
+        int(threads) if threads.isdigit() and int(threads) > 0 else os.cpu_count() or 1
+    )
+
+
+def get_compressor(compression: str) -> Callable[[bytes], bytes]:
+    """Get a function compressing a block into a self-contained gzip member or zstd frame
+
+    Args:
+        compression (str): 'gzip' or 'zstd'
+
+    Raises:
+        ImportError: Error raised when neither zstandard nor pyarrow is installed for zstd
+
+    Returns:
+        Callable[[bytes], bytes]: The compression function, which releases the GIL
+    """
+    level: int = COMPRESSION_LEVELS[compression]
+    if compression == "gzip":
+        return lambda block: gzip.compress(block, compresslevel=level, mtime=0)
+    if find_spec("zstandard"):
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress
+    if find_spec("pyarrow"):
+        import pyarrow as pa
+
+        codec = pa.Codec("zstd", compression_level=level)
+        return lambda block: codec.compress(block, asbytes=True)
+    raise ImportError(
+        "Reading or writing zstd compressed tables requires zstandard or pyarrow"
+    )
+
+
+class BlockCompressor(io.RawIOBase):
+    """Writable binary stream compressing blocks on a thread pool and writing them in order"""
+
+    def __init__(
+        self,
+        raw: io.BufferedIOBase,
+        compress: Callable[[bytes], bytes],
+        threads: int,
+        block_size: int = COMPRESSION_BLOCK_SIZE,
+    ) -> None:
+        """Start compressing into a binary stream
+
+        Args:
+            raw (io.BufferedIOBase): The stream for the compressed data, closed with this stream
+            compress (Callable[[bytes], bytes]): Function compressing one block
+            threads (int): Number of compression threads
+            block_size (int, optional): Size of the uncompressed blocks. Defaults to COMPRESSION_BLOCK_SIZE.
+        """
+        super().__init__()
+        self._raw: io.BufferedIOBase = raw
+        self._compress: Callable[[bytes], bytes] = compress
+        self._threads: int = threads
+        self._block_size: int = block_size
+        self._block: bytearray = bytearray()
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._pending: deque = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._block += data
+        while len(self._block) >= self._block_size:
+            self._submit(bytes(self._block[: self._block_size]))
+            del self._block[: self._block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        # Bound the memory held by compressed blocks waiting to be written
+        while len(self._pending) >= 2 * self._threads:
+            self._raw.write(self._pending.popleft().result())
+        self._pending.append(self._executor.submit(self._compress, block))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._block or not self._pending:
+                self._submit(bytes(self._block))
+                self._block.clear()
+            while self._pending:
+                self._raw.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown()
+            self._raw.close()
+            super().close()
+
+
+def open_table(path: Union[Path, str], mode: str = "r"):
+    """Open a tsv table, compressed or not, as a stream
+
+    Compressed tables are decompressed while they are read. Output is compressed
+    on COMPRESSION_THREADS_ENV threads when the path ends with a compression extension.
+
+    Args:
+        path (Union[Path, str]): Path to the table
+        mode (str, optional): 'r' or 'w' for text, 'rb' or 'wb' for bytes. Defaults to "r".
+
+    Raises:
+        ImportError: Error raised when neither zstandard nor pyarrow is installed for zstd
+
+    Returns:
+        io.IOBase: The opened stream
+    """
+    _, suffix = split_compression(path)
+    binary_mode: str = mode[0] + "b"
+    if suffix is None:
+        handle = open(
+            path, binary_mode, buffering=WRITE_BUFFER_SIZE if mode[0] == "w" else -1
+        )
+    elif binary_mode == "wb":
+        compression: str = COMPRESSIONS[suffix.lower()]
+        handle = io.BufferedWriter(
+            BlockCompressor(
+                open(path, "wb"),
+                get_compressor(compression),
+                get_compression_threads(),
+            ),
+            buffer_size=COMPRESSION_BLOCK_SIZE,
+        )
+    elif COMPRESSIONS[suffix.lower()] == "gzip":
+        handle = gzip.open(path, "rb")
+    elif find_spec("zstandard"):
+        import zstandard
+
+        handle = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(
+                open(path, "rb"), read_across_frames=True, closefd=True
+            )
+        )
+    elif find_spec("pyarrow"):
+        import pyarrow as pa
+
+        handle = pa.CompressedInputStream(pa.OSFile(str(path)), "zstd")
+    else:
+        raise ImportError(
+            "Reading or writing zstd compressed tables requires zstandard or pyarrow"
+        )
+    if "b" in mode:
+        return handle
+    return io.TextIOWrapper(handle, encoding="utf-8", newline="")
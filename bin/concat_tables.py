@@ -7,6 +7,9 @@ import sys
 from pathlib import Path
 import pandas as pd
 
+from schema import HITS_TABLE_SCHEMA, apply_schema, get_joined_schema
+from table_io import read_table, write_table
+
 
 logger = logging.getLogger()
 
@@ -34,50 +37,26 @@ RENAMING_MAPPINGS: dict = {
     },
 }
 
-DATA_TYPES: dict = {
-    "centrifuge": {
-        "name": str,
-        "taxID": str,
-        "taxRank": str,
-        "genomeSize": int,
-        "numReads": int,
-        "reads_count": int,
-        "abundance": float,
-        "RPM": float,
-        "cami_taxid": str,
-        "cami_rank": str,
-        "cami_taxpath": str,
-        "cami_taxpathsn": str,
-        "cami_percentage": float,
-    },
-    "kaiju": {
-        "file": str,
-        "percent": float,
-        "reads_count": int,
-        "taxon_id": str,
-        "taxon_name": str,
-        "RPM": float,
-        "cami_taxid": str,
-        "cami_rank": str,
-        "cami_taxpath": str,
-        "cami_taxpathsn": str,
-        "cami_percentage": float,
-    },
-    "kraken2": {
-        "percentage_fragments_covered": float,
-        "num_fragments_covered": int,
-        "reads_count": int,
-        "rank_code": str,
-        "taxid": str,
-        "sci_name": str,
-        "RPM": float,
-        "cami_taxid": str,
-        "cami_rank": str,
-        "cami_taxpath": str,
-        "cami_taxpathsn": str,
-        "cami_percentage": float,
-    },
-}
+# Column order of the concatenated table
+OUTPUT_COLUMNS: list[str] = [
+    "taxon_name",
+    "rpm",
+    "taxid",
+    "taxonomic_rank",
+    "classifier",
+    "centrifuge_genome_size",
+    "centrifuge_num_reads",
+    "centrifuge_abundance",
+    "kaiju_percent",
+    "kraken2_percentage_fragments_covered",
+    "kraken2_num_fragments_covered",
+    "reads_count",
+    "cami_taxid",
+    "cami_rank",
+    "cami_taxpath",
+    "cami_taxpathsn",
+    "cami_percentage",
+]
 
 
 def parse_args(argv=None):
@@ -113,7 +92,7 @@ def parse_args(argv=None):
         metavar="Path",
         type=Path,
         default=Path("concatenated.tsv"),
-        help="The output tsv file name for the concatenated table",
+        help="The output file name for the concatenated table, the format is chosen by the extension",
     )
     parser.add_argument(
         "-l",
@@ -135,10 +114,10 @@ def read_classifier(classifier: tuple[Path, str]) -> tuple[pd.DataFrame, str]:
         pd.DataFrame: DataFrame with classifier data
     """
     classifier_name: str = classifier[1]
-    data_types: dict = DATA_TYPES.get(classifier_name)
+    data_types: dict = get_joined_schema(classifier_name)
     logger.info("Reading %s tsv file into a DataFrame", classifier_name)
     return (
-        pd.read_table(classifier[0], index_col=False, dtype=data_types),
+        read_table(classifier[0], index_col=False, dtype=data_types),
         classifier_name,
     )
 
@@ -166,7 +145,22 @@ def process_df(classifier: tuple[pd.DataFrame, str]) -> pd.DataFrame:
 
 
 def concatenate_dfs(dfs: list[pd.DataFrame]) -> pd.DataFrame:
-    return pd.concat(dfs, ignore_index=True)
+    return apply_schema(pd.concat(dfs, ignore_index=True), HITS_TABLE_SCHEMA)
+
+
+def arrange_df(concatenated_df: pd.DataFrame) -> pd.DataFrame:
+    """Sort rows by rpm and taxid values and rearrange the columns
+
+    Args:
+        concatenated_df (pd.DataFrame): Concatenated DataFrame of all classifiers
+
+    Returns:
+        pd.DataFrame: Sorted DataFrame with columns in the order of OUTPUT_COLUMNS
+    """
+    concatenated_df.sort_values(
+        by=["rpm", "taxid"], ascending=[False, True], inplace=True
+    )
+    return concatenated_df[OUTPUT_COLUMNS]
 
 
 def check_if_exists(path_to_test: Path) -> Path:
@@ -203,33 +197,8 @@ def main(argv=None):
             ]
         ]
     )
-    # Sort rows by rpm and taxid values
-    concatenated_df.sort_values(
-        by=["rpm", "taxid"], ascending=[False, True], inplace=True
-    )
-    # Rearrange the columns
-    concatenated_df = concatenated_df[
-        [
-            "taxon_name",
-            "rpm",
-            "taxid",
-            "taxonomic_rank",
-            "classifier",
-            "centrifuge_genome_size",
-            "centrifuge_num_reads",
-            "centrifuge_abundance",
-            "kaiju_percent",
-            "kraken2_percentage_fragments_covered",
-            "kraken2_num_fragments_covered",
-            "reads_count",
-            "cami_taxid",
-            "cami_rank",
-            "cami_taxpath",
-            "cami_taxpathsn",
-            "cami_percentage",
-        ]
-    ]
-    concatenated_df.to_csv(args.output_file_name, sep="\t", index=False)
+    concatenated_df = arrange_df(concatenated_df)
+    write_table(concatenated_df, args.output_file_name)
 
 
 if __name__ == "__main__":
@@ -2,21 +2,56 @@
 """Download a genome sequence using NCBI taxid."""
 
 import argparse
+import asyncio
+import contextlib
+import io
 import logging
+import os
+import re
 import sys
+import tempfile
+import time
 from pathlib import Path
 from subprocess import run, TimeoutExpired, CalledProcessError
 import json
 import zipfile
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, NamedTuple, Optional
 import shutil
 from pydantic import BaseModel, validator
 from os import remove
 
+from assembly_catalog import AssemblyCatalog
+from atomic_write import create_temp_file
+from genome_cache import CACHE_DIR_ENV, DEFAULT_CACHE_MAX_BYTES, GenomeCache
+
 
 logger = logging.getLogger()
 
+# Assembly report inside the zip downloaded by datasets
+REPORT_MEMBER = "ncbi_dataset/data/assembly_data_report.jsonl"
+
+EXTRACT_BLOCK_SIZE: int = 1024**2
+
+# Fields of the assembly report looked at for every assembly, values have no escapes
+ACCESSION_PATTERN = re.compile(rb'"assemblyAccession"\s*:\s*"([^"\\]*)"')
+SUBMISSION_DATE_PATTERN = re.compile(rb'"submissionDate"\s*:\s*"([^"\\]*)"')
+
+# Errors of datasets for taxa or accessions without genomes, which retrying cannot fix
+NO_GENOMES_PATTERN = re.compile(
+    r"no genome data|no assemblies|not a valid|not recognized", re.IGNORECASE
+)
+
+
+class DownloadSettings(NamedTuple):
+    """How genomes are downloaded with datasets"""
+
+    datasets: str = "datasets"
+    timeout: float = 600.0
+    max_parallel: int = 4
+    retries: int = 3
+    backoff: float = 2.0
+
 
 # Classes for modeling one line json:s
 class AssemblyInfo(BaseModel):
@@ -94,76 +129,175 @@ class Assembly(BaseModel):
     taxId: str = ""
 
 
-def sort_assemblies(assemblies: list[Assembly]) -> list[Assembly]:
-    """
-    Sort assemblies by date and return them in a list from newest to oldest
+def get_download_command(
+    taxid: str,
+    zip_file: Path,
+    datasets: str = DownloadSettings().datasets,
+    extra_arg: str = "--no-progressbar",
+    accession: Optional[str] = None,
+) -> list[str]:
+    """Get the datasets command which downloads the genome assemblies of a taxid
 
     Args:
-        assemblies (list[Assembly]): List of pydantic Assemblies
+        taxid (str): The taxid of a species which genome to download
+        zip_file (Path): The zip file to download into
+        datasets (str, optional): The datasets executable. Defaults to 'datasets'.
+        extra_arg (str, optional): Extra argument of datasets. Defaults to '--no-progressbar'.
+        accession (Optional[str], optional): Download only this assembly instead of
+            all assemblies of the taxid. Defaults to None.
 
     Returns:
-        list[Assembly]: Sorted list of assemblies
+        list[str]: The command and its arguments
     """
-    return sorted(assemblies, key=lambda x: x.assemblyInfo.submissionDate, reverse=True)
-
-
-def download_genomes_zip(taxid: str, extra_arg: str = "--no-progressbar") -> None:
+    return [
+        datasets,
+        "download",
+        "genome",
+        *(("accession", accession) if accession else ("taxon", taxid)),
+        "--exclude-gff3",
+        "--exclude-protein",
+        "--exclude-rna",
+        "--exclude-genomic-cds",
+        extra_arg,
+        "--filename",
+        str(zip_file),
+    ]
+
+
+def download_genomes_zip(
+    taxid: str,
+    extra_arg: str = "--no-progressbar",
+    settings: DownloadSettings = DownloadSettings(),
+    accession: Optional[str] = None,
+) -> None:
     """Download genome assembly based on given taxid
 
     Args:
         taxid (str): The taxid of a species which genome to download
+        settings (DownloadSettings, optional): The datasets executable and timeout.
+            Defaults to DownloadSettings().
+        accession (Optional[str], optional): Download only this assembly of the taxid.
+            Defaults to None.
     """
     run(
-        [
-            "datasets",
-            "download",
-            "genome",
-            "taxon",
-            taxid,
-            "--exclude-gff3",
-            "--exclude-protein",
-            "--exclude-rna",
-            "--exclude-genomic-cds",
-            extra_arg,
-            "--filename",
-            f"{taxid}.zip",
-        ],
+        get_download_command(
+            taxid, Path(f"{taxid}.zip"), settings.datasets, extra_arg, accession
+        ),
         check=True,
-        timeout=600,  # Download for 10 minutes before erroring out
+        timeout=settings.timeout,
     )
 
 
-def unzip(zipped_file: Path, unzip_dir: Path = Path.cwd()) -> None:
-    """Unzip a file into a given path
-
-    Args:
-        zipped_file (Path): Path to the file to be zipped
-        unzip_dir (Path, optional): Path to the directory where
-            the zipped file should be unzipped. Defaults to Path.cwd()
-    """
-    with zipfile.ZipFile(zipped_file, "r") as zip_ref:
-        zip_ref.extractall(unzip_dir)
-
-
 def parse_args(argv=None):
     """Define and immediately parse command line arguments."""
     parser = argparse.ArgumentParser(
-        description="Download reference genome using a taxid",
+        description="Download reference genome using a taxid, or concurrently for several taxids",
         epilog="Example: python download_ref_genome.py 11665",
     )
     parser.add_argument(
-        "taxid",
+        "taxids",
         metavar="TAXID",
         type=str,
-        help="Taxid of a species which genome to download.",
+        nargs="*",
+        help="Taxid of a species which genome to download, several taxids are downloaded concurrently.",
+    )
+    parser.add_argument(
+        "-t",
+        "--taxid-file",
+        metavar="taxid-file",
+        type=Path,
+        help="File with one taxid per line to download concurrently.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        metavar="output-dir",
+        type=Path,
+        help="Directory of the downloaded genomes of several taxids (default working directory).",
+        default=Path.cwd(),
+    )
+    parser.add_argument(
+        "-s",
+        "--status-report",
+        metavar="status-report",
+        type=Path,
+        help="JSON report of the download of each of several taxids (default download_status.json).",
+        default=Path("download_status.json"),
+    )
+    parser.add_argument(
+        "-p",
+        "--max-parallel",
+        metavar="int",
+        type=int,
+        help=f"Maximum number of concurrent downloads (default {DownloadSettings().max_parallel}).",
+        default=DownloadSettings().max_parallel,
+    )
+    parser.add_argument(
+        "--timeout",
+        metavar="float",
+        type=float,
+        help=f"Timeout in seconds of one download (default {DownloadSettings().timeout}).",
+        default=DownloadSettings().timeout,
+    )
+    parser.add_argument(
+        "-r",
+        "--retries",
+        metavar="int",
+        type=int,
+        help=f"How many times a failed download of several taxids is retried (default {DownloadSettings().retries}).",
+        default=DownloadSettings().retries,
+    )
+    parser.add_argument(
+        "-b",
+        "--backoff",
+        metavar="float",
+        type=float,
+        help=f"Seconds to wait before the first retry, doubled for every further retry (default {DownloadSettings().backoff}).",
+        default=DownloadSettings().backoff,
+    )
+    parser.add_argument(
+        "--catalog",
+        metavar="catalog",
+        type=Path,
+        help="Assembly catalog built by assembly_catalog.py, taxids found in it are downloaded by their best accession.",
+    )
+    parser.add_argument(
+        "--prefer-complete",
+        action="store_true",
+        help="Resolve taxids in the catalog to their newest most complete assembly instead of their newest one.",
+    )
+    parser.add_argument(
+        "--datasets",
+        metavar="datasets",
+        type=str,
+        help="The NCBI datasets executable (default datasets).",
+        default=DownloadSettings().datasets,
     )
     parser.add_argument(
         "-j",
         "--jsonl-file",
         metavar="jsonl-file",
         type=Path,
-        help="Path to '.jsonl' file with info about all the different assemblies retrieved.",
-        default=Path("ncbi_dataset/data/assembly_data_report.jsonl"),
+        help="Path of the '.jsonl' file with info about all the different assemblies inside the downloaded zip.",
+        default=Path(REPORT_MEMBER),
+    )
+    parser.add_argument(
+        "-c",
+        "--cache-dir",
+        metavar="cache-dir",
+        type=Path,
+        help=f"Directory of genomes cached between runs (default ${CACHE_DIR_ENV}, no cache if unset).",
+        default=(
+            Path(os.environ[CACHE_DIR_ENV]) if os.environ.get(CACHE_DIR_ENV) else None
+        ),
+    )
+    parser.add_argument(
+        "-m",
+        "--cache-max-bytes",
+        metavar="int",
+        type=int,
+        help=f"Evict the least recently used cached genomes over this many bytes (default {DEFAULT_CACHE_MAX_BYTES}).",
+        default=DEFAULT_CACHE_MAX_BYTES,
     )
     parser.add_argument(
         "-l",
@@ -172,25 +306,68 @@ def parse_args(argv=None):
         choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
         default="ERROR",
     )
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+    if not args.taxids and args.taxid_file is None:
+        parser.error("Give a TAXID or a taxid file")
+    return args
+
+
+def get_accession_and_date(single_line_json: bytes) -> tuple[str, str]:
+    """Get the accession and submission date of an assembly report line without decoding all of it
+
+    Args:
+        single_line_json (bytes): A line of the '.jsonl' assembly report
+
+    Returns:
+        tuple[str, str]: Accession and submission date, e.g. ('GCF_000847605.1', '1993-09-29')
+    """
+    accessions: list[bytes] = ACCESSION_PATTERN.findall(single_line_json)
+    dates: list[bytes] = SUBMISSION_DATE_PATTERN.findall(single_line_json)
+    if len(accessions) == 1 and len(dates) == 1:
+        return accessions[0].decode(), dates[0].decode()
+    # Keys nested elsewhere in the record are resolved by decoding it
+    assembly_info: dict = json.loads(single_line_json)["assemblyInfo"]
+    return assembly_info["assemblyAccession"], assembly_info["submissionDate"]
+
 
+def select_newest_assembly(
+    report_lines: Iterable[bytes], assembly_members: dict
+) -> Optional[Assembly]:
+    """Find the newest assembly with one assembly file in a one line json list report
 
-def open_jsonl_file(jsonl_file: Path) -> list[Assembly]:
-    """Parse a one line json list file
+    The report is read in one pass looking only at the accession and submission
+    date of each line. The chosen line alone is decoded and validated as an Assembly.
 
     Args:
-        jsonl_file (Path): Path to one line json list file
+        report_lines (Iterable[bytes]): Lines of the '.jsonl' assembly report
+        assembly_members (dict): Names of the '.fna' files by accession
 
     Returns:
-        list[Assembly]: List of parsed assembly infos
+        Optional[Assembly]: The newest assembly, of equally new ones the first in the
+            report, None when no assembly has an assembly file
     """
-    json_list: list = []
-    with open(jsonl_file, encoding="utf8") as assembly_data_report:
-        # Iterate over all json lines
-        for single_line_json in assembly_data_report:
-            json_dict: dict = json.loads(single_line_json)
-            json_list.append(Assembly(**json_dict))
-    return json_list
+    newest: Optional[bytes] = None
+    newest_date: str = ""
+    for single_line_json in report_lines:
+        if not single_line_json.strip():
+            continue
+        accession, submission_date = get_accession_and_date(single_line_json)
+        # There should be only one assembly .fna file per assembly
+        num_fnas: int = len(assembly_members.get(accession, []))
+        if num_fnas != 1:
+            logger.info(
+                "Too many or few assembly files %d for assembly: %s",
+                num_fnas,
+                accession,
+            )
+            continue
+        # Dates are ISO 8601 strings, e.g. '1993-09-29', which sort chronologically
+        if newest is None or submission_date > newest_date:
+            newest = single_line_json
+            newest_date = submission_date
+    if newest is None:
+        return None
+    return Assembly(**json.loads(newest))
 
 
 def get_assembly_accession(assembly: Assembly) -> str:
@@ -205,48 +382,47 @@ def get_assembly_accession(assembly: Assembly) -> str:
     return assembly.assemblyInfo.assemblyAccession
 
 
-def extract_assembly_file_path(assembly_path_dir: Path) -> Path:
-    """Extract from a given path, a path to a genome assembly
+def get_assembly_members(zip_ref: zipfile.ZipFile) -> dict:
+    """Find the '.fna' assembly files of every assembly in a dataset zip
 
     Args:
-        assembly_path_dir (Path): Directory where the genome assembly file should exist
-
-    Raises:
-        FileNotFoundError: Error raised when no '.fna' file is found in the given directory
+        zip_ref (zipfile.ZipFile): The opened dataset zip
 
     Returns:
-        Path: Path to the '.fna' genome assembly file
+        dict: Names of the '.fna' members by accession, e.g.
+            {'GCF_000847605.1': ['ncbi_dataset/data/GCF_000847605.1/GCF_000847605.1_ViralProj15006_genomic.fna']}
     """
-    if list(assembly_path_dir.glob("*.fna")):
-        # There should be only one assembly .fna file in the directory
-        num_fnas: int = len(list(assembly_path_dir.glob("*.fna")))
-        assert num_fnas == 1, f"Too many or few assembly files {num_fnas}"
-        return list(assembly_path_dir.glob("*.fna"))[0]
-    raise FileNotFoundError(
-        f"No '.fna' assembly files found in: {str(assembly_path_dir)}"
-    )
+    assembly_members: dict = {}
+    for member in zip_ref.namelist():
+        # Assembly files are stored as ncbi_dataset/data/<accession>/<file>.fna
+        parts: list[str] = member.split("/")
+        if len(parts) == 4 and parts[:2] == ["ncbi_dataset", "data"]:
+            if parts[3].endswith(".fna"):
+                assembly_members.setdefault(parts[2], []).append(member)
+    return assembly_members
 
 
-def copy_assembly_file(assembly_path: Path, path_to_move_assembly_to: Path) -> bool:
-    """Copy assembly from its original directory to another location
+def extract_member(zip_ref: zipfile.ZipFile, member: str, output_dir: Path) -> Path:
+    """Extract one file of a zip into a directory without its directories in the zip
 
-    Args:
-        assembly_path (Path): Directory where the assembly (.fna) file resides
-        path_to_move_assembly_to (Path): Directory to which the assembly file should be copied
+    The file is written under a temporary name and renamed when complete.
 
-    Raises:
-        FileNotFoundError: Error raised when no '.fna' file was successfully copied
+    Args:
+        zip_ref (zipfile.ZipFile): The opened zip
+        member (str): Name of the file in the zip
+        output_dir (Path): Directory to extract the file into
 
     Returns:
-        bool: True if the assembly (.fna) file was successfully copied
+        Path: The extracted file
     """
-    if assembly_path.is_file():
-        shutil.copy(assembly_path, path_to_move_assembly_to)
-        logger.info(
-            "Copying %s to: %s", str(assembly_path), str(path_to_move_assembly_to)
-        )
-        return True
-    raise FileNotFoundError(f"No '.fna' file could be found: {str(assembly_path)}")
+    output_file: Path = output_dir / Path(member).name
+    with zip_ref.open(member) as member_handle, create_temp_file(
+        output_file
+    ) as temp_file:
+        shutil.copyfileobj(member_handle, temp_file, EXTRACT_BLOCK_SIZE)
+    os.replace(temp_file.name, output_file)
+    logger.info("Extracting %s to: %s", member, output_file)
+    return output_file
 
 
 def remove_artifacts(artifact_path: Path, is_file: bool = True) -> None:
@@ -264,51 +440,408 @@ def remove_artifacts(artifact_path: Path, is_file: bool = True) -> None:
         logger.info("Directory successfully removed: %s\n", artifact_path)
 
 
-def main(argv=None):
-    """Coordinate argument parsing and program execution."""
-    args = parse_args(argv)
-    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+def extract_assembly(
+    zip_file: Path, report_member: str, output_dir: Path
+) -> Optional[tuple[str, Path]]:
+    """Extract only the assembly file of the newest assembly which has one from a dataset zip
+
+    Args:
+        zip_file (Path): The downloaded dataset zip
+        report_member (str): Path of the '.jsonl' assembly report inside the zip
+        output_dir (Path): Directory to extract the assembly file into
+
+    Returns:
+        Optional[tuple[str, Path]]: Accession and path of the extracted assembly file,
+            None when no assembly has an assembly file
+    """
+    with zipfile.ZipFile(zip_file, "r") as zip_ref:
+        assembly_members: dict = get_assembly_members(zip_ref)
+        # Lines are split faster by a buffered reader than by the zip member itself
+        with io.BufferedReader(
+            zip_ref.open(report_member), EXTRACT_BLOCK_SIZE
+        ) as report_handle:
+            assembly: Optional[Assembly] = select_newest_assembly(
+                report_handle, assembly_members
+            )
+        if assembly is None:
+            return None
+        accession: str = get_assembly_accession(assembly)
+        return accession, extract_member(
+            zip_ref, assembly_members[accession][0], output_dir
+        )
+
+
+def download_assembly(
+    taxid: str,
+    jsonl_file: Path,
+    settings: DownloadSettings = DownloadSettings(),
+    accession: Optional[str] = None,
+) -> Optional[tuple[str, Path]]:
+    """Download the genome assemblies of a taxid and extract the newest one into the working directory
 
-    taxid: str = args.taxid
-    download_succeeded: bool = True
+    Args:
+        taxid (str): The taxid of a species which genome to download
+        jsonl_file (Path): Path of the '.jsonl' assembly report inside the downloaded zip
+        settings (DownloadSettings, optional): The datasets executable and timeout.
+            Defaults to DownloadSettings().
+        accession (Optional[str], optional): Download only this assembly of the taxid.
+            Defaults to None.
+
+    Returns:
+        Optional[tuple[str, Path]]: Accession and path of the extracted assembly file,
+            None when the download failed or no assembly file was found
+    """
     try:
-        download_genomes_zip(taxid)
+        download_genomes_zip(taxid, settings=settings, accession=accession)
     except TimeoutExpired as timeout_error_msg:
         logger.error(
             "The download took too long time: %s\n%s", taxid, timeout_error_msg
         )
-        download_succeeded = False
+        return None
     except CalledProcessError as called_proc_error_msg:
         logger.error(
             "The return code of the downloading for taxid %s was non-zero:\n%s",
             taxid,
             called_proc_error_msg,
         )
-        download_succeeded = False
-
-    if download_succeeded:
-        zip_file = Path(f"{taxid}.zip")
-        unzip(Path(f"{taxid}.zip"))
-        assemblies: list[Assembly] = sort_assemblies(open_jsonl_file(args.jsonl_file))
-        # Handle the case if the latest assembly doesn't contain an assembly .fna file
-        for assembly in assemblies:
-            accession: str = get_assembly_accession(assembly)
-            latest_assembly_path: Path = Path.cwd() / f"ncbi_dataset/data/{accession}"
-            try:
-                assembly_path_checked = extract_assembly_file_path(latest_assembly_path)
-            except FileNotFoundError:
-                logger.error(
-                    "No assembly file existed in path: %s",
-                    latest_assembly_path,
+        return None
+
+    zip_file = Path(f"{taxid}.zip")
+    extracted: Optional[tuple[str, Path]] = extract_assembly(
+        zip_file, str(jsonl_file), Path.cwd()
+    )
+    remove_artifacts(Path.cwd() / zip_file)
+    if extracted is None:
+        logger.error("No assembly files were found for taxid: %s", taxid)
+    return extracted
+
+
+def read_taxid_file(taxid_file: Path) -> list[str]:
+    """Read taxids from a file with one taxid per line
+
+    Args:
+        taxid_file (Path): The taxid file, empty lines are skipped
+
+    Returns:
+        list[str]: The taxids
+    """
+    with open(taxid_file, encoding="utf8") as taxid_handle:
+        return [line.strip() for line in taxid_handle if line.strip()]
+
+
+async def download_zip_with_retries(
+    taxid: str,
+    zip_file: Path,
+    settings: DownloadSettings,
+    accession: Optional[str] = None,
+) -> tuple[int, Optional[str]]:
+    """Download the genome assemblies of a taxid, retrying with exponential backoff
+
+    Args:
+        taxid (str): The taxid of a species which genome to download
+        zip_file (Path): The zip file to download into
+        settings (DownloadSettings): The datasets executable, timeout and retries
+        accession (Optional[str], optional): Download only this assembly of the taxid.
+            Defaults to None.
+
+    Returns:
+        tuple[int, Optional[str]]: Number of attempts and the error of the last
+            attempt, None when the download succeeded. Errors matching
+            NO_GENOMES_PATTERN are not retried.
+    """
+    error: Optional[str] = None
+    for attempt in range(1, settings.retries + 2):
+        if attempt > 1:
+            delay: float = settings.backoff * 2 ** (attempt - 2)
+            logger.warning("Retrying taxid %s in %.1f s after: %s", taxid, delay, error)
+            await asyncio.sleep(delay)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *get_download_command(
+                    taxid, zip_file, settings.datasets, accession=accession
+                ),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as os_error_msg:
+            # A missing datasets executable does not appear by retrying
+            return attempt, str(os_error_msg)
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), settings.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            error = f"The download took longer than {settings.timeout} s"
+            continue
+        if process.returncode == 0:
+            return attempt, None
+        error = f"datasets exited with {process.returncode}: {stderr.decode(errors='replace').strip()}"
+        if NO_GENOMES_PATTERN.search(error):
+            return attempt, error
+    return attempt, error
+
+
+async def download_into(
+    status: dict,
+    taxid: str,
+    output_dir: Path,
+    work_dir: Path,
+    settings: DownloadSettings,
+    accession: Optional[str],
+    jsonl_file: Path,
+) -> None:
+    """Download the genome assemblies of a taxid and extract the newest one into a directory
+
+    Args:
+        status (dict): Status of the taxid for the status report, updated in place
+        taxid (str): The taxid of a species which genome to download
+        output_dir (Path): Directory of the genome files
+        work_dir (Path): Directory for the downloaded dataset zips
+        settings (DownloadSettings): The datasets executable, timeout and retries
+        accession (Optional[str]): Download only this assembly of the taxid
+        jsonl_file (Path): Path of the '.jsonl' assembly report inside the downloaded zip
+    """
+    zip_file: Path = work_dir / f"{taxid}.zip"
+    attempts, error = await download_zip_with_retries(
+        taxid, zip_file, settings, accession
+    )
+    status.update(attempts=attempts, error=error)
+    if error is not None:
+        if NO_GENOMES_PATTERN.search(error):
+            status["status"] = "no_assembly"
+        return
+    try:
+        selected: Optional[tuple[str, Path]] = await asyncio.to_thread(
+            extract_assembly, zip_file, str(jsonl_file), output_dir
+        )
+    except (KeyError, OSError, ValueError, zipfile.BadZipFile) as extract_error_msg:
+        status["error"] = f"Could not extract the download: {extract_error_msg}"
+    else:
+        if selected is None:
+            status.update(status="no_assembly", error="No assembly files were found")
+        else:
+            status.update(
+                status="downloaded", accession=selected[0], file=str(selected[1])
+            )
+    finally:
+        zip_file.unlink(missing_ok=True)
+
+
+async def fetch_taxid(
+    taxid: str,
+    output_dir: Path,
+    work_dir: Path,
+    semaphore: asyncio.Semaphore,
+    settings: DownloadSettings,
+    cache: Optional[GenomeCache] = None,
+    accession: Optional[str] = None,
+    jsonl_file: Path = Path(REPORT_MEMBER),
+) -> dict:
+    """Get the genome of a taxid from the cache or download it into a directory
+
+    Downloads of a taxid into a cache hold its lock, so that concurrent runs
+    download it once.
+
+    Args:
+        taxid (str): The taxid of a species which genome to download
+        output_dir (Path): Directory of the genome files
+        work_dir (Path): Directory for the downloaded dataset zips
+        semaphore (asyncio.Semaphore): Limits the number of concurrent downloads
+        settings (DownloadSettings): The datasets executable, timeout and retries
+        cache (Optional[GenomeCache], optional): Cache of downloaded genomes. Defaults to None.
+        accession (Optional[str], optional): Assembly of the taxid resolved from the
+            assembly catalog, looked up and downloaded instead of the taxid. Defaults to None.
+        jsonl_file (Path, optional): Path of the '.jsonl' assembly report inside the
+            downloaded zip. Defaults to Path(REPORT_MEMBER).
+
+    Returns:
+        dict: Status of the taxid for the status report
+    """
+    start: float = time.monotonic()
+    status: dict = {
+        "taxid": taxid,
+        "status": "failed",
+        "accession": None,
+        "file": None,
+        "attempts": 0,
+        "error": None,
+    }
+    with contextlib.ExitStack() as stack:
+        cached = None
+        if cache is not None:
+            cached = await asyncio.to_thread(
+                cache.fetch, output_dir, **get_cache_key(taxid, accession)
+            )
+            if not cached:
+                await asyncio.to_thread(stack.enter_context, cache.lock_taxid(taxid))
+                # Another run may have downloaded the genome while this one waited
+                cached = await asyncio.to_thread(
+                    cache.fetch, output_dir, **get_cache_key(taxid, accession)
                 )
-                continue
-            break
-        if assembly_path_checked:
-            if copy_assembly_file(assembly_path_checked, Path.cwd()):
-                remove_artifacts(Path.cwd() / zip_file)
-                remove_artifacts(Path.cwd() / "ncbi_dataset", is_file=False)
+        if cached:
+            status.update(
+                status="cached",
+                accession=cached.accession,
+                file=str(output_dir / cached.file_name),
+            )
         else:
-            logger.error("No assembly files were found for taxid: %s", taxid)
+            async with semaphore:
+                await download_into(
+                    status, taxid, output_dir, work_dir, settings, accession, jsonl_file
+                )
+            if cache is not None and status["status"] == "downloaded":
+                await asyncio.to_thread(
+                    cache.put, taxid, status["accession"], Path(status["file"])
+                )
+    status["seconds"] = round(time.monotonic() - start, 3)
+    if status["status"] == "failed":
+        logger.error("Could not download taxid %s: %s", taxid, status["error"])
+    elif status["status"] == "no_assembly":
+        logger.error("No assembly files were found for taxid: %s", taxid)
+    else:
+        logger.info("Got %s of taxid %s", status["accession"], taxid)
+    return status
+
+
+async def download_taxids(
+    taxids: list[str],
+    output_dir: Path,
+    settings: DownloadSettings,
+    cache: Optional[GenomeCache] = None,
+    accessions: Optional[dict] = None,
+    jsonl_file: Path = Path(REPORT_MEMBER),
+) -> list[dict]:
+    """Download the genomes of taxids concurrently
+
+    Args:
+        taxids (list[str]): Taxids of species which genomes to download
+        output_dir (Path): Directory of the genome files
+        settings (DownloadSettings): The datasets executable, timeout, retries and
+            number of concurrent downloads
+        cache (Optional[GenomeCache], optional): Cache of downloaded genomes. Defaults to None.
+        accessions (Optional[dict], optional): Accessions resolved from the assembly
+            catalog by taxid. Defaults to None.
+        jsonl_file (Path, optional): Path of the '.jsonl' assembly report inside the
+            downloaded zips. Defaults to Path(REPORT_MEMBER).
+
+    Returns:
+        list[dict]: Status of every taxid in the given order
+    """
+    semaphore = asyncio.Semaphore(settings.max_parallel)
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".datasets_") as work_dir:
+        return await asyncio.gather(
+            *(
+                fetch_taxid(
+                    taxid,
+                    output_dir,
+                    Path(work_dir),
+                    semaphore,
+                    settings,
+                    cache,
+                    (accessions or {}).get(taxid),
+                    jsonl_file,
+                )
+                for taxid in taxids
+            )
+        )
+
+
+def get_cache_key(taxid: str, accession: Optional[str]) -> dict:
+    """Get the arguments of GenomeCache.fetch which look up a genome
+
+    Args:
+        taxid (str): The taxid
+        accession (Optional[str]): The accession resolved for the taxid, None if unresolved
+
+    Returns:
+        dict: The accession if resolved, otherwise the taxid, by argument name
+    """
+    return {"accession": accession} if accession else {"taxid": taxid}
+
+
+def write_status_report(statuses: list[dict], status_report: Path) -> None:
+    """Write the download status of every taxid into a JSON file
+
+    Args:
+        statuses (list[dict]): Status of every taxid
+        status_report (Path): The JSON file
+    """
+    summary: dict = {}
+    for status in statuses:
+        summary[status["status"]] = summary.get(status["status"], 0) + 1
+    with open(status_report, "w", encoding="utf8") as report_handle:
+        json.dump({"summary": summary, "taxids": statuses}, report_handle, indent=2)
+        report_handle.write("\n")
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    settings = DownloadSettings(
+        datasets=args.datasets,
+        timeout=args.timeout,
+        max_parallel=args.max_parallel,
+        retries=args.retries,
+        backoff=args.backoff,
+    )
+    cache: Optional[GenomeCache] = None
+    if args.cache_dir is not None:
+        cache = GenomeCache(args.cache_dir, args.cache_max_bytes)
+
+    taxids: list[str] = list(args.taxids)
+    if args.taxid_file is not None:
+        if not args.taxid_file.is_file():
+            logger.error("The given input file %s was not found!", args.taxid_file)
+            sys.exit(1)
+        taxids += read_taxid_file(args.taxid_file)
+    # Each taxid is downloaded once
+    taxids = list(dict.fromkeys(taxids))
+    accessions: dict = {}
+    if args.catalog is not None:
+        if not args.catalog.is_file():
+            logger.error("The given input file %s was not found!", args.catalog)
+            sys.exit(1)
+        catalog = AssemblyCatalog(args.catalog)
+        accessions = catalog.best_accessions(taxids, args.prefer_complete)
+        catalog.close()
+        logger.info(
+            "Resolved %d of %d taxids in the assembly catalog",
+            len(accessions),
+            len(taxids),
+        )
+
+    if args.taxid_file is None and len(args.taxids) == 1:
+        taxid: str = taxids[0]
+        accession: Optional[str] = accessions.get(taxid)
+        if cache is None:
+            download_assembly(taxid, args.jsonl_file, settings, accession)
+            return
+        if cache.fetch(Path.cwd(), **get_cache_key(taxid, accession)):
+            return
+        with cache.lock_taxid(taxid):
+            # Another task may have downloaded the genome while this one waited
+            if cache.fetch(Path.cwd(), **get_cache_key(taxid, accession)):
+                return
+            if downloaded := download_assembly(
+                taxid, args.jsonl_file, settings, accession
+            ):
+                cache.put(taxid, *downloaded)
+        return
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    statuses: list[dict] = asyncio.run(
+        download_taxids(
+            taxids, args.output_dir, settings, cache, accessions, args.jsonl_file
+        )
+    )
+    write_status_report(statuses, args.status_report)
+    if failed := [
+        status["taxid"] for status in statuses if status["status"] == "failed"
+    ]:
+        logger.error("Downloading failed for taxids: %s", ", ".join(failed))
+        sys.exit(2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""Hold exclusive locks on files shared by concurrently running processes."""
+
+import contextlib
+import fcntl
+from pathlib import Path
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def locked(lock_file: Path) -> Iterator[None]:
+    """Hold an exclusive lock on a file, waiting for other processes to release it
+
+    Args:
+        lock_file (Path): The lock file, created when missing
+
+    Yields:
+        Iterator[None]: Nothing, the lock is held inside the with block
+    """
+    with lock_file.open("a") as lock_handle:
+        fcntl.flock(lock_handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_handle, fcntl.LOCK_UN)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""Cache reference genomes by taxid and accession in a content-addressed directory of bounded size."""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+from atomic_write import create_temp_file
+from file_lock import locked
+
+
+logger = logging.getLogger()
+
+# Environment variable with the default cache directory of download_ref_genome.py
+CACHE_DIR_ENV = "GMSMETAPOST_GENOME_CACHE"
+
+DEFAULT_CACHE_MAX_BYTES: int = 20 * 1024**3
+
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+OBJECTS_DIR = "objects"
+LOCKS_DIR = "locks"
+
+COPY_BLOCK_SIZE: int = 1024**2
+
+
+class CachedGenome(NamedTuple):
+    """A genome assembly file stored in the cache"""
+
+    accession: str
+    file_name: str
+    sha256: str
+    size: int
+
+
+def copy_with_sha256(source: BinaryIO, destination: BinaryIO) -> str:
+    """Copy a file object into another one and checksum the copied bytes
+
+    Args:
+        source (BinaryIO): File object to read from
+        destination (BinaryIO): File object to write to
+
+    Returns:
+        str: Hexadecimal SHA-256 of the copied bytes
+    """
+    sha256 = hashlib.sha256()
+    while block := source.read(COPY_BLOCK_SIZE):
+        sha256.update(block)
+        destination.write(block)
+    return sha256.hexdigest()
+
+
+class GenomeCache:
+    """Genome assembly files cached by content, looked up by taxid or accession
+
+    Files are stored once per SHA-256 under 'objects/'. 'index.json' maps taxids
+    to accessions and accessions to files with their last access time. The index
+    is only rewritten atomically while holding 'index.lock', so that parallel
+    tasks can share one cache directory.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """Open a cache directory, creating it when missing
+
+        Args:
+            cache_dir (Path): The cache directory
+            max_bytes (int, optional): Evict the least recently used genomes when the
+                cached files take more bytes than this. Defaults to DEFAULT_CACHE_MAX_BYTES.
+        """
+        self.cache_dir: Path = cache_dir
+        self.max_bytes: int = max_bytes
+        (cache_dir / OBJECTS_DIR).mkdir(parents=True, exist_ok=True)
+        (cache_dir / LOCKS_DIR).mkdir(exist_ok=True)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.cache_dir / OBJECTS_DIR / f"{sha256}.fna"
+
+    def _read_index(self) -> dict:
+        index_file: Path = self.cache_dir / INDEX_FILE
+        if not index_file.is_file():
+            return {"taxids": {}, "accessions": {}}
+        return json.loads(index_file.read_text(encoding="utf8"))
+
+    def _write_index(self, index: dict) -> None:
+        with create_temp_file(
+            self.cache_dir / INDEX_FILE, "w", encoding="utf8"
+        ) as temp_index:
+            json.dump(index, temp_index, indent=1, sort_keys=True)
+        os.replace(temp_index.name, self.cache_dir / INDEX_FILE)
+
+    @contextlib.contextmanager
+    def lock_taxid(self, taxid: str) -> Iterator[None]:
+        """Hold the download lock of a taxid, so that one task downloads it at a time
+
+        Args:
+            taxid (str): The taxid which genome is downloaded
+
+        Yields:
+            Iterator[None]: Nothing, the lock is held inside the with block
+        """
+        with locked(self.cache_dir / LOCKS_DIR / f"{taxid}.lock"):
+            yield
+
+    def fetch(
+        self,
+        output_dir: Path,
+        taxid: Optional[str] = None,
+        accession: Optional[str] = None,
+    ) -> Optional[CachedGenome]:
+        """Copy a cached genome into a directory, verifying its checksum on the way
+
+        A genome which file does not match its checksum is dropped from the cache.
+
+        Args:
+            output_dir (Path): Directory to copy the genome file into
+            taxid (Optional[str], optional): Taxid of the genome. Defaults to None.
+            accession (Optional[str], optional): Assembly accession, used when no
+                taxid is given. Defaults to None.
+
+        Returns:
+            Optional[CachedGenome]: The genome copied as its file name into the
+                directory, None when not cached
+        """
+        with locked(self.cache_dir / INDEX_LOCK_FILE):
+            index: dict = self._read_index()
+            if taxid is not None:
+                accession = index["taxids"].get(taxid)
+            entry: Optional[dict] = index["accessions"].get(accession)
+            if entry is None:
+                return None
+            try:
+                # The open file stays readable even if another task evicts it
+                object_handle: BinaryIO = self._object_path(entry["sha256"]).open("rb")
+            except FileNotFoundError:
+                logger.warning("Cached genome %s is missing its file", accession)
+                self._drop(index, accession)
+                self._write_index(index)
+                return None
+            entry["last_access"] = time.time()
+            self._write_index(index)
+        output_file: Path = output_dir / entry["file_name"]
+        with object_handle, output_file.open("wb") as output_handle:
+            sha256: str = copy_with_sha256(object_handle, output_handle)
+        if sha256 != entry["sha256"]:
+            logger.warning(
+                "Cached genome %s does not match its checksum, dropping it", accession
+            )
+            output_file.unlink()
+            with locked(self.cache_dir / INDEX_LOCK_FILE):
+                index = self._read_index()
+                # Unless another task has already replaced the genome
+                if (
+                    index["accessions"].get(accession, {}).get("sha256")
+                    == entry["sha256"]
+                ):
+                    self._drop(index, accession)
+                    self._write_index(index)
+            return None
+        logger.info("Copied cached genome %s to %s", accession, output_file)
+        return CachedGenome(accession, entry["file_name"], sha256, entry["size"])
+
+    def put(self, taxid: str, accession: str, genome_file: Path) -> CachedGenome:
+        """Add a genome file to the cache and evict genomes over the byte budget
+
+        Args:
+            taxid (str): Taxid the genome was downloaded for
+            accession (str): Assembly accession of the genome
+            genome_file (Path): The genome assembly file
+
+        Returns:
+            CachedGenome: The cached genome
+        """
+        with create_temp_file(
+            self._object_path("new")
+        ) as temp_object, genome_file.open("rb") as genome_handle:
+            sha256: str = copy_with_sha256(genome_handle, temp_object)
+        genome = CachedGenome(
+            accession, genome_file.name, sha256, os.path.getsize(temp_object.name)
+        )
+        with locked(self.cache_dir / INDEX_LOCK_FILE):
+            os.replace(temp_object.name, self._object_path(sha256))
+            index: dict = self._read_index()
+            index["taxids"][taxid] = accession
+            index["accessions"][accession] = {
+                "file_name": genome.file_name,
+                "sha256": genome.sha256,
+                "size": genome.size,
+                "last_access": time.time(),
+            }
+            self._evict(index, keep=accession)
+            self._write_index(index)
+        logger.info("Cached genome %s of taxid %s", accession, taxid)
+        return genome
+
+    def evict(self) -> None:
+        """Evict the least recently used genomes until the cache fits its byte budget"""
+        with locked(self.cache_dir / INDEX_LOCK_FILE):
+            index: dict = self._read_index()
+            self._evict(index)
+            self._write_index(index)
+
+    def _evict(self, index: dict, keep: Optional[str] = None) -> None:
+        sizes: dict = {
+            entry["sha256"]: entry["size"] for entry in index["accessions"].values()
+        }
+        total_bytes: int = sum(sizes.values())
+        for accession, entry in sorted(
+            index["accessions"].items(), key=lambda item: item[1]["last_access"]
+        ):
+            if total_bytes <= self.max_bytes:
+                break
+            if accession == keep:
+                continue
+            logger.info("Evicting cached genome %s", accession)
+            if self._drop(index, accession):
+                total_bytes -= entry["size"]
+
+    def _drop(self, index: dict, accession: str) -> bool:
+        # Returns True if the file was deleted, files are shared by identical genomes
+        entry: dict = index["accessions"].pop(accession)
+        for taxid in [
+            taxid for taxid, cached in index["taxids"].items() if cached == accession
+        ]:
+            del index["taxids"][taxid]
+        if any(
+            other["sha256"] == entry["sha256"] for other in index["accessions"].values()
+        ):
+            return False
+        with contextlib.suppress(FileNotFoundError):
+            self._object_path(entry["sha256"]).unlink()
+        return True
+
+    def list_genomes(self) -> list[tuple]:
+        """List the cached genomes from the most recently used
+
+        Returns:
+            list[tuple]: Accession, taxids, file name, size and last access time of every genome
+        """
+        index: dict = self._read_index()
+        taxids: dict = {}
+        for taxid, accession in index["taxids"].items():
+            taxids.setdefault(accession, []).append(taxid)
+        return [
+            (
+                accession,
+                ",".join(taxids.get(accession, [])),
+                entry["file_name"],
+                entry["size"],
+                time.strftime(
+                    "%Y-%m-%dT%H:%M:%S", time.localtime(entry["last_access"])
+                ),
+            )
+            for accession, entry in sorted(
+                index["accessions"].items(),
+                key=lambda item: item[1]["last_access"],
+                reverse=True,
+            )
+        ]
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="List the genomes of a reference genome cache and evict them over a byte budget",
+        epilog="Example: python genome_cache.py genome_cache -m 10000000000",
+    )
+    parser.add_argument(
+        "cache_dir",
+        metavar="CACHE-DIR",
+        type=Path,
+        help="The reference genome cache directory",
+    )
+    parser.add_argument(
+        "-m",
+        "--max-bytes",
+        metavar="int",
+        type=int,
+        help="Evict the least recently used genomes until the cache takes at most this many bytes",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if not args.cache_dir.is_dir():
+        logger.error("The given cache directory %s was not found!", args.cache_dir)
+        sys.exit(1)
+    cache = GenomeCache(args.cache_dir)
+    if args.max_bytes is not None:
+        cache.max_bytes = args.max_bytes
+        cache.evict()
+    print("accession\ttaxids\tfile_name\tsize\tlast_access")
+    for row in cache.list_genomes():
+        print("\t".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+"""Postprocess the classifier reports of one sample into the final hits table in one process."""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+
+import add_metadata
+import concat_tables
+import join_tables
+import postprocess_table
+import rpm_filter
+from kraken2_report import KRAKEN2_COLUMNS
+from schema import CLASSIFIER_SCHEMAS, apply_schema, get_joined_schema
+from table_io import write_table
+
+
+logger = logging.getLogger()
+
+# Classifiers in the order their tables are concatenated by concat_tables.py
+CLASSIFIERS: tuple = ("kaiju", "kraken2", "centrifuge")
+
+# rpm_filter.py options used for each classifier by the chained scripts. The kraken2
+# report is read as a table with new column names, 'rpm_filter.py -n 2 -c ...', not
+# with the report parser of 'rpm_filter.py -k', whose RPM values and names differ
+RPM_FILTER_OPTIONS: dict = {
+    "kaiju": {"reads_column_number": 2, "string_colname": "taxon_id"},
+    "kraken2": {"reads_column_number": 2, "column_names": ",".join(KRAKEN2_COLUMNS)},
+    "centrifuge": {"reads_column_number": 5},
+}
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "RPM filter, join with cami profiles, concatenate, add metadata and filter by "
+            "taxonomy the classifier reports of one sample without intermediate files"
+        ),
+        epilog=(
+            "Example: python gmsmetapost_postprocess.py --kaiju SRR12875570_pe-SRR12875570-kaiju.tsv "
+            "--kaiju-cami SRR12875570_pe-SRR12875570-kaiju.cami-profile.tsv ... "
+            "-p paired_end -s SRR12875570 -r 10 -t taxdump -o SRR12875570_pe-SRR12875570.final.tsv"
+        ),
+    )
+    for classifier in CLASSIFIERS:
+        parser.add_argument(
+            f"--{classifier}",
+            metavar="Path",
+            type=Path,
+            required=True,
+            help=f"The {classifier} output file",
+        )
+        parser.add_argument(
+            f"--{classifier}-cami",
+            metavar="Path",
+            type=Path,
+            required=True,
+            help=f"The cami profile of the {classifier} output",
+        )
+    parser.add_argument(
+        "-r",
+        "--rpm-filtering-threshold",
+        metavar="float",
+        type=float,
+        required=True,
+        help="The RPM value by which to filter the classifier tables",
+    )
+    parser.add_argument(
+        "-p",
+        "--pairing",
+        choices=("paired_end", "single_end"),
+        required=True,
+        help="Was the sample single end or paired end",
+    )
+    parser.add_argument(
+        "-s",
+        "--sample-name",
+        metavar="str",
+        type=str,
+        required=True,
+        help="Name of the sample",
+    )
+    parser.add_argument(
+        "-t",
+        "--ncbi-taxon-db",
+        metavar="Path",
+        type=Path,
+        required=True,
+        help="Path to the directory of the NCBI taxonomy dump",
+    )
+    parser.add_argument(
+        "-e",
+        "--taxonomy-engine",
+        choices=("snapshot", "taxonkit"),
+        default="snapshot",
+        help="Look up taxids from a memory-mapped taxonomy snapshot or with taxonkit (default snapshot)",
+    )
+    parser.add_argument(
+        "--taxonomy-snapshot",
+        metavar="Path",
+        type=Path,
+        help="Path to the taxonomy snapshot, built when missing or stale (default inside NCBI_TAXON_DB)",
+    )
+    parser.add_argument(
+        "-i",
+        "--include-clades",
+        metavar="str",
+        nargs="+",
+        default=["Viruses"],
+        help="Keep only taxa which belong to one of these clades (default Viruses)",
+    )
+    parser.add_argument(
+        "-x",
+        "--exclude-clades",
+        metavar="str",
+        nargs="+",
+        default=[],
+        help="Drop taxa which belong to one of these clades",
+    )
+    postprocess_table.add_taxonkit_arguments(parser)
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="Path",
+        type=Path,
+        required=True,
+        help="The final tsv file",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug-dir",
+        metavar="Path",
+        type=Path,
+        help="Write the intermediate tables of the chained scripts into this directory",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def write_debug_table(
+    df: pd.DataFrame, debug_file: Optional[Path], index: bool = False
+) -> None:
+    """Write an intermediate table the way the chained script producing it does
+
+    Args:
+        df (pd.DataFrame): Table produced by a stage
+        debug_file (Optional[Path]): The intermediate table, None when not dumped
+        index (bool, optional): Whether to write the index as the first column. Defaults to False.
+    """
+    if debug_file is not None:
+        logger.info("Writing intermediate table %s", debug_file)
+        write_table(df, debug_file, index=index)
+
+
+def get_debug_file(
+    debug_dir: Optional[Path], prefix: str, suffix: str
+) -> Optional[Path]:
+    """Get the path of an intermediate table named like by the chained scripts
+
+    Args:
+        debug_dir (Optional[Path]): Directory of the intermediate tables, None for no dumps
+        prefix (str): Sample prefix of the file name, e.g. 'SRR12875570_pe-SRR12875570'
+        suffix (str): Rest of the file name, e.g. '-kaiju.joined.tsv'
+
+    Returns:
+        Optional[Path]: Path of the intermediate table, None when not dumped
+    """
+    if debug_dir is None:
+        return None
+    return debug_dir / f"{prefix}{suffix}"
+
+
+def join_classifier(
+    classifier: str,
+    classifier_file: Path,
+    cami_file: Path,
+    rpm_filtering_threshold: float,
+    debug_dir: Optional[Path],
+    prefix: str,
+) -> pd.DataFrame:
+    """RPM filter a classifier output and join it with its cami profile
+
+    The tables get the column types of the readers of the chained scripts, so the
+    final table is the same as when the scripts pass the tables through files.
+
+    Args:
+        classifier (str): Name of the classifier, e.g. kaiju
+        classifier_file (Path): The classifier output file
+        cami_file (Path): The cami profile of the classifier output
+        rpm_filtering_threshold (float): The RPM value by which to filter the table
+        debug_dir (Optional[Path]): Directory of the intermediate tables, None for no dumps
+        prefix (str): Sample prefix of the intermediate file names
+
+    Returns:
+        pd.DataFrame: The joined table as read by concat_tables.py
+    """
+    options: dict = {"column_names": "", "string_colname": ""}
+    options.update(RPM_FILTER_OPTIONS[classifier])
+    filtered_df: pd.DataFrame = rpm_filter.rpm_filter_table(
+        rpm_filter.ManifestEntry(
+            classifier_output_file=classifier_file,
+            rpm_filtering_threshold=rpm_filtering_threshold,
+            **options,
+        )
+    )
+    if debug_dir is not None:
+        write_debug_table(
+            filtered_df,
+            debug_dir / rpm_filter.get_default_output_file(classifier_file).name,
+            index=True,
+        )
+    merged_df: pd.DataFrame = join_tables.join_dfs(
+        apply_schema(filtered_df, CLASSIFIER_SCHEMAS[classifier]),
+        join_tables.read_cami_output(cami_file),
+        classifier,
+    )
+    write_debug_table(
+        merged_df, get_debug_file(debug_dir, prefix, f"-{classifier}.joined.tsv")
+    )
+    return apply_schema(merged_df, get_joined_schema(classifier))
+
+
+def postprocess_sample(args: argparse.Namespace) -> pd.DataFrame:
+    """Run all postprocessing stages of one sample in memory
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        pd.DataFrame: The final hits table
+    """
+    prefix: str = args.output.name.split(".")[0]
+    joined_dfs: list[pd.DataFrame] = [
+        join_classifier(
+            classifier,
+            getattr(args, classifier),
+            getattr(args, f"{classifier}_cami"),
+            args.rpm_filtering_threshold,
+            args.debug_dir,
+            prefix,
+        )
+        for classifier in CLASSIFIERS
+    ]
+    # The concatenated table already has the columns types add_metadata.py reads
+    concatenated_df: pd.DataFrame = concat_tables.arrange_df(
+        concat_tables.concatenate_dfs(
+            [
+                concat_tables.process_df(classifier)
+                for classifier in zip(joined_dfs, CLASSIFIERS)
+            ]
+        )
+    )
+    write_debug_table(
+        concatenated_df, get_debug_file(args.debug_dir, prefix, ".concat.tsv")
+    )
+    meta_df: pd.DataFrame = add_metadata.add_metadata(
+        concatenated_df, args.pairing, args.sample_name
+    )
+    write_debug_table(meta_df, get_debug_file(args.debug_dir, prefix, ".meta.tsv"))
+    (df,) = postprocess_table.postprocess_dfs(
+        [meta_df],
+        args.ncbi_taxon_db,
+        args.taxonomy_engine,
+        args.taxonomy_snapshot,
+        args.include_clades,
+        args.exclude_clades,
+        postprocess_table.get_taxonkit_settings(args),
+    )
+    return df
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    for classifier in CLASSIFIERS:
+        for input_file in (
+            getattr(args, classifier),
+            getattr(args, f"{classifier}_cami"),
+        ):
+            if not input_file.is_file():
+                logger.error("The given input file %s was not found!", input_file)
+                sys.exit(1)
+    if args.debug_dir is not None:
+        args.debug_dir.mkdir(parents=True, exist_ok=True)
+
+    write_table(postprocess_sample(args), args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,9 @@ import sys
 from pathlib import Path
 import pandas as pd
 
+from schema import CAMI_SCHEMA, CLASSIFIER_SCHEMAS
+from table_io import read_table, write_table
+
 
 logger = logging.getLogger()
 
@@ -19,44 +22,13 @@ TAXID_COLS: dict = {
     "cami": "cami_taxid",
 }
 
-TABLE_DATA_TYPES: dict = {
-    "kaiju": {
-        "line_number": int,
-        "file": str,
-        "percent": float,
-        "reads_count": int,
-        "taxon_id": str,
-        "taxon_name": str,
-        "RPM": float,
-    },
-    "kraken2": {
-        "line_number": int,
-        "percentage_fragments_covered": float,
-        "num_fragments_covered": int,
-        "reads_count": int,
-        "rank_code": str,
-        "taxid": str,
-        "sci_name": str,
-        "RPM": float,
-    },
-    "centrifuge": {
-        "line_number": int,
-        "name": str,
-        "taxID": str,
-        "taxRank": str,
-        "genomeSize": int,
-        "numReads": int,
-        "reads_count": int,
-        "abundance": float,
-        "RPM": float,
-    },
-    "cami": {
-        "@@TAXID": str,
-        "RANK": str,
-        "TAXPATH": str,
-        "TAXPATHSN": str,
-        "PERCENTAGE": float,
-    },
+# Cami profile column names and the names they are given in the joined table
+CAMI_COLUMN_NAMES: dict = {
+    "@@TAXID": "cami_taxid",
+    "RANK": "cami_rank",
+    "TAXPATH": "cami_taxpath",
+    "TAXPATHSN": "cami_taxpathsn",
+    "PERCENTAGE": "cami_percentage",
 }
 
 
@@ -76,7 +48,7 @@ def parse_args(argv=None):
         "classifier_table",
         metavar="CLASSIFIER_TABLE",
         type=Path,
-        help="Filtered tsv file from, e.g. centrifuge, kaiju or kraken2",
+        help="Filtered tsv, Arrow IPC or Parquet file from, e.g. centrifuge, kaiju or kraken2",
     )
     parser.add_argument(
         "-o",
@@ -84,7 +56,7 @@ def parse_args(argv=None):
         metavar="Path",
         type=Path,
         default=Path("joined.tsv"),
-        help="The output tsv file name for the joined table",
+        help="The output file name for the joined table, the format is chosen by the extension",
     )
     parser.add_argument(
         "-c",
@@ -112,9 +84,9 @@ def read_classifier_output(tsv: Path, classifier_name: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: The tsv table converted into a DataFrame
     """
-    data_types: dict = TABLE_DATA_TYPES.get(classifier_name)
+    data_types: dict = CLASSIFIER_SCHEMAS.get(classifier_name)
     logger.info("Reading %s tsv file into a DataFrame", classifier_name)
-    return pd.read_table(tsv, index_col=0, dtype=data_types)
+    return read_table(tsv, index_col=0, dtype=data_types)
 
 
 def read_cami_output(tsv: Path) -> pd.DataFrame:
@@ -126,19 +98,15 @@ def read_cami_output(tsv: Path) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Cami profile table converted into a DataFrame
     """
-    data_types: dict = TABLE_DATA_TYPES.get("cami")
+    data_types: dict = {
+        column: CAMI_SCHEMA[new_column]
+        for column, new_column in CAMI_COLUMN_NAMES.items()
+    }
     logger.info("Reading cami profile into a pandas DataFrame")
-    df: pd.DataFrame = pd.read_table(tsv, skiprows=4, dtype=data_types)
+    df: pd.DataFrame = read_table(tsv, skiprows=4, dtype=data_types)
     # Get rid of '@@' in '@@TAXID'
-    col_name_mappings: dict = {
-        "@@TAXID": "cami_taxid",
-        "RANK": "cami_rank",
-        "TAXPATH": "cami_taxpath",
-        "TAXPATHSN": "cami_taxpathsn",
-        "PERCENTAGE": "cami_percentage",
-    }
     logger.info("Removing leading '@@' in '@@TAXID'")
-    df.rename(columns=col_name_mappings, errors="raise", inplace=True)
+    df.rename(columns=CAMI_COLUMN_NAMES, errors="raise", inplace=True)
     return df
 
 
@@ -191,7 +159,7 @@ def main(argv=None):
         classifier_name,
         out_tsv_file,
     )
-    merged_df.to_csv(out_tsv_file, sep="\t", index=False)
+    write_table(merged_df, out_tsv_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+"""Parse a kraken2 report and rebuild each taxon's parent and lineage from indentation."""
+
+import argparse
+import logging
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, NamedTuple
+import numpy as np
+import pandas as pd
+
+from table_io import open_table, write_table
+
+
+logger = logging.getLogger()
+
+# Column names of a kraken2 report, same as the kraken2 columns used in join_tables.py
+KRAKEN2_COLUMNS: tuple = (
+    "percentage_fragments_covered",
+    "num_fragments_covered",
+    "reads_count",
+    "rank_code",
+    "taxid",
+    "sci_name",
+)
+
+# Rank codes without a digit suffix, codes such as 'D1' or 'S2' are intermediate ranks
+KRAKEN2_RANKS: dict = {
+    "U": "unclassified",
+    "R": "root",
+    "D": "superkingdom",
+    "K": "kingdom",
+    "P": "phylum",
+    "C": "class",
+    "O": "order",
+    "F": "family",
+    "G": "genus",
+    "S": "species",
+}
+
+# Every level of the taxonomy tree is indented by two spaces in the name column
+INDENT_WIDTH: int = 2
+
+
+class Kraken2Report(NamedTuple):
+    """Columns of a kraken2 report as typed arrays, one element per report row"""
+
+    percentage_fragments_covered: np.ndarray
+    num_fragments_covered: np.ndarray
+    reads_count: np.ndarray
+    rank_code: np.ndarray
+    taxid: np.ndarray
+    sci_name: np.ndarray
+    depth: np.ndarray
+    parent: np.ndarray
+    lineage: np.ndarray
+    lineage_names: np.ndarray
+
+    @property
+    def parent_taxid(self) -> np.ndarray:
+        """Taxid of the parent of each row, 0 for rows without a parent"""
+        return np.where(self.parent >= 0, self.taxid[self.parent], 0)
+
+    @property
+    def rank(self) -> np.ndarray:
+        """Rank name of each row, 'no rank' for intermediate rank codes"""
+        return np.array(
+            [KRAKEN2_RANKS.get(code, "no rank") for code in self.rank_code],
+            dtype=object,
+        )
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Parse a kraken2 report and add parent taxid, rank and lineage of each taxon",
+        epilog="Example: python kraken2_report.py SRR12875570_pe-SRR12875570-kraken2.kraken2.report.tsv lineages.tsv",
+    )
+    parser.add_argument(
+        "kraken2_report",
+        metavar="KRAKEN2_REPORT",
+        type=Path,
+        help="The report file from kraken2",
+    )
+    parser.add_argument(
+        "output",
+        metavar="OUTPUT",
+        type=Path,
+        help="Tsv file with the parsed report columns and lineages",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_kraken2_report(lines: Iterable[str]) -> Kraken2Report:
+    """Parse kraken2 report lines in one pass
+
+    The depth of a taxon is given by the indentation of its name, so the
+    current path from the root is kept on a stack of row indices. Both the
+    standard six column reports and reports with minimizer data are accepted.
+
+    Args:
+        lines (Iterable[str]): Lines of a kraken2 report
+
+    Raises:
+        ValueError: Error raised when a line is not a valid kraken2 report line
+
+    Returns:
+        Kraken2Report: Typed report columns with parent row indices and lineages
+    """
+    percentages: array = array("d")
+    clade_reads: array = array("q")
+    taxon_reads: array = array("q")
+    taxids: array = array("q")
+    depths: array = array("i")
+    parents: array = array("q")
+    rank_codes: list[str] = []
+    names: list[str] = []
+    lineages: list[str] = []
+    lineage_names: list[str] = []
+    # Row indices of the ancestors of the current row, indexed by depth
+    path: list[int] = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        fields: list[str] = line.split("\t")
+        if len(fields) not in (6, 8):
+            raise ValueError(
+                f"Expected 6 or 8 tab separated columns on line {line_number}, got {len(fields)}"
+            )
+        name: str = fields[-1].lstrip(" ")
+        indent: int = len(fields[-1]) - len(name)
+        depth, remainder = divmod(indent, INDENT_WIDTH)
+        if remainder or depth > len(path):
+            raise ValueError(
+                f"Unexpected indentation of the name on line {line_number}"
+            )
+        del path[depth:]
+        parent: int = path[-1] if path else -1
+        row: int = len(names)
+        path.append(row)
+
+        taxid: str = fields[-2].strip()
+        percentages.append(float(fields[0]))
+        clade_reads.append(int(fields[1]))
+        taxon_reads.append(int(fields[2]))
+        rank_codes.append(fields[-3].strip())
+        taxids.append(int(taxid))
+        names.append(name)
+        depths.append(depth)
+        parents.append(parent)
+        if parent < 0:
+            lineages.append(taxid)
+            lineage_names.append(name)
+        else:
+            lineages.append(f"{lineages[parent]}|{taxid}")
+            lineage_names.append(f"{lineage_names[parent]}|{name}")
+    return Kraken2Report(
+        percentage_fragments_covered=np.frombuffer(percentages, dtype=np.float64),
+        num_fragments_covered=np.frombuffer(clade_reads, dtype=np.int64),
+        reads_count=np.frombuffer(taxon_reads, dtype=np.int64),
+        rank_code=np.array(rank_codes, dtype=object),
+        taxid=np.frombuffer(taxids, dtype=np.int64),
+        sci_name=np.array(names, dtype=object),
+        depth=np.frombuffer(depths, dtype=np.int32),
+        parent=np.frombuffer(parents, dtype=np.int64),
+        lineage=np.array(lineages, dtype=object),
+        lineage_names=np.array(lineage_names, dtype=object),
+    )
+
+
+def read_kraken2_report(report_file: Path) -> Kraken2Report:
+    """Read and parse a kraken2 report file
+
+    Args:
+        report_file (Path): Path to the kraken2 report, compressed or not
+
+    Returns:
+        Kraken2Report: Typed report columns with parent row indices and lineages
+    """
+    logger.info("Parsing kraken2 report %s", report_file)
+    with open_table(report_file) as report:
+        return parse_kraken2_report(report)
+
+
+def report_to_dataframe(
+    report: Kraken2Report, with_lineage: bool = True
+) -> pd.DataFrame:
+    """Convert a parsed kraken2 report into a DataFrame
+
+    Args:
+        report (Kraken2Report): Parsed kraken2 report
+        with_lineage (bool, optional): Whether to add the depth, parent taxid, rank and
+            lineage columns after the report columns. Defaults to True.
+
+    Returns:
+        pd.DataFrame: The report as a DataFrame with KRAKEN2_COLUMNS as the first columns
+    """
+    columns: dict = {column: getattr(report, column) for column in KRAKEN2_COLUMNS}
+    if with_lineage:
+        columns.update(
+            {
+                "depth": report.depth,
+                "parent_taxid": report.parent_taxid,
+                "rank": report.rank,
+                "lineage": report.lineage,
+                "lineage_names": report.lineage_names,
+            }
+        )
+    return pd.DataFrame(columns)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    report_file: Path = args.kraken2_report
+    if not report_file.is_file():
+        logger.error("The given input file %s was not found!", report_file)
+        sys.exit(1)
+    try:
+        report: Kraken2Report = read_kraken2_report(report_file)
+    except ValueError as parse_error_msg:
+        logger.error(
+            "The given file %s is not a kraken2 report:\n%s",
+            report_file,
+            parse_error_msg,
+        )
+        sys.exit(2)
+    write_table(report_to_dataframe(report), args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
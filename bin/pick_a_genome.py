@@ -2,31 +2,96 @@
 """Find from a multifasta file longest and most complete sequence and write it into a fasta file"""
 
 import argparse
+import contextlib
 import logging
+import os
 import sys
+import tempfile
 from pathlib import Path
-from Bio import SeqIO
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+from atomic_write import create_temp_file
 
 logger = logging.getLogger()
 
+# Key phrases of record descriptions from the most to the least complete
+COMPLETENESS_LEVELS: list[str] = [
+    "complete genome",
+    "complete sequence",
+    "complete cds",
+    "genomic sequence",
+    "partial genome",
+    "partial cds",
+    "allele",
+]
+
+COPY_BLOCK_SIZE: int = 1024**2
+
+
+class FastaRecord(NamedTuple):
+    """A fasta record located in a multifasta file like in a faidx index
+
+    The sequence starts at byte offset and takes size bytes including line breaks.
+    Records which sequence lines are not of equal width have line_bases 0.
+    """
+
+    description: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+    size: int
+
 
 def parse_args(argv=None):
     """Define and immediately parse command line arguments."""
     parser = argparse.ArgumentParser(
         description="Find from a multifasta file longest and most complete sequence and write it into a fasta file",
-        epilog="Example: python pick_a_genome.py multifasta.fna singlefasta.fna",
+        epilog=(
+            "Example: python pick_a_genome.py multifasta.fna singlefasta.fna\n"
+            "Example: blastdbcmd -db nt -taxids 694009,11676 | "
+            "python pick_a_genome.py - -m taxids.txt -s sample1"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
     )
     parser.add_argument(
         "input_multifasta",
         metavar="INPUT-MULTIFASTA",
         type=Path,
-        help="Input multifasta file",
+        help="Input multifasta file, '-' to read standard input",
     )
     parser.add_argument(
         "output_singlefasta",
         metavar="OUTPUT-SINGLEFASTA",
         type=Path,
-        help="Output single fasta file",
+        nargs="?",
+        help="Output single fasta file, not used with --taxid-map",
+    )
+    parser.add_argument(
+        "-m",
+        "--taxid-map",
+        metavar="taxid_map",
+        type=Path,
+        help='Sequence id and taxid of each record, e.g. from blastdbcmd -outfmt "%%a %%T". The best record of each taxid is written into <OUTPUT-DIR>/<taxid>_<SAMPLE>.fna.',
+    )
+    parser.add_argument(
+        "-s",
+        "--sample",
+        metavar="sample",
+        help="Sample name of the files written with --taxid-map",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        metavar="output_dir",
+        type=Path,
+        default=Path("."),
+        help="Directory of the files written with --taxid-map (default: current directory)",
+    )
+    parser.add_argument(
+        "-f",
+        "--faidx",
+        action="store_true",
+        help="Pick the record from the faidx index '<INPUT-MULTIFASTA>.fai' and title table '<INPUT-MULTIFASTA>.titles', building them when missing or outdated.",
     )
     parser.add_argument(
         "-l",
@@ -35,69 +100,418 @@ def parse_args(argv=None):
         choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
         default="ERROR",
     )
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+    if args.taxid_map is None and args.output_singlefasta is None:
+        parser.error("OUTPUT-SINGLEFASTA is required without --taxid-map")
+    if args.taxid_map is not None and args.output_singlefasta is not None:
+        parser.error("OUTPUT-SINGLEFASTA cannot be used with --taxid-map")
+    if args.taxid_map is not None and args.sample is None:
+        parser.error("--sample is required with --taxid-map")
+    if args.faidx and str(args.input_multifasta) == "-":
+        parser.error("--faidx cannot be used with standard input")
+    return args
 
 
-def find_seqs_by_description(
-    seqio_obj: SeqIO.SeqRecord, key_phrase: str
-) -> SeqIO.SeqRecord:
-    """Find SeqIO.SeqRecord instance with a matching key phrase
+def get_completeness_rank(description: str) -> int:
+    """Rank a record by the most complete key phrase found in its description
 
     Args:
-        seqio_obj (SeqIO.SeqRecord): SeqIO.SeqRecord object containing a record description
-        key_phrase (str): Key phrase to search in a record description
+        description (str): Description of a fasta record
 
     Returns:
-        SeqIO.SeqRecord: Object with the matching key phrase in the description
-    """ """"""
-    if key_phrase in seqio_obj.description:
-        return seqio_obj
+        int: Index of the key phrase in COMPLETENESS_LEVELS, len(COMPLETENESS_LEVELS)
+            when the description has none of them
+    """
+    for rank, completeness_level in enumerate(COMPLETENESS_LEVELS):
+        if completeness_level in description:
+            return rank
+    return len(COMPLETENESS_LEVELS)
+
+
+def scan_fasta_records(fasta_lines: Iterable[bytes]) -> Iterator[FastaRecord]:
+    """Locate the records of a multifasta file without keeping their sequences
+
+    Args:
+        fasta_lines (Iterable[bytes]): Lines of the multifasta file, e.g. the file
+            opened in binary mode
+
+    Yields:
+        Iterator[FastaRecord]: Description, sequence length and location of each record
+    """
+    description: Optional[str] = None
+    offset: int = 0
+    sequence_offset: int = 0
+    # End of the last line with bases, as if the last line of the file had a line break
+    sequence_end: int = 0
+    length: int = 0
+    line_bases: int = 0
+    line_width: int = 0
+    regular: bool = True
+    # A line shorter than the first one ends the sequence of a regular record
+    last_line_seen: bool = False
+    for line in fasta_lines:
+        # Most lines of a regular record are full lines like the first one, ending
+        # with b"\n" (10) and not starting a header with b">" (62)
+        if (
+            len(line) == line_width
+            and not last_line_seen
+            and line[-1] == 10
+            and line[0] != 62
+        ):
+            length += line_bases
+            sequence_end = offset + line_width
+        elif line.startswith(b">"):
+            if description is not None:
+                yield FastaRecord(
+                    description,
+                    length,
+                    sequence_offset,
+                    line_bases if regular else 0,
+                    line_width,
+                    max(sequence_end - sequence_offset, 0),
+                )
+            description = line[1:].decode("utf8", errors="replace").strip()
+            sequence_offset = offset + len(line)
+            length = line_bases = line_width = 0
+            regular = True
+            last_line_seen = False
+        elif description is not None:
+            bases: int = len(line.rstrip().replace(b" ", b""))
+            if bases:
+                length += bases
+                sequence_end = offset + len(line)
+                if not line.endswith(b"\n"):
+                    sequence_end += 1
+            if not bases:
+                last_line_seen = True
+            elif not line_bases:
+                line_bases = bases
+                line_width = sequence_end - offset
+                last_line_seen = not line.endswith(b"\n")
+            elif last_line_seen or bases > line_bases or len(line) > line_width:
+                regular = False
+            elif bases < line_bases or not line.endswith(b"\n"):
+                last_line_seen = True
+            elif len(line) != line_width:
+                regular = False
+        offset += len(line)
+    if description is not None:
+        yield FastaRecord(
+            description,
+            length,
+            sequence_offset,
+            line_bases if regular else 0,
+            line_width,
+            max(sequence_end - sequence_offset, 0),
+        )
 
 
-def sort_records_by_len(
-    seq_records: list[SeqIO.SeqRecord],
-) -> list[SeqIO.SeqRecord]:
-    """Sort a list of SeqIO.SeqRecord objects by their sequence length
+def get_sequence_size(length: int, line_bases: int, line_width: int) -> int:
+    """Get the size in bytes of a sequence from its faidx index entry
 
     Args:
-        seq_records (list[SeqIO.SeqRecord]): A list of SeqIO.SeqRecord
+        length (int): Sequence length
+        line_bases (int): Bases on each full line
+        line_width (int): Bytes on each full line, including the line break
 
     Returns:
-        list[SeqIO.SeqRecord]: A by sequence length sorted list of SeqIO.SeqRecord
+        int: Bytes of the sequence lines, including the line break of the last one
     """
-    return sorted(seq_records, key=lambda rec: len(rec), reverse=True)
+    if not line_bases:
+        return 0
+    full_lines, last_bases = divmod(length, line_bases)
+    if last_bases:
+        return full_lines * line_width + last_bases + line_width - line_bases
+    return full_lines * line_width
 
 
-def pick_longest_sequence(
-    seq_records: list[SeqIO.SeqRecord], completeness_level: str = None
-) -> SeqIO.SeqRecord:
-    """Sort sequence records by length and return the longest sequence
+def get_index_files(fasta: Path) -> tuple[Path, Path]:
+    """Get the faidx index and the title table of a multifasta file
 
     Args:
-        seq_records (list[SeqIO.SeqRecord]): List of SeqIO.SeqRecords
-        completeness_level (str, optional): The known completeness level of the sequences in the list. Defaults to None.
+        fasta (Path): The multifasta file
 
     Returns:
-        SeqIO.SeqRecord: The longest SeqIO.SeqRecord in the given list
+        tuple[Path, Path]: '<fasta>.fai' index and '<fasta>.titles' table of record
+            names and descriptions
     """
-    sorted_seq_records: list[SeqIO.SeqRecord] = sort_records_by_len(seq_records)
-    longest_seq_record: SeqIO.SeqRecord = sorted_seq_records[0]
-    logger.info(
-        "Record description: %s\nRecord ID: %s\nRecord length: %s",
-        longest_seq_record.description,
-        longest_seq_record.id,
-        str(len(longest_seq_record)),
+    return Path(f"{fasta}.fai"), Path(f"{fasta}.titles")
+
+
+def read_faidx(fasta: Path) -> Iterator[FastaRecord]:
+    """Read the records of a multifasta file from its faidx index and title table
+
+    Args:
+        fasta (Path): The multifasta file
+
+    Raises:
+        ValueError: Error raised when the index and the title table disagree
+
+    Yields:
+        Iterator[FastaRecord]: Description, sequence length and location of each record
+    """
+    fai_file, titles_file = get_index_files(fasta)
+    with fai_file.open(encoding="utf8") as fai_handle, titles_file.open(
+        encoding="utf8"
+    ) as titles_handle:
+        for fai_line, title_line in zip(fai_handle, titles_handle, strict=True):
+            name, length, offset, line_bases, line_width = fai_line.split("\t")[:5]
+            title_name, description = title_line.rstrip("\n").split("\t", 1)
+            if name != title_name:
+                raise ValueError(
+                    f"Record {name} of {fai_file} is {title_name} in {titles_file}"
+                )
+            yield FastaRecord(
+                description,
+                int(length),
+                int(offset),
+                int(line_bases),
+                int(line_width),
+                get_sequence_size(int(length), int(line_bases), int(line_width)),
+            )
+
+
+def is_faidx_current(fasta: Path) -> bool:
+    """Check if a multifasta file has a faidx index and a title table newer than itself
+
+    Args:
+        fasta (Path): The multifasta file
+
+    Returns:
+        bool: True if both the index and the title table can be used
+    """
+    fasta_mtime: float = fasta.stat().st_mtime
+    return all(
+        index_file.is_file() and index_file.stat().st_mtime >= fasta_mtime
+        for index_file in get_index_files(fasta)
     )
-    if completeness_level:
-        logger.info(
-            "Record completeness level: '%s'",
+
+
+def build_faidx(fasta_handle: BinaryIO, fasta: Path) -> Iterator[FastaRecord]:
+    """Locate the records of a multifasta file, writing its faidx index and title table
+
+    The index files are replaced only once all records are read, and not written
+    at all if the sequence lines of any record are not of equal width.
+
+    Args:
+        fasta_handle (BinaryIO): The multifasta file opened in binary mode
+        fasta (Path): Path of the multifasta file
+
+    Yields:
+        Iterator[FastaRecord]: Description, sequence length and location of each record
+    """
+    index_files: tuple[Path, Path] = get_index_files(fasta)
+    temp_files: list[str] = []
+    regular: bool = True
+    try:
+        with create_temp_file(
+            index_files[0], "w", encoding="utf8"
+        ) as temp_fai, create_temp_file(
+            index_files[1], "w", encoding="utf8"
+        ) as temp_titles:
+            temp_files += [temp_fai.name, temp_titles.name]
+            for record in scan_fasta_records(fasta_handle):
+                name: str = (
+                    record.description.split(maxsplit=1)[0]
+                    if record.description
+                    else ""
+                )
+                if record.length and not record.line_bases:
+                    regular = False
+                temp_fai.write(
+                    f"{name}\t{record.length}\t{record.offset}\t"
+                    f"{record.line_bases}\t{record.line_width}\n"
+                )
+                temp_titles.write(f"{name}\t{record.description}\n")
+                yield record
+        if regular:
+            for temp_file, index_file in zip(temp_files, index_files):
+                os.replace(temp_file, index_file)
+            temp_files.clear()
+        else:
+            logger.warning(
+                "Not indexing %s, its records have lines of different width", fasta
+            )
+    finally:
+        for temp_file in temp_files:
+            os.remove(temp_file)
+
+
+def pick_best_records(
+    grouped_records: Iterable[tuple[Optional[str], FastaRecord]],
+) -> dict:
+    """Pick the longest of the most complete records of each group, of equally good ones the first
+
+    A record counts at the most complete level found in its description, so the
+    best record of the most complete level any record of the group has wins.
+
+    Args:
+        grouped_records (Iterable[tuple[Optional[str], FastaRecord]]): Group, e.g. taxid,
+            and record pairs
+
+    Returns:
+        dict: Completeness rank and the best record by group
+    """
+    best: dict = {}
+    for group, record in grouped_records:
+        rank: int = get_completeness_rank(record.description)
+        current: Optional[tuple[int, FastaRecord]] = best.get(group)
+        if current is None or (rank, -record.length) < (
+            current[0],
+            -current[1].length,
+        ):
+            best[group] = (rank, record)
+    return best
+
+
+def read_taxid_map(taxid_map: Path) -> dict:
+    """Read the taxids of sequences, e.g. written by blastdbcmd -outfmt "%a %T"
+
+    Args:
+        taxid_map (Path): File of whitespace separated sequence id and taxid lines
+
+    Raises:
+        ValueError: Error raised when a line does not have two columns
+
+    Returns:
+        dict: Taxids by sequence id, a sequence may belong to several taxids
+    """
+    taxids: dict = {}
+    with taxid_map.open(encoding="utf8") as map_handle:
+        for line_number, line in enumerate(map_handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                seqid, taxid = line.split()
+            except ValueError:
+                raise ValueError(
+                    f"Line {line_number} of {taxid_map} is not a sequence id and a taxid"
+                ) from None
+            if taxid not in taxids.setdefault(seqid, []):
+                taxids[seqid].append(taxid)
+    return taxids
+
+
+def group_records_by_taxid(
+    records: Iterable[FastaRecord], taxid_map: dict
+) -> Iterator[tuple[str, FastaRecord]]:
+    """Pair records with the taxids of their sequence ids, skipping unmapped records
+
+    Args:
+        records (Iterable[FastaRecord]): The records
+        taxid_map (dict): Taxids by sequence id, the first word of a description
+
+    Yields:
+        Iterator[tuple[str, FastaRecord]]: Taxid and record pairs
+    """
+    for record in records:
+        seqid: str = (
+            record.description.split(maxsplit=1)[0] if record.description else ""
+        )
+        if seqid not in taxid_map:
+            logger.debug("No taxid for record %s, skipping it", seqid)
+            continue
+        for taxid in taxid_map[seqid]:
+            yield taxid, record
+
+
+def spool_lines(lines: Iterable[bytes], spool_handle: BinaryIO) -> Iterator[bytes]:
+    """Pass lines through while writing them into a file, so that a stream can be re-read
+
+    Args:
+        lines (Iterable[bytes]): Lines of a stream, e.g. standard input
+        spool_handle (BinaryIO): File to write the lines into
+
+    Yields:
+        Iterator[bytes]: The lines
+    """
+    for line in lines:
+        spool_handle.write(line)
+        yield line
+    spool_handle.flush()
+
+
+def log_picked_record(rank: int, record: FastaRecord, source: str) -> None:
+    """Log the completeness levels missing before the picked record and the record
+
+    Args:
+        rank (int): Completeness rank of the record
+        record (FastaRecord): The picked record
+        source (str): Input file or taxid the record was picked from
+    """
+    for completeness_level in COMPLETENESS_LEVELS[:rank]:
+        logger.warning(
+            "There weren't any records with '%s' completeness level in: '%s'",
             completeness_level,
+            source,
         )
-    else:
-        logger.info(
-            "Record completeness level: Unknown.",
+    if rank == len(COMPLETENESS_LEVELS):
+        logger.warning(
+            "There weren't any records with these '%s' completeness levels",
+            ", ".join(COMPLETENESS_LEVELS),
         )
-    return longest_seq_record
+    logger.info(
+        "Record description: %s\nRecord ID: %s\nRecord length: %s",
+        record.description,
+        record.description.split(maxsplit=1)[0] if record.description else "",
+        str(record.length),
+    )
+    if rank < len(COMPLETENESS_LEVELS):
+        logger.info("Record completeness level: '%s'", COMPLETENESS_LEVELS[rank])
+    else:
+        logger.info("Record completeness level: Unknown.")
+
+
+def copy_byte_range(
+    source: BinaryIO, offset: int, size: int, destination: BinaryIO
+) -> int:
+    """Copy a byte range of a file into another file, inside the kernel when possible
+
+    Args:
+        source (BinaryIO): The file to copy from
+        offset (int): Byte offset of the range in the source file
+        size (int): Bytes to copy, fewer are copied if the source file ends first
+        destination (BinaryIO): Unbuffered file object to write the bytes to, at its position
+
+    Returns:
+        int: Number of bytes copied
+    """
+    destination.flush()
+    copied: int = 0
+    try:
+        while copied < size and (
+            sent := os.sendfile(
+                destination.fileno(), source.fileno(), offset + copied, size - copied
+            )
+        ):
+            copied += sent
+    except (AttributeError, OSError):
+        # Without sendfile for regular files, e.g. on macOS, copy through user space
+        source.seek(offset + copied)
+        while copied < size and (
+            block := source.read(min(size - copied, COPY_BLOCK_SIZE))
+        ):
+            destination.write(block)
+            copied += len(block)
+    return copied
+
+
+def write_record(
+    fasta_handle: BinaryIO, record: FastaRecord, output_handle: BinaryIO
+) -> None:
+    """Write a record of a multifasta file, copying its sequence lines as is
+
+    Args:
+        fasta_handle (BinaryIO): The multifasta file opened in binary mode
+        record (FastaRecord): Location of the record in the file
+        output_handle (BinaryIO): Unbuffered file object to write the record to
+    """
+    output_handle.write(f">{record.description}\n".encode("utf8"))
+    # The last record of a file may lack its line break
+    if copy_byte_range(fasta_handle, record.offset, record.size, output_handle) < (
+        record.size
+    ):
+        output_handle.write(b"\n")
 
 
 def main(argv=None):
@@ -106,60 +520,68 @@ def main(argv=None):
     logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
 
     input_multifasta: Path = args.input_multifasta
-    if not input_multifasta.is_file():
+    from_stdin: bool = str(input_multifasta) == "-"
+    if not from_stdin and not input_multifasta.is_file():
         logger.error("The given input file %s was not found!", input_multifasta)
         sys.exit(1)
+    taxid_map: Optional[dict] = None
+    if args.taxid_map is not None:
+        if not args.taxid_map.is_file():
+            logger.error("The given input file %s was not found!", args.taxid_map)
+            sys.exit(1)
+        try:
+            taxid_map = read_taxid_map(args.taxid_map)
+        except ValueError as map_error_msg:
+            logger.error("Could not read the taxid map:\n%s", map_error_msg)
+            sys.exit(2)
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+    output_dir: Path = (
+        args.output_dir if taxid_map is not None else args.output_singlefasta.parent
+    )
 
-    COMPLETENESS_LEVELS: list[str] = [
-        "complete genome",
-        "complete sequence",
-        "complete cds",
-        "genomic sequence",
-        "partial genome",
-        "partial cds",
-        "allele",
-    ]
-
-    # Keep track of if a sequence of given completeness was found for logging purposes
-    completeness_level_found: bool = False
-    # Iterate through the records in the order of descending completeness level
-    # Check if there is any sequences with the given completeness levels
-    for completeness_level in COMPLETENESS_LEVELS:
-        # Find all records of given completeness level
-        if seq_records := [
-            find_seqs_by_description(seq_record, completeness_level)
-            for seq_record in SeqIO.parse(input_multifasta, "fasta")
-            if find_seqs_by_description(seq_record, completeness_level) is not None
-        ]:
-            completeness_level_found = True
-            longest_seq_record: SeqIO.SeqRecord = pick_longest_sequence(
-                seq_records, completeness_level
-            )
-            # Write the longest and most complete fasta record into a file
-            SeqIO.write(longest_seq_record, args.output_singlefasta, "fasta")
-            break  # Jump out of the for loop when we've found the longest sequence of the highest completeness
-        else:
-            logger.warning(
-                "There weren't any records with '%s' completeness level in: '%s'",
-                completeness_level,
-                input_multifasta,
-            )
-    # If there weren't any sequences with given completeness levels then pick just the longest sequence
-    if not completeness_level_found:
-        logger.warning(
-            "There weren't any records with these '%s' completeness levels",
-            ", ".join(COMPLETENESS_LEVELS),
-        )
-        if seq_records := list(SeqIO.parse(input_multifasta, "fasta")):
-            longest_seq_record: SeqIO.SeqRecord = pick_longest_sequence(seq_records)
-            # Write the longest and most complete fasta record into a file
-            SeqIO.write(longest_seq_record, args.output_singlefasta, "fasta")
+    with contextlib.ExitStack() as stack:
+        fasta_handle: BinaryIO
+        records: Iterator[FastaRecord]
+        if from_stdin:
+            # The stream is spooled into a file to copy the picked records from
+            fasta_handle = stack.enter_context(tempfile.TemporaryFile(dir=output_dir))
+            records = scan_fasta_records(spool_lines(sys.stdin.buffer, fasta_handle))
         else:
+            fasta_handle = stack.enter_context(input_multifasta.open("rb"))
+            if not args.faidx:
+                records = scan_fasta_records(fasta_handle)
+            elif is_faidx_current(input_multifasta):
+                # The sequence lines are not read at all
+                records = read_faidx(input_multifasta)
+            else:
+                records = build_faidx(fasta_handle, input_multifasta)
+        # One pass over the records keeps only the location of the best ones so far
+        try:
+            if taxid_map is None:
+                best: dict = pick_best_records((None, record) for record in records)
+            else:
+                best = pick_best_records(group_records_by_taxid(records, taxid_map))
+        except ValueError as index_error_msg:
+            logger.error("Could not read the faidx index:\n%s", index_error_msg)
+            sys.exit(2)
+        if not best:
             logger.error(
                 "There weren't any records in the fasta file '%s' completeness levels",
                 input_multifasta,
             )
             sys.exit(2)
+        for taxid, (rank, record) in best.items():
+            output_fasta: Path = (
+                args.output_singlefasta
+                if taxid is None
+                else args.output_dir / f"{taxid}_{args.sample}.fna"
+            )
+            log_picked_record(
+                rank, record, str(input_multifasta) if taxid is None else taxid
+            )
+            # Write the longest and most complete fasta record into a file
+            with output_fasta.open("wb", buffering=0) as output_handle:
+                write_record(fasta_handle, record, output_handle)
 
 
 if __name__ == "__main__":
@@ -2,18 +2,106 @@
 """Post-process hits table so that it can be readily used for downloading genomes."""
 
 import argparse
+import csv
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
 import tempfile
 from subprocess import run, TimeoutExpired, CalledProcessError
+from typing import NamedTuple, Optional
+import numpy as np
 
-from tomlkit import boolean
+from schema import HITS_TABLE_SCHEMA
+from table_io import read_table, write_table
+from taxonomy import Taxonomy, load_taxonomy
 
 
 logger = logging.getLogger()
 
+# Columns of the batch manifest
+MANIFEST_COLUMNS: tuple = ("input", "output")
+
+# Taxids of these ranks are left out of the post-processed hits table
+RANKS_TO_EXCLUDE: list[str] = [
+    "superkingdom",
+    "clade",
+    "kingdom",
+    "phylum",
+    "class",
+    "order",
+    "suborder",
+    "family",
+    # "subfamily","genus","subgenus","species","no rank"
+]
+
+
+class _EmptyTaxonkitOutput(Exception):
+    """Raised when a taxonkit run succeeds without writing anything"""
+
+
+class TaxonkitSettings(NamedTuple):
+    """How taxids are split into chunks and run with taxonkit"""
+
+    chunk_size: int = 10000
+    threads: int = 4
+    timeout: int = 180
+    retries: int = 2
+
+
+def add_taxonkit_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options of TaxonkitSettings to a command line parser
+
+    Args:
+        parser (argparse.ArgumentParser): The parser, read back with get_taxonkit_settings
+    """
+    parser.add_argument(
+        "--taxonkit-chunk-size",
+        metavar="int",
+        type=int,
+        default=TaxonkitSettings().chunk_size,
+        help="Maximum number of taxids in one taxonkit run",
+    )
+    parser.add_argument(
+        "--taxonkit-threads",
+        metavar="int",
+        type=int,
+        default=TaxonkitSettings().threads,
+        help="Number of concurrent taxonkit runs",
+    )
+    parser.add_argument(
+        "--taxonkit-timeout",
+        metavar="int",
+        type=int,
+        default=TaxonkitSettings().timeout,
+        help="Timeout in seconds of one taxonkit run",
+    )
+    parser.add_argument(
+        "--taxonkit-retries",
+        metavar="int",
+        type=int,
+        default=TaxonkitSettings().retries,
+        help="How many times a timed out taxonkit run is retried",
+    )
+
+
+def get_taxonkit_settings(args: argparse.Namespace) -> TaxonkitSettings:
+    """Get the TaxonkitSettings of arguments parsed with add_taxonkit_arguments
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        TaxonkitSettings: How taxonkit is run
+    """
+    return TaxonkitSettings(
+        chunk_size=args.taxonkit_chunk_size,
+        threads=args.taxonkit_threads,
+        timeout=args.taxonkit_timeout,
+        retries=args.taxonkit_retries,
+    )
+
 
 def parse_args(argv=None):
     """Define and immediately parse command line arguments."""
@@ -25,14 +113,27 @@ def parse_args(argv=None):
         "input",
         metavar="INPUT",
         type=Path,
+        nargs="?",
         help="Tsv file containing unprocessed hits table",
     )
     parser.add_argument(
         "output",
         metavar="OUTPUT",
         type=Path,
+        nargs="?",
         help="Tsv file containing post-processed hits table",
     )
+    parser.add_argument(
+        "-b",
+        "--batch-manifest",
+        metavar="Path",
+        type=Path,
+        help=(
+            "A tsv manifest with columns: "
+            + ", ".join(MANIFEST_COLUMNS)
+            + ". Taxids of all listed tables are looked up together"
+        ),
+    )
     parser.add_argument(
         "-t",
         "--ncbi-taxon-db",
@@ -41,6 +142,43 @@ def parse_args(argv=None):
         default=Path("../temp/taxdump"),
         help="Path to NCBI taxonomy database",
     )
+    parser.add_argument(
+        "-e",
+        "--taxonomy-engine",
+        help=(
+            "Answer taxonomy queries in-process from a memory-mapped snapshot or "
+            "by running taxonkit (default snapshot)"
+        ),
+        choices=("snapshot", "taxonkit"),
+        default="snapshot",
+    )
+    parser.add_argument(
+        "-s",
+        "--taxonomy-snapshot",
+        metavar="Path",
+        type=Path,
+        help=(
+            "Taxonomy snapshot file, built from the NCBI taxonomy database if it is "
+            "missing or outdated (default 'gmsmetapost_taxonomy.bin' in the database)"
+        ),
+    )
+    parser.add_argument(
+        "-i",
+        "--include-clades",
+        metavar="CLADE",
+        nargs="+",
+        default=["Viruses"],
+        help="Taxids or scientific names of clades which taxa to keep (default Viruses)",
+    )
+    parser.add_argument(
+        "-x",
+        "--exclude-clades",
+        metavar="CLADE",
+        nargs="*",
+        default=[],
+        help="Taxids or scientific names of clades which taxa to leave out",
+    )
+    add_taxonkit_arguments(parser)
     parser.add_argument(
         "-l",
         "--log-level",
@@ -68,12 +206,15 @@ def get_unique_taxid_list(
         taxid_col: pd.Series = df[col_name][df["classifier"] == classifier_name]
     else:
         taxid_col: pd.Series = df[col_name]
-    taxid_col.dropna(inplace=True)
-    return list(set(taxid_col.tolist()))
+    return [str(taxid) for taxid in taxid_col.dropna().unique()]
 
 
 def run_taxonkit_lineage(
-    temp_taxid_file: Path, db: Path, no_lineage: bool, show_name: bool
+    temp_taxid_file: Path,
+    db: Path,
+    no_lineage: bool,
+    show_name: bool,
+    timeout: int = 180,
 ) -> str:
     """Run taxonkit lineage on a list of taxids file
 
@@ -82,6 +223,12 @@ def run_taxonkit_lineage(
         db (Path): Path to NCBI taxonomy database (necessary for taxonkit to work)
         no_lineage (bool): Whether to exclude lineage information from the output
         show_name (bool): Whether to show scientific name in the last column
+        timeout (int, optional): Timeout in seconds of the run. Defaults to 180.
+
+    Raises:
+        TimeoutExpired: Error raised when taxonkit did not finish in time
+        CalledProcessError: Error raised when taxonkit exited with a non-zero code
+        _EmptyTaxonkitOutput: Error raised when taxonkit did not write any output
 
     Returns:
         str: Stdout from taxonkit lineage run
@@ -98,38 +245,26 @@ def run_taxonkit_lineage(
         run_cmd.append("--no-lineage")
     if show_name:
         run_cmd.append("--show-name")
-    try:
-        result = run(
-            run_cmd,
-            check=True,
-            timeout=180,
-            capture_output=True,
-            text=True,
-        )
-    except TimeoutExpired as timeout_error_msg:
-        logger.error(
-            "Running taxonkit took too long time for file: %s\n%s",
-            temp_taxid_file,
-            timeout_error_msg,
-        )
-        sys.exit(1)
-    except CalledProcessError as called_proc_error_msg:
-        logger.error(
-            "The return code of the program run for file %s was non-zero: \n%s",
-            temp_taxid_file,
-            called_proc_error_msg,
-        )
-        sys.exit(2)
-    if result.stdout:
-        return result.stdout
-    logger.error(
-        "The program run for file %s didn't produce any output:", temp_taxid_file
+    result = run(
+        run_cmd,
+        check=True,
+        timeout=timeout,
+        capture_output=True,
+        text=True,
     )
-    sys.exit(3)
+    if not result.stdout:
+        raise _EmptyTaxonkitOutput(
+            f"The program run for file {temp_taxid_file} didn't produce any output"
+        )
+    return result.stdout
 
 
 def get_taxonkit_lineage_results(
-    taxids: list[str], db: Path, no_lineage: bool, show_name: bool
+    taxids: list[str],
+    db: Path,
+    no_lineage: bool,
+    show_name: bool,
+    timeout: int = 180,
 ) -> str:
     """Run taxonkit lineage on given list of taxids
 
@@ -138,6 +273,7 @@ def get_taxonkit_lineage_results(
         db (Path): Path to the NCBI taxonomy database (necessary for taxonkit to work)
         no_lineage (bool): Whether to exclude lineage information from the output
         show_name (bool): Whether to show scientific name in the last column
+        timeout (int, optional): Timeout in seconds of the run. Defaults to 180.
 
     Returns:
         str: Tab delimited table of taxids and sci names
@@ -147,7 +283,146 @@ def get_taxonkit_lineage_results(
         for taxid in taxids:
             fp.write(str.encode(f"{taxid}\n"))
         fp.seek(0)
-        return run_taxonkit_lineage(Path(fp.name), db, no_lineage, show_name)
+        return run_taxonkit_lineage(Path(fp.name), db, no_lineage, show_name, timeout)
+
+
+def run_taxonkit_chunk(
+    chunk: list[str],
+    db: Path,
+    no_lineage: bool,
+    show_name: bool,
+    settings: TaxonkitSettings,
+) -> list[list[str]]:
+    """Run taxonkit lineage on one chunk of taxids, retrying it if it times out
+
+    Args:
+        chunk (list[str]): List of taxids which should be run with taxonkit lineage
+        db (Path): Path to the NCBI taxonomy database (necessary for taxonkit to work)
+        no_lineage (bool): Whether to exclude lineage information from the output
+        show_name (bool): Whether to show scientific name in the last column
+        settings (TaxonkitSettings): Timeout and number of retries of the runs
+
+    Raises:
+        TimeoutExpired: Error raised when all attempts timed out
+        CalledProcessError: Error raised when taxonkit exited with a non-zero code
+        _EmptyTaxonkitOutput: Error raised when taxonkit did not write any output
+
+    Returns:
+        list[list[str]]: Parsed taxonkit lineage results of the chunk
+    """
+    for attempt in range(1, settings.retries + 2):
+        try:
+            return parse_taxonkit_results(
+                get_taxonkit_lineage_results(
+                    chunk, db, no_lineage, show_name, settings.timeout
+                )
+            )
+        except TimeoutExpired as timeout_error_msg:
+            logger.warning(
+                "Running taxonkit took too long time for %s taxids starting with %s "
+                "(attempt %s of %s)",
+                len(chunk),
+                chunk[0],
+                attempt,
+                settings.retries + 1,
+            )
+            if attempt > settings.retries:
+                raise timeout_error_msg
+
+
+def get_chunked_taxonkit_lineage_results(
+    taxids: list[str],
+    db: Path,
+    no_lineage: bool,
+    show_name: bool,
+    settings: TaxonkitSettings = TaxonkitSettings(),
+) -> list[list[str]]:
+    """Run taxonkit lineage on deduplicated taxids split into concurrently run chunks
+
+    Args:
+        taxids (list[str]): List of taxids which should be run with taxonkit lineage
+        db (Path): Path to the NCBI taxonomy database (necessary for taxonkit to work)
+        no_lineage (bool): Whether to exclude lineage information from the output
+        show_name (bool): Whether to show scientific name in the last column
+        settings (TaxonkitSettings, optional): Chunk size, number of concurrent runs,
+            timeout and number of retries. Defaults to TaxonkitSettings().
+
+    Returns:
+        list[list[str]]: Parsed taxonkit lineage results in the order of the deduplicated taxids
+    """
+    unique_taxids: list[str] = list(dict.fromkeys(taxids))
+    chunks: list[list[str]] = [
+        unique_taxids[i : i + settings.chunk_size]
+        for i in range(0, len(unique_taxids), settings.chunk_size)
+    ]
+    logger.info(
+        "Running taxonkit on %s taxids in %s chunks", len(unique_taxids), len(chunks)
+    )
+    executor = ThreadPoolExecutor(max_workers=settings.threads)
+    try:
+        chunk_results: list[list[list[str]]] = list(
+            executor.map(
+                lambda chunk: run_taxonkit_chunk(
+                    chunk, db, no_lineage, show_name, settings
+                ),
+                chunks,
+            )
+        )
+    except TimeoutExpired as timeout_error_msg:
+        logger.error(
+            "Running taxonkit took too long time for all attempts:\n%s",
+            timeout_error_msg,
+        )
+        sys.exit(1)
+    except CalledProcessError as called_proc_error_msg:
+        logger.error(
+            "The return code of the program run was non-zero: \n%s\n%s",
+            called_proc_error_msg,
+            called_proc_error_msg.stderr,
+        )
+        sys.exit(2)
+    except _EmptyTaxonkitOutput as empty_output_msg:
+        logger.error(empty_output_msg)
+        sys.exit(3)
+    finally:
+        # Chunks not started yet are not run after an error
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [row for chunk_result in chunk_results for row in chunk_result]
+
+
+def get_taxonomy_lineage_results(
+    taxids: list[str], taxonomy: Taxonomy, no_lineage: bool, show_name: bool
+) -> list[list[str]]:
+    """Answer taxonkit lineage queries from an in-process taxonomy index
+
+    The rows are identical to the parsed output of 'taxonkit lineage --show-rank',
+    i.e. taxid, lineage, scientific name and rank, where lineage and name are
+    included only if asked for and unknown taxids get empty values.
+
+    Args:
+        taxids (list[str]): List of taxids which lineages to look up
+        taxonomy (Taxonomy): The taxonomy index
+        no_lineage (bool): Whether to exclude lineage information from the output
+        show_name (bool): Whether to show scientific name in the last column
+
+    Returns:
+        list[list[str]]: List of lists of strings with each element containing one row of results
+    """
+    results: list[list[str]] = []
+    for taxid in taxids:
+        current_taxid: int = taxonomy.resolve(int(taxid)) if taxid.isdigit() else 0
+        row: list[str] = [taxid]
+        if not no_lineage:
+            row.append(
+                ";".join(taxonomy.name(x) for x in taxonomy.lineage(current_taxid))
+                if current_taxid
+                else ""
+            )
+        if show_name:
+            row.append(taxonomy.name(current_taxid) if current_taxid else "")
+        row.append(taxonomy.rank(current_taxid) if current_taxid else "")
+        results.append(row)
+    return results
 
 
 def parse_taxonkit_results(results: str) -> list[str]:
@@ -162,19 +437,24 @@ def parse_taxonkit_results(results: str) -> list[str]:
     return [x.split("\t") for x in results.split("\n") if x]
 
 
-def get_taxids_of_superkingdom(
-    parsed_results: list[list[str]], kingdom: str
+def get_taxids_of_clades(
+    parsed_results: list[list[str]], clades: list[str]
 ) -> list[str]:
-    """Get a list of taxids of given superkingdom
+    """Get a list of taxids which lineage contains any of the given clades
 
     Args:
-        results (str): Parsed taxonkit lineage results
-        kingdom (str): The kingdom which taxids are returned
+        parsed_results (list[list[str]]): Parsed taxonkit lineage results
+        clades (list[str]): Scientific names of the clades which taxids are returned
 
     Returns:
-        list[str]: Taxids from the user given kingdom
+        list[str]: Taxids from the user given clades
     """
-    return [parsed_row[0] for parsed_row in parsed_results if kingdom in parsed_row[1]]
+    clade_names: set = set(clades)
+    return [
+        parsed_row[0]
+        for parsed_row in parsed_results
+        if not clade_names.isdisjoint(parsed_row[1].split(";"))
+    ]
 
 
 def get_taxids_of_excluded_ranks(
@@ -189,11 +469,115 @@ def get_taxids_of_excluded_ranks(
     Returns:
         list[str]: List of taxids belonging to ranks that we want to exclude
     """
+    excluded_ranks: set = set(ranks_to_exclude)
     return [
         parsed_row[0]
         for parsed_row in parsed_results
-        if parsed_row[3] in ranks_to_exclude
+        if parsed_row[3] in excluded_ranks
+    ]
+
+
+def get_wanted_taxids(
+    parsed_results: list[list[str]],
+    include_clades: list[str],
+    exclude_clades: list[str],
+    ranks_to_exclude: list[str],
+) -> set[str]:
+    """Get taxids under the included clades but not under excluded clades or of excluded ranks
+
+    Args:
+        parsed_results (list[list[str]]): Parsed taxonkit lineage results
+        include_clades (list[str]): Scientific names of the clades to keep
+        exclude_clades (list[str]): Scientific names of the clades to leave out
+        ranks_to_exclude (list[str]): Ranks to leave out
+
+    Returns:
+        set[str]: Taxids which rows to keep
+    """
+    return (
+        set(get_taxids_of_clades(parsed_results, include_clades))
+        .difference(get_taxids_of_clades(parsed_results, exclude_clades))
+        .difference(get_taxids_of_excluded_ranks(parsed_results, ranks_to_exclude))
+    )
+
+
+def get_clade_names(
+    clades: list[str], db: Path, settings: TaxonkitSettings = TaxonkitSettings()
+) -> list[str]:
+    """Convert clades given as taxids into scientific names with taxonkit
+
+    Args:
+        clades (list[str]): Taxids or scientific names of clades
+        db (Path): Path to the NCBI taxonomy database (necessary for taxonkit to work)
+        settings (TaxonkitSettings, optional): How taxonkit is run. Defaults to TaxonkitSettings().
+
+    Returns:
+        list[str]: Scientific names of the clades
+    """
+    clade_taxids: list[str] = [clade for clade in clades if clade.isdigit()]
+    if not clade_taxids:
+        return clades
+    names: dict = {
+        parsed_row[0]: parsed_row[1]
+        for parsed_row in get_chunked_taxonkit_lineage_results(
+            clade_taxids, db, True, True, settings
+        )
+    }
+    return [names.get(clade, clade) for clade in clades]
+
+
+def get_clade_taxids(clades: list[str], taxonomy: Taxonomy) -> list[int]:
+    """Convert clades given as taxids or scientific names into current taxids
+
+    Args:
+        clades (list[str]): Taxids or scientific names of clades
+        taxonomy (Taxonomy): The taxonomy index
+
+    Returns:
+        list[int]: Current taxids of the clades, unknown clades are left out
+    """
+    clade_taxids: list[int] = []
+    for clade in clades:
+        if clade.isdigit():
+            found: list[int] = [taxonomy.resolve(int(clade))]
+        else:
+            found: list[int] = taxonomy.find_taxids(clade)
+        if not any(found):
+            logger.warning("Clade %s was not found in the taxonomy", clade)
+        clade_taxids.extend(taxid for taxid in found if taxid)
+    return clade_taxids
+
+
+def get_wanted_taxids_mask(
+    taxids: pd.Series,
+    taxonomy: Taxonomy,
+    include_taxids: list[int],
+    exclude_taxids: list[int],
+    ranks_to_exclude: list[str],
+) -> np.ndarray:
+    """Check a whole taxid column against included and excluded clades and ranks
+
+    Args:
+        taxids (pd.Series): Taxid column of a hits table
+        taxonomy (Taxonomy): The taxonomy index
+        include_taxids (list[int]): Taxids of the clades to keep
+        exclude_taxids (list[int]): Taxids of the clades to leave out
+        ranks_to_exclude (list[str]): Ranks to leave out
+
+    Returns:
+        np.ndarray: Boolean mask which is True for the rows to keep
+    """
+    current_taxids: np.ndarray = taxonomy.resolve_many(
+        pd.to_numeric(taxids, errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    )
+    excluded_rank_codes: list[int] = [
+        code for code, rank in enumerate(taxonomy.ranks) if rank in ranks_to_exclude
     ]
+    return (
+        taxonomy.descends_from(current_taxids, include_taxids)
+        & ~taxonomy.descends_from(current_taxids, exclude_taxids)
+        & ~np.isin(taxonomy.rank_code[current_taxids], excluded_rank_codes)
+    )
 
 
 def read_input_table(tsv: Path) -> pd.DataFrame:
@@ -205,91 +589,165 @@ def read_input_table(tsv: Path) -> pd.DataFrame:
     Returns:
         pd.DataFrame: DataFrame of the tsv table
     """
-    data_types: dict = {
-        "taxon_name": str,
-        "rpm": float,
-        "taxid": str,
-        "taxonomic_rank": str,
-        "classifier": str,
-        "centrifuge_genome_size": str,
-        "centrifuge_num_reads": str,
-        "centrifuge_abundance": float,
-        "kaiju_percent": float,
-        "kraken2_percentage_fragments_covered": float,
-        "kraken2_num_fragments_covered": str,
-        "reads_count": int,
-        "cami_taxid": str,
-        "cami_rank": str,
-        "cami_taxpath": str,
-        "cami_taxpathsn": str,
-        "cami_percentage": float,
-    }
     logger.info("Reading %s tsv file into a DataFrame", tsv)
-    return pd.read_table(tsv, index_col=False, dtype=data_types)
+    return read_table(tsv, index_col=False, dtype=HITS_TABLE_SCHEMA)
 
 
-def main(argv=None):
-    """Coordinate program execution."""
-    args = parse_args(argv)
-    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+def read_manifest(manifest: Path) -> list[tuple[Path, Path]]:
+    """Read a batch manifest tsv file
 
-    # Read input tsv file
-    input_tsv: Path = args.input
-    if not input_tsv.is_file():
-        logger.error("The given input file %s was not found!", input_tsv)
-        sys.exit(1)
-    df = read_input_table(input_tsv)
+    Args:
+        manifest (Path): Path to the manifest with columns listed in MANIFEST_COLUMNS
 
+    Returns:
+        list[tuple[Path, Path]]: Input and output tsv file paths in the order of the file
+    """
+    with manifest.open(newline="") as in_handle:
+        reader = csv.DictReader(in_handle, delimiter="\t")
+        if not set(MANIFEST_COLUMNS).issubset(reader.fieldnames or []):
+            logger.error(
+                "The batch manifest must contain the column headers: %s",
+                ", ".join(MANIFEST_COLUMNS),
+            )
+            sys.exit(1)
+        return [(Path(row["input"]), Path(row["output"])) for row in reader]
+
+
+def postprocess_df(
+    df: pd.DataFrame, taxon_names: dict, keep: np.ndarray
+) -> pd.DataFrame:
+    """Rename kaiju taxa, keep only wanted rows and drop duplicate taxids
+
+    Args:
+        df (pd.DataFrame): Unprocessed hits table
+        taxon_names (dict): Scientific names by taxid, covering at least the kaiju taxids
+        keep (np.ndarray): Boolean mask which is True for the rows to keep
+
+    Returns:
+        pd.DataFrame: Post-processed hits table
+    """
     # Exchange non-descriptive taxon names such as "taxonid:297" to
     # "Hydrogenophilus thermoluteolus" in kaiju output results rows
-    kaiju_taxids: list[str] = get_unique_taxid_list(df, classifier_name="kaiju")
-    kaiju_taxonkit_results = get_taxonkit_lineage_results(
-        kaiju_taxids, args.ncbi_taxon_db, no_lineage=True, show_name=True
-    )
-    parsed_kaiju_tax_results: list[list[str]] = parse_taxonkit_results(
-        kaiju_taxonkit_results
-    )
     kaiju_taxonomy_mappings: dict = {
-        f"taxonid:{taxon_name[0]}": taxon_name[1]
-        for taxon_name in parsed_kaiju_tax_results
+        f"taxonid:{taxid}": taxon_names[taxid]
+        for taxid in get_unique_taxid_list(df, classifier_name="kaiju")
+        if taxid in taxon_names
     }
     df.replace({"taxon_name": kaiju_taxonomy_mappings}, inplace=True)
 
-    # Get a list of taxids belonging to the wanted kingdom
-    all_unique_taxids: list[str] = get_unique_taxid_list(df)
-    taxonkit_results: str = get_taxonkit_lineage_results(
-        all_unique_taxids, args.ncbi_taxon_db, no_lineage=False, show_name=True
-    )
-    parsed_tax_results: list[list[str]] = parse_taxonkit_results(taxonkit_results)
-    viral_taxids: list[str] = get_taxids_of_superkingdom(parsed_tax_results, "Viruses")
-
-    # Get a list of taxids of unwanted ranks
-    ranks_to_exclude: list[str] = [
-        "superkingdom",
-        "clade",
-        "kingdom",
-        "phylum",
-        "class",
-        "order",
-        "suborder",
-        "family",
-        # "subfamily","genus","subgenus","species","no rank"
-    ]
-    excluded_taxids: list[str] = get_taxids_of_excluded_ranks(
-        parsed_tax_results, ranks_to_exclude
-    )
-
     # Keep only rows with wanted taxids
-    viral_taxids_after_exluded_ranks: list[str] = list(
-        set(viral_taxids).difference(set(excluded_taxids))
-    )
-    df = df[df.taxid.isin(viral_taxids_after_exluded_ranks) == True]
+    df = df[keep]
 
     # Drop rows with duplicate taxids, keep the first occurence of these rows
     df.drop_duplicates(subset=["taxid"], keep="first", inplace=True)
+    return df
+
+
+def postprocess_dfs(
+    dfs: list[pd.DataFrame],
+    ncbi_taxon_db: Path,
+    taxonomy_engine: str,
+    taxonomy_snapshot: Optional[Path],
+    include_clades: list[str],
+    exclude_clades: list[str],
+    taxonkit_settings: TaxonkitSettings = TaxonkitSettings(),
+) -> list[pd.DataFrame]:
+    """Look up the taxids of hits tables together and post-process each table
+
+    Args:
+        dfs (list[pd.DataFrame]): Unprocessed hits tables
+        ncbi_taxon_db (Path): Path to the NCBI taxonomy database
+        taxonomy_engine (str): 'snapshot' or 'taxonkit'
+        taxonomy_snapshot (Optional[Path]): Taxonomy snapshot file of the snapshot engine,
+            None for the default one in the database
+        include_clades (list[str]): Taxids or scientific names of the clades to keep
+        exclude_clades (list[str]): Taxids or scientific names of the clades to leave out
+        taxonkit_settings (TaxonkitSettings, optional): How taxonkit is run. Defaults to TaxonkitSettings().
+
+    Returns:
+        list[pd.DataFrame]: Post-processed hits tables in the order of dfs
+    """
+    all_unique_taxids: list[str] = list(
+        dict.fromkeys(taxid for df in dfs for taxid in get_unique_taxid_list(df))
+    )
+    if taxonomy_engine == "snapshot":
+        taxonomy: Taxonomy = load_taxonomy(ncbi_taxon_db, taxonomy_snapshot)
+        taxon_names: dict = {
+            parsed_row[0]: parsed_row[1]
+            for parsed_row in get_taxonomy_lineage_results(
+                all_unique_taxids, taxonomy, True, True
+            )
+        }
+        include_taxids: list[int] = get_clade_taxids(include_clades, taxonomy)
+        exclude_taxids: list[int] = get_clade_taxids(exclude_clades, taxonomy)
+        keeps: list[np.ndarray] = [
+            get_wanted_taxids_mask(
+                df["taxid"],
+                taxonomy,
+                include_taxids,
+                exclude_taxids,
+                RANKS_TO_EXCLUDE,
+            )
+            for df in dfs
+        ]
+    else:
+        parsed_tax_results: list[list[str]] = get_chunked_taxonkit_lineage_results(
+            all_unique_taxids, ncbi_taxon_db, False, True, taxonkit_settings
+        )
+        taxon_names: dict = {
+            parsed_row[0]: parsed_row[2] for parsed_row in parsed_tax_results
+        }
+        wanted_taxids: set[str] = get_wanted_taxids(
+            parsed_tax_results,
+            get_clade_names(include_clades, ncbi_taxon_db, taxonkit_settings),
+            get_clade_names(exclude_clades, ncbi_taxon_db, taxonkit_settings),
+            RANKS_TO_EXCLUDE,
+        )
+        keeps: list[np.ndarray] = [
+            df["taxid"].isin([int(taxid) for taxid in wanted_taxids]).to_numpy()
+            for df in dfs
+        ]
+    return [postprocess_df(df, taxon_names, keep) for df, keep in zip(dfs, keeps)]
+
 
-    # Print to tsv file
-    df.to_csv(args.output, sep="\t", index=False)
+def main(argv=None):
+    """Coordinate program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if args.batch_manifest:
+        if not args.batch_manifest.is_file():
+            logger.error(
+                "The given manifest file %s was not found!", args.batch_manifest
+            )
+            sys.exit(1)
+        tables: list[tuple[Path, Path]] = read_manifest(args.batch_manifest)
+    elif args.input and args.output:
+        tables: list[tuple[Path, Path]] = [(args.input, args.output)]
+    else:
+        logger.error("Either INPUT and OUTPUT or a batch manifest must be given!")
+        sys.exit(1)
+
+    # Read input tsv files
+    for input_tsv, _ in tables:
+        if not input_tsv.is_file():
+            logger.error("The given input file %s was not found!", input_tsv)
+            sys.exit(1)
+    dfs: list[pd.DataFrame] = [read_input_table(input_tsv) for input_tsv, _ in tables]
+
+    # Look up the taxids of all tables at once
+    postprocessed_dfs: list[pd.DataFrame] = postprocess_dfs(
+        dfs,
+        args.ncbi_taxon_db,
+        args.taxonomy_engine,
+        args.taxonomy_snapshot,
+        args.include_clades,
+        args.exclude_clades,
+        get_taxonkit_settings(args),
+    )
+    for df, (_, output_tsv) in zip(postprocessed_dfs, tables):
+        # Print to tsv file
+        write_table(df, output_tsv)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""Remove the rows of excludable taxids from a hits table"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import BinaryIO
+from atomic_write import create_temp_file
+from compressed_io import open_table
+
+
+logger = logging.getLogger()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Remove the rows of excludable taxids from a hits table",
+        epilog="Example: python remove_missing_taxids.py sample1.tsv sample1_excludable_taxids.txt sample1.validated.tsv",
+    )
+    parser.add_argument(
+        "input_tsv",
+        metavar="INPUT-TSV",
+        type=Path,
+        help="Hits table with a 'taxid' column",
+    )
+    parser.add_argument(
+        "excludable_txt",
+        metavar="EXCLUDABLE-TXT",
+        type=Path,
+        help="Excludable taxids, one per line",
+    )
+    parser.add_argument(
+        "output_tsv",
+        metavar="OUTPUT-TSV",
+        type=Path,
+        help="Output table without the rows of the excludable taxids",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def read_excludable_taxids(excludable_txt: Path) -> set[bytes]:
+    """Read excludable taxids
+
+    Args:
+        excludable_txt (Path): Taxids, one per line
+
+    Returns:
+        set[bytes]: The taxids as written in a table
+    """
+    with excludable_txt.open("rb") as excludable_handle:
+        return {line.strip() for line in excludable_handle if line.strip()}
+
+
+def filter_rows(
+    in_handle: BinaryIO, out_handle: BinaryIO, excludable_taxids: set[bytes]
+) -> tuple[int, int]:
+    """Copy the rows of a tsv table except those of excludable taxids
+
+    Args:
+        in_handle (BinaryIO): The table opened in binary mode
+        out_handle (BinaryIO): File object to write the kept rows to, as they are
+        excludable_taxids (set[bytes]): Taxids which rows are removed
+
+    Raises:
+        KeyError: Error raised when the table has no 'taxid' column
+
+    Returns:
+        tuple[int, int]: Number of kept and removed rows
+    """
+    header: bytes = in_handle.readline()
+    columns: list[bytes] = header.rstrip(b"\r\n").split(b"\t")
+    if b"taxid" not in columns:
+        raise KeyError("No 'taxid' column in the table")
+    taxid_column: int = columns.index(b"taxid")
+    out_handle.write(header)
+    kept: int = 0
+    removed: int = 0
+    for line in in_handle:
+        fields: list[bytes] = line.split(b"\t", taxid_column + 1)
+        if (
+            len(fields) > taxid_column
+            and fields[taxid_column].rstrip(b"\r\n") in excludable_taxids
+        ):
+            removed += 1
+            continue
+        out_handle.write(line)
+        kept += 1
+    return kept, removed
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    for input_file in (args.input_tsv, args.excludable_txt):
+        if not input_file.is_file():
+            logger.error("The given input file %s was not found!", input_file)
+            sys.exit(1)
+    excludable_taxids: set[bytes] = read_excludable_taxids(args.excludable_txt)
+
+    # The table is written under a temporary name and renamed once complete
+    output_tsv: Path = args.output_tsv
+    with create_temp_file(output_tsv, suffix=output_tsv.suffix) as temp_tsv:
+        pass
+    try:
+        with open_table(args.input_tsv, "rb") as in_handle, open_table(
+            temp_tsv.name, "wb"
+        ) as out_handle:
+            kept, removed = filter_rows(in_handle, out_handle, excludable_taxids)
+    except KeyError as column_error_msg:
+        os.remove(temp_tsv.name)
+        logger.error("Could not filter %s:\n%s", args.input_tsv, column_error_msg)
+        sys.exit(2)
+    except BaseException:
+        os.remove(temp_tsv.name)
+        raise
+    os.replace(temp_tsv.name, output_tsv)
+    logger.info(
+        "Removed %d rows of %d excludable taxids, kept %d rows",
+        removed,
+        len(excludable_taxids),
+        kept,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
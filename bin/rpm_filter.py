@@ -2,14 +2,49 @@
 """Calculate RPM values for each called taxon."""
 
 import argparse
+import csv
 import logging
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import NamedTuple, Optional
+import numpy as np
 import pandas as pd
 
+from kraken2_report import KRAKEN2_COLUMNS, read_kraken2_report, report_to_dataframe
+from table_io import read_table, split_compression, write_table
+
 
 logger = logging.getLogger()
 
+# Relative distance from a half below which RPM values are rounded one at a time,
+# well above the error of multiplying a double by ten
+ROUNDING_TOLERANCE: float = 1e-9
+
+# Columns of the batch manifest, named after the corresponding command line options
+MANIFEST_COLUMNS: tuple = (
+    "classifier_output_file",
+    "reads_column_number",
+    "column_names",
+    "string_colname",
+    "rpm_filtering_threshold",
+)
+
+# Accepted values for enabling the optional 'kraken2_report' column of the manifest
+TRUE_VALUES: tuple = ("1", "true", "yes")
+
+
+class ManifestEntry(NamedTuple):
+    """One classifier output file to filter and the options to filter it with"""
+
+    classifier_output_file: Path
+    reads_column_number: Optional[int]
+    column_names: str
+    string_colname: str
+    rpm_filtering_threshold: float
+    kraken2_report: bool = False
+
 
 def parse_args(argv=None):
     """Define and immediately parse command line arguments."""
@@ -21,14 +56,39 @@ def parse_args(argv=None):
         "classifier_output_file",
         metavar="CLASSIFIER_OUTPUT_FILE",
         type=Path,
+        nargs="?",
         help="The tsv file from, e.g. centrifuge, kaiju or kraken2",
     )
+    parser.add_argument(
+        "-b",
+        "--batch-manifest",
+        metavar="Path",
+        type=Path,
+        help=(
+            "A tsv manifest with columns: "
+            + ", ".join(MANIFEST_COLUMNS)
+            + " and optionally kraken2_report. Each listed file is filtered into a "
+            + "'.filtered.tsv' file next to it"
+        ),
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        metavar="int",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes used in batch mode (default number of CPUs)",
+    )
     parser.add_argument(
         "-o",
         "--rpm-filtered-output-file",
         metavar="Path",
         type=Path,
-        help="The output tsv file which has been filtered by user given rpm value",
+        help=(
+            "The output file which has been filtered by user given rpm value, written as "
+            "Arrow IPC or Parquet for .arrow, .feather, .ipc or .parquet extensions and "
+            "as tsv otherwise"
+        ),
     )
     parser.add_argument(
         "-n",
@@ -51,6 +111,15 @@ def parse_args(argv=None):
         help="Name of a column that must be read as string, e.g 'taxon_id' in kaiju output",
         type=str,
     )
+    parser.add_argument(
+        "-k",
+        "--kraken2-report",
+        action="store_true",
+        help=(
+            "Read the input with the dedicated kraken2 report parser, the reads column "
+            "defaults then to the taxon's own reads count"
+        ),
+    )
     parser.add_argument(
         "-r",
         "--rpm-filtering-threshold",
@@ -78,8 +147,8 @@ def read_classifier_output_file(tsv: Path, str_column_name: str = "") -> pd.Data
         pd.DataFrame: Classifier output file as a DataFrame
     """
     if str_column_name:
-        return pd.read_table(tsv, index_col=False, dtype={str_column_name: str})
-    return pd.read_table(tsv, index_col=False)
+        return read_table(tsv, index_col=False, dtype={str_column_name: str})
+    return read_table(tsv, index_col=False)
 
 
 def prepare_df(
@@ -106,7 +175,9 @@ def prepare_df(
     if col_names:
         df.columns = col_names
     else:
-        df.columns.values[reads_col_index] = reads_col_name
+        column_names: list[str] = df.columns.tolist()
+        column_names[reads_col_index] = reads_col_name
+        df.columns = column_names
     return df
 
 
@@ -125,21 +196,47 @@ def get_sum_of_column(df: pd.DataFrame, column_to_get_sum_of: int) -> int:
     return col_sum
 
 
+def calculate_rpm(
+    df: pd.DataFrame, col_sum_per_million: float, col_name: str = "reads_count"
+) -> pd.Series:
+    """Calculate rounded RPM values for every row using column arithmetic
+
+    Args:
+        df (pd.DataFrame): DataFrame with the reads counts assigned to taxons
+        col_sum_per_million (float): Sum of all reads divided by million
+        col_name (str, optional): Column name where the reads counts assigned to taxons are. Defaults to "reads_count".
+
+    Returns:
+        pd.Series: RPM values rounded to one decimal like Python's round
+    """
+    rpm: pd.Series = df[col_name] * col_sum_per_million
+    rounded: pd.Series = rpm.round(1)
+    # Series.round rounds the value times ten, which can land on the other side of
+    # a half than the value itself, e.g. 1.15 rounds to 1.2 instead of 1.1. Values
+    # that close to a half are rounded one by one like the per-row round did
+    scaled: np.ndarray = rpm.to_numpy(dtype=np.float64, na_value=np.nan) * 10
+    near_half: np.ndarray = np.abs(
+        scaled - np.floor(scaled) - 0.5
+    ) <= ROUNDING_TOLERANCE * np.maximum(np.abs(scaled), 1)
+    if near_half.any():
+        rounded[near_half] = [round(value, 1) for value in rpm[near_half].tolist()]
+    return rounded
+
+
 def add_rpm_column(
-    df: pd.DataFrame, col_sum_per_million: int, col_name: str = "reads_count"
+    df: pd.DataFrame, col_sum_per_million: float, col_name: str = "reads_count"
 ) -> pd.DataFrame:
     """Add Reads per million column to given data frame
 
     Args:
         df (pd.DataFrame): Pandas DataFrame where the RPM column is to be added
-        col_sum_per_million (int): Sum of all reads divided by million
+        col_sum_per_million (float): Sum of all reads divided by million
         col_name (str, optional): Column name where the reads counts assigned to taxons are. Defaults to "reads_count".
 
     Returns:
         pd.DataFrame: DataFrame where the RPM column is added
     """
-    df["RPM"] = df.apply(lambda row: row[col_name] * col_sum_per_million, axis=1)
-    df["RPM"] = df.apply(lambda row: round(row["RPM"], 1), axis=1)
+    df["RPM"] = calculate_rpm(df, col_sum_per_million, col_name)
     return df
 
 
@@ -156,6 +253,29 @@ def filter_by_rpm(df: pd.DataFrame, rpm_value: float) -> pd.DataFrame:
     return df[df["RPM"] >= rpm_value]
 
 
+def add_rpm_column_and_filter(
+    df: pd.DataFrame,
+    col_sum_per_million: float,
+    rpm_value: float,
+    col_name: str = "reads_count",
+) -> pd.DataFrame:
+    """Calculate RPM values and keep only rows reaching the threshold in one pass
+
+    Args:
+        df (pd.DataFrame): Pandas DataFrame where the RPM column is to be added
+        col_sum_per_million (float): Sum of all reads divided by million
+        rpm_value (float): The threshold RPM value to use for filtering
+        col_name (str, optional): Column name where the reads counts assigned to taxons are. Defaults to "reads_count".
+
+    Returns:
+        pd.DataFrame: Filtered DataFrame where the RPM column is added
+    """
+    rpm: pd.Series = calculate_rpm(df, col_sum_per_million, col_name)
+    keep: pd.Series = rpm >= rpm_value
+    # Only the kept rows are copied, RPM is aligned to them by index
+    return df[keep].assign(RPM=rpm[keep])
+
+
 def post_process_df(df: pd.DataFrame, index_name: str = "line_number") -> pd.DataFrame:
     """Drop old index and give the new index a name
 
@@ -171,43 +291,179 @@ def post_process_df(df: pd.DataFrame, index_name: str = "line_number") -> pd.Dat
     return df
 
 
-def main(argv=None):
-    """Coordinate argument parsing and program execution."""
-    args = parse_args(argv)
-    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
-    classifier_file: Path = args.classifier_output_file
-    if not classifier_file.is_file():
-        logger.error("The given input file %s was not found!", classifier_file)
-        sys.exit(1)
+def rpm_filter_table(entry: ManifestEntry) -> pd.DataFrame:
+    """Read a classifier output file, add RPM values and filter it by RPM
+
+    Args:
+        entry (ManifestEntry): The classifier output file and options for filtering it
+
+    Returns:
+        pd.DataFrame: The RPM filtered table with 'line_number' as index
+    """
+    reads_col_index: int = entry.reads_column_number
+    if entry.kraken2_report:
+        df: pd.DataFrame = report_to_dataframe(
+            read_kraken2_report(entry.classifier_output_file), with_lineage=False
+        )
+        if reads_col_index is None:
+            reads_col_index = KRAKEN2_COLUMNS.index("reads_count")
     # Should some column name be read as string?
-    if args.string_colname:
+    elif entry.string_colname:
         df: pd.DataFrame = read_classifier_output_file(
-            classifier_file, args.string_colname
+            entry.classifier_output_file, entry.string_colname
         )
     else:
-        df: pd.DataFrame = read_classifier_output_file(classifier_file)
-    reads_col_index: int = args.reads_column_number
-    col_names: str = args.column_names
-    if col_names:
-        cols: list = col_names.split(",")
+        df: pd.DataFrame = read_classifier_output_file(entry.classifier_output_file)
+    if entry.column_names:
+        cols: list = entry.column_names.split(",")
         df_prepared: pd.DataFrame = prepare_df(df, reads_col_index, cols)
     else:
         df_prepared: pd.DataFrame = prepare_df(df, reads_col_index)
     col_sum: int = get_sum_of_column(df_prepared, reads_col_index)
     col_sum_per_million: float = col_sum / 1000000
-    df_rpm_added: pd.DataFrame = add_rpm_column(df_prepared, col_sum_per_million)
-    df_rpm_filtered: pd.DataFrame = filter_by_rpm(
-        df_rpm_added, args.rpm_filtering_threshold
+    df_rpm_filtered: pd.DataFrame = add_rpm_column_and_filter(
+        df_prepared, col_sum_per_million, entry.rpm_filtering_threshold
+    )
+    return post_process_df(df_rpm_filtered)
+
+
+def get_default_output_file(classifier_file: Path) -> Path:
+    """Get the default output path, i.e. '<stem>.filtered.tsv' next to the input file
+
+    A compressed input file, e.g. '<stem>.tsv.gz', gives a compressed output file
+    '<stem>.filtered.tsv.gz'.
+
+    Args:
+        classifier_file (Path): Classifier output file path
+
+    Returns:
+        Path: Path to the RPM filtered output file
+    """
+    uncompressed_file, compression = split_compression(classifier_file)
+    return Path(
+        f"{str(uncompressed_file.parent)}/{str(uncompressed_file.stem)}.filtered.tsv"
+        + (compression or "")
+    )
+
+
+def process_manifest_entry(entry: ManifestEntry) -> Path:
+    """RPM filter one classifier output file and write it next to its input
+
+    Args:
+        entry (ManifestEntry): The classifier output file and options for filtering it
+
+    Returns:
+        Path: Path to the written RPM filtered output file
+    """
+    output_file: Path = get_default_output_file(entry.classifier_output_file)
+    write_table(rpm_filter_table(entry), output_file, index=True)
+    logger.info("Wrote RPM filtered table: %s", output_file)
+    return output_file
+
+
+def read_manifest(manifest: Path) -> list[ManifestEntry]:
+    """Read a batch manifest tsv file
+
+    Args:
+        manifest (Path): Path to the manifest with columns listed in MANIFEST_COLUMNS
+
+    Returns:
+        list[ManifestEntry]: Parsed manifest rows in the order of the file
+    """
+    with manifest.open(newline="") as in_handle:
+        reader = csv.DictReader(in_handle, delimiter="\t")
+        if not set(MANIFEST_COLUMNS).issubset(reader.fieldnames or []):
+            logger.error(
+                "The batch manifest must contain the column headers: %s",
+                ", ".join(MANIFEST_COLUMNS),
+            )
+            sys.exit(1)
+        entries: list[ManifestEntry] = []
+        for row in reader:
+            kraken2_report: bool = (
+                row.get("kraken2_report") or ""
+            ).lower() in TRUE_VALUES
+            if not row["reads_column_number"] and not kraken2_report:
+                logger.error(
+                    "Line %d of the batch manifest %s has no reads_column_number",
+                    reader.line_num,
+                    manifest,
+                )
+                sys.exit(2)
+            entries.append(
+                ManifestEntry(
+                    classifier_output_file=Path(row["classifier_output_file"]),
+                    reads_column_number=(
+                        int(row["reads_column_number"])
+                        if row["reads_column_number"]
+                        else None
+                    ),
+                    column_names=row["column_names"],
+                    string_colname=row["string_colname"],
+                    rpm_filtering_threshold=float(row["rpm_filtering_threshold"]),
+                    kraken2_report=kraken2_report,
+                )
+            )
+        return entries
+
+
+def run_batch(entries: list[ManifestEntry], threads: Optional[int]) -> list[Path]:
+    """RPM filter all manifest entries over a pool of worker processes
+
+    Args:
+        entries (list[ManifestEntry]): Classifier output files and options for filtering them
+        threads (Optional[int]): Number of worker processes, None uses all CPUs
+
+    Returns:
+        list[Path]: Paths to the written output files in the order of the entries
+    """
+    if threads == 1 or len(entries) <= 1:
+        return [process_manifest_entry(entry) for entry in entries]
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(process_manifest_entry, entries))
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if args.batch_manifest:
+        if not args.batch_manifest.is_file():
+            logger.error(
+                "The given manifest file %s was not found!", args.batch_manifest
+            )
+            sys.exit(1)
+        entries: list[ManifestEntry] = read_manifest(args.batch_manifest)
+        for entry in entries:
+            if not entry.classifier_output_file.is_file():
+                logger.error(
+                    "The given input file %s was not found!",
+                    entry.classifier_output_file,
+                )
+                sys.exit(1)
+        run_batch(entries, args.threads)
+        return
+
+    classifier_file: Path = args.classifier_output_file
+    if not classifier_file or not classifier_file.is_file():
+        logger.error("The given input file %s was not found!", classifier_file)
+        sys.exit(1)
+    df: pd.DataFrame = rpm_filter_table(
+        ManifestEntry(
+            classifier_output_file=classifier_file,
+            reads_column_number=args.reads_column_number,
+            column_names=args.column_names,
+            string_colname=args.string_colname,
+            rpm_filtering_threshold=args.rpm_filtering_threshold,
+            kraken2_report=args.kraken2_report,
+        )
     )
-    df = post_process_df(df_rpm_filtered)
     output_fname: Path = args.rpm_filtered_output_file
     if output_fname:
-        df.to_csv(output_fname, sep="\t")
+        write_table(df, output_fname, index=True)
     else:
-        default_name = (
-            f"{str(classifier_file.parent)}/{str(classifier_file.stem)}.filtered.tsv"
-        )
-        df.to_csv(default_name, sep="\t")
+        write_table(df, get_default_output_file(classifier_file), index=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Column data types of the tables passed between the bin/ scripts."""
+
+import pandas as pd
+
+# Nullable integers, so that taxids missing e.g. from a left join stay integers
+TAXID = "Int32"
+COUNT = "Int64"
+# Percentages do not need double precision
+PERCENTAGE = "float32"
+# Columns with few distinct values are stored once per value
+CATEGORY = "category"
+
+# Columns of the RPM filtered classifier tables written by rpm_filter.py
+CLASSIFIER_SCHEMAS: dict = {
+    "kaiju": {
+        "line_number": "int64",
+        "file": CATEGORY,
+        "percent": PERCENTAGE,
+        "reads_count": "int64",
+        "taxon_id": TAXID,
+        "taxon_name": str,
+        "RPM": "float64",
+    },
+    "kraken2": {
+        "line_number": "int64",
+        "percentage_fragments_covered": PERCENTAGE,
+        "num_fragments_covered": "int64",
+        "reads_count": "int64",
+        "rank_code": CATEGORY,
+        "taxid": TAXID,
+        "sci_name": str,
+        "RPM": "float64",
+    },
+    "centrifuge": {
+        "line_number": "int64",
+        "name": str,
+        "taxID": TAXID,
+        "taxRank": CATEGORY,
+        "genomeSize": "int64",
+        "numReads": "int64",
+        "reads_count": "int64",
+        "abundance": PERCENTAGE,
+        "RPM": "float64",
+    },
+}
+
+# Columns of a cami profile after the '@@' of '@@TAXID' is removed and 'cami_' is prefixed
+CAMI_SCHEMA: dict = {
+    "cami_taxid": TAXID,
+    "cami_rank": CATEGORY,
+    "cami_taxpath": CATEGORY,
+    "cami_taxpathsn": CATEGORY,
+    "cami_percentage": PERCENTAGE,
+}
+
+# Columns of the concatenated hits table, with the metadata added by add_metadata.py
+HITS_TABLE_SCHEMA: dict = {
+    "taxon_name": str,
+    "rpm": "float64",
+    "taxid": TAXID,
+    "taxonomic_rank": CATEGORY,
+    "classifier": CATEGORY,
+    "centrifuge_genome_size": COUNT,
+    "centrifuge_num_reads": COUNT,
+    "centrifuge_abundance": PERCENTAGE,
+    "kaiju_percent": PERCENTAGE,
+    "kraken2_percentage_fragments_covered": PERCENTAGE,
+    "kraken2_num_fragments_covered": COUNT,
+    "reads_count": "int64",
+    **CAMI_SCHEMA,
+    "pairing": CATEGORY,
+    "sample_name": CATEGORY,
+}
+
+
+def get_joined_schema(classifier_name: str) -> dict:
+    """Get the columns of a classifier table joined with its cami profile
+
+    Args:
+        classifier_name (str): Name of the classifier, e.g. kaiju
+
+    Returns:
+        dict: Data types by column name
+    """
+    return {**CLASSIFIER_SCHEMAS[classifier_name], **CAMI_SCHEMA}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Cast the columns of a DataFrame which are in the schema
+
+    Args:
+        df (pd.DataFrame): DataFrame to cast
+        schema (dict): Data types by column name, columns not in the DataFrame are ignored
+
+    Returns:
+        pd.DataFrame: DataFrame with the schema's data types
+    """
+    return df.astype(
+        {
+            column: column_type
+            for column, column_type in schema.items()
+            if column in df.columns and column_type is not str
+        }
+    )
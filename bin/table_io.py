@@ -0,0 +1,507 @@
+#!/usr/bin/env python
+"""Read and write the tables passed between the bin/ scripts in a format chosen by file extension."""
+
+import argparse
+import logging
+import os
+import sys
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+import pandas as pd
+from compressed_io import open_table, split_compression
+
+logger = logging.getLogger()
+
+# Typed columnar formats by file extension, every other extension is read and written as tsv
+COLUMNAR_FORMATS: dict = {
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".parquet": "parquet",
+}
+
+# Environment variable naming the tsv parser in TSV_READERS to use instead of the fastest available one
+TSV_READER_ENV: str = "GMSMETAPOST_TSV_READER"
+
+# Tsv tables are formatted WRITE_CHUNK_ROWS rows at a time
+WRITE_CHUNK_ROWS: int = 100_000
+
+# Characters which make DataFrame.to_csv quote a tsv field
+QUOTED_CHARACTERS: tuple = ("\t", '"', "\n", "\r")
+
+# Fields pd.read_table reads as missing values by default
+NA_VALUES: tuple = (
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+)
+
+
+class _PandasParserRequired(Exception):
+    """Raised by a tsv parser for tables or options which only the pandas parser reads like pd.read_table"""
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Convert a table between tsv, Arrow IPC and Parquet formats by file extension",
+        epilog="Example: python table_io.py SRR12875570_pe-SRR12875570.concat.arrow SRR12875570_pe-SRR12875570.concat.tsv",
+    )
+    parser.add_argument(
+        "input",
+        metavar="INPUT",
+        type=Path,
+        help="The table to convert",
+    )
+    parser.add_argument(
+        "output",
+        metavar="OUTPUT",
+        type=Path,
+        help="The converted table, the format is chosen by the extension ("
+        + ", ".join(COLUMNAR_FORMATS)
+        + ", otherwise tsv)",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def get_table_format(path: Union[Path, str]) -> str:
+    """Get the format of a table from its file extension
+
+    Args:
+        path (Union[Path, str]): Path to the table, tsv tables can be compressed
+
+    Raises:
+        ValueError: Error raised for a compressed columnar table
+
+    Returns:
+        str: 'arrow', 'parquet' or 'tsv'
+    """
+    uncompressed_path, compression = split_compression(path)
+    table_format: str = COLUMNAR_FORMATS.get(uncompressed_path.suffix.lower(), "tsv")
+    if compression and table_format != "tsv":
+        raise ValueError(
+            f"Columnar tables are compressed internally, remove {compression} from {path}"
+        )
+    return table_format
+
+
+def is_columnar(path) -> bool:
+    """Check if a table is stored in a typed columnar format
+
+    Args:
+        path: Path to the table, in-memory buffers are always tsv
+
+    Returns:
+        bool: True for Arrow IPC and Parquet files
+    """
+    return isinstance(path, (Path, str)) and get_table_format(path) != "tsv"
+
+
+def import_pyarrow():
+    """Import pyarrow, which is only needed for the columnar formats
+
+    Raises:
+        ImportError: Error raised when pyarrow is not installed
+
+    Returns:
+        module: The pyarrow.feather module
+    """
+    try:
+        from pyarrow import feather
+    except ImportError as import_error:
+        raise ImportError(
+            "Reading or writing Arrow IPC and Parquet tables requires pyarrow"
+        ) from import_error
+    return feather
+
+
+def read_tsv_pandas(
+    path,
+    index_col: Union[int, bool, None] = None,
+    dtype: Optional[dict] = None,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """Read a tsv table with the C parser of pandas
+
+    Floats are parsed with round-trip precision, like with the pyarrow parser, so both
+    parsers give identical values.
+
+    Args:
+        path: Path to the table, compressed or not, or an in-memory tsv buffer
+        index_col (Union[int, bool, None], optional): Column to use as the index. Defaults to None.
+        dtype (Optional[dict], optional): Data types by column name. Defaults to None.
+        read_kwargs: Further options for pd.read_table
+
+    Returns:
+        pd.DataFrame: The table
+    """
+    read_kwargs.setdefault("float_precision", "round_trip")
+    if not isinstance(path, (Path, str)):
+        return pd.read_table(path, index_col=index_col, dtype=dtype, **read_kwargs)
+    with open_table(path) as in_handle:
+        return pd.read_table(in_handle, index_col=index_col, dtype=dtype, **read_kwargs)
+
+
+def read_tsv_pyarrow(
+    path,
+    index_col: Union[int, bool, None] = None,
+    dtype: Optional[dict] = None,
+    skiprows: int = 0,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """Read a tsv table with the multithreaded parser of pyarrow
+
+    Missing values, column names and data types follow pd.read_table.
+
+    Args:
+        path: Path to the table
+        index_col (Union[int, bool, None], optional): Column to use as the index. Defaults to None.
+        dtype (Optional[dict], optional): Data types by column name. Defaults to None.
+        skiprows (int, optional): Number of lines to skip before the header. Defaults to 0.
+        read_kwargs: Options of pd.read_table, none are supported by this parser
+
+    Raises:
+        _PandasParserRequired: Error raised when the table or options need the pandas parser
+
+    Returns:
+        pd.DataFrame: The table
+    """
+    if (
+        read_kwargs
+        or not isinstance(path, (Path, str))
+        or not isinstance(skiprows, int)
+    ):
+        raise _PandasParserRequired("Only paths and the skiprows option are supported")
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+
+    column_types: dict = {
+        column: pa.string()
+        for column, column_type in (dtype or {}).items()
+        if column_type is str
+    }
+    while True:
+        with open_table(path, "rb") as in_handle:
+            try:
+                table = pa_csv.read_csv(
+                    in_handle,
+                    read_options=pa_csv.ReadOptions(skip_rows=skiprows),
+                    parse_options=pa_csv.ParseOptions(delimiter="\t"),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=column_types,
+                        null_values=list(NA_VALUES),
+                        strings_can_be_null=True,
+                    ),
+                )
+            except pa.ArrowInvalid as parse_error:
+                # e.g. rows shorter than the header or ending with a tab, which
+                # pandas reads with index_col=False
+                raise _PandasParserRequired(
+                    f"pyarrow could not parse the table: {parse_error}"
+                ) from None
+        if len(set(table.column_names)) != len(table.column_names):
+            raise _PandasParserRequired("Duplicate column names are renamed by pandas")
+        # pandas does not parse dates, read such columns again as strings
+        temporal_columns: dict = {
+            field.name: pa.string()
+            for field in table.schema
+            if pa.types.is_temporal(field.type)
+        }
+        if not temporal_columns:
+            break
+        column_types.update(temporal_columns)
+    for field, column in zip(table.schema, table.columns):
+        # pyarrow reads integers beyond int64 as doubles, pandas as uint64 or strings
+        if pa.types.is_floating(field.type) and column.null_count < len(column):
+            extremes: dict = pc.min_max(pc.abs(column)).as_py()
+            if (
+                extremes["max"] >= 2**63
+                and pc.all(pc.equal(pc.floor(column), column)).as_py()
+            ):
+                raise _PandasParserRequired(
+                    f"Column {field.name} may hold integers beyond int64"
+                )
+    # Columns with only missing values are doubles for pandas
+    table = table.cast(
+        pa.schema(
+            [
+                field.with_type(pa.float64()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]
+        )
+    )
+    df: pd.DataFrame = table.to_pandas()
+    if dtype:
+        df = apply_dtypes(df, dtype)
+    if index_col is not None and index_col is not False:
+        df = df.set_index(df.columns[index_col])
+    return df
+
+
+def get_tsv_readers() -> list:
+    """Get the tsv parsers to try in order
+
+    Returns:
+        list: The parser named by the environment variable in TSV_READER_ENV, or the
+            fastest installed one, followed by the pandas parser as a fallback
+    """
+    reader_name: Optional[str] = os.environ.get(TSV_READER_ENV)
+    if reader_name and reader_name not in TSV_READERS:
+        logger.warning(
+            "Unknown tsv parser %s in %s, expected one of: %s",
+            reader_name,
+            TSV_READER_ENV,
+            ", ".join(TSV_READERS),
+        )
+        reader_name = None
+    if not reader_name:
+        reader_name = "pyarrow" if find_spec("pyarrow") else "pandas"
+    return [TSV_READERS[reader_name], read_tsv_pandas]
+
+
+def apply_dtypes(df: pd.DataFrame, dtype: dict) -> pd.DataFrame:
+    """Cast the columns of a columnar table to the types a tsv reader would give
+
+    Missing values stay missing when a column is cast to str, as with pd.read_table.
+
+    Args:
+        df (pd.DataFrame): Table read from a columnar file
+        dtype (dict): Data types by column name, columns not in the table are ignored
+
+    Returns:
+        pd.DataFrame: Table with the given columns cast
+    """
+    for column, column_type in dtype.items():
+        if column not in df.columns:
+            continue
+        if column_type is str:
+            if df[column].dtype != object:
+                df[column] = (
+                    df[column]
+                    .astype(object)
+                    .where(df[column].isna(), df[column].astype(str))
+                )
+        elif df[column].dtype != column_type:
+            df[column] = df[column].astype(column_type)
+    return df
+
+
+def read_table(
+    path,
+    index_col: Union[int, bool, None] = None,
+    dtype: Optional[dict] = None,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """Read a table written by write_table or a tsv file
+
+    Tsv tables are parsed by the first parser from get_tsv_readers() which supports
+    the given options. Arrow IPC files are memory-mapped and both columnar formats
+    keep the stored column types, so tsv parsing options only apply to tsv input.
+
+    Args:
+        path: Path to the table or an in-memory tsv buffer
+        index_col (Union[int, bool, None], optional): Column to use as the index. Defaults to None.
+        dtype (Optional[dict], optional): Data types by column name. Defaults to None.
+        read_kwargs: Further options for pd.read_table
+
+    Returns:
+        pd.DataFrame: The table
+    """
+    if not is_columnar(path):
+        for tsv_reader in get_tsv_readers():
+            try:
+                return tsv_reader(path, index_col=index_col, dtype=dtype, **read_kwargs)
+            except _PandasParserRequired:
+                continue
+    feather = import_pyarrow()
+    if get_table_format(path) == "arrow":
+        df: pd.DataFrame = feather.read_table(path, memory_map=True).to_pandas()
+    else:
+        df: pd.DataFrame = pd.read_parquet(path)
+    if dtype:
+        df = apply_dtypes(df, dtype)
+    if index_col is not None and index_col is not False:
+        df = df.set_index(df.columns[index_col])
+    return df
+
+
+def format_column(column: pd.Series) -> Optional[np.ndarray]:
+    """Format a column into the strings DataFrame.to_csv writes for it
+
+    Numbers are formatted by Python a whole column at a time, except single
+    precision floats which numpy formats once per distinct value. Categories are
+    formatted once per category and missing values become empty strings.
+
+    Args:
+        column (pd.Series): Column to format
+
+    Returns:
+        Optional[np.ndarray]: Formatted fields, None when a field would need quoting
+            or the type is not handled here
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories: Optional[np.ndarray] = format_column(
+            pd.Series(column.cat.categories)
+        )
+        if categories is None:
+            return None
+        return np.append(categories, "").astype(object)[column.cat.codes.to_numpy()]
+    missing: np.ndarray = column.isna().to_numpy()
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+        if not pd.api.types.is_integer_dtype(column.dtype):
+            return None
+        values: np.ndarray = column.to_numpy(dtype=np.int64, na_value=0)
+    else:
+        values: np.ndarray = column.to_numpy()
+    if values.dtype == np.float64:
+        # The shortest repr of Python and numpy are the same for double precision
+        formatted: np.ndarray = np.array(list(map(repr, values.tolist())), dtype=object)
+    elif values.dtype.kind == "f":
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        formatted: np.ndarray = uniques.astype(str).astype(object)[codes]
+    elif values.dtype.kind in "biu":
+        formatted: np.ndarray = np.array(list(map(str, values.tolist())), dtype=object)
+    elif values.dtype == object:
+        formatted: np.ndarray = values.copy()
+        present: np.ndarray = formatted[~missing]
+        if pd.api.types.infer_dtype(present, skipna=False) not in ("string", "empty"):
+            return None
+        joined: str = "".join(present)
+        if any(character in joined for character in QUOTED_CHARACTERS):
+            return None
+    else:
+        return None
+    formatted[missing] = ""
+    return formatted
+
+
+def quote_empty_fields(fields: np.ndarray) -> np.ndarray:
+    """Quote the empty fields of a one-column table like DataFrame.to_csv
+
+    An unquoted empty field would be an empty line, which pd.read_table skips.
+
+    Args:
+        fields (np.ndarray): Formatted fields of the only column, or the header
+
+    Returns:
+        np.ndarray: The fields with empty ones written as '""'
+    """
+    return np.where(fields == "", '""', fields).astype(object)
+
+
+def write_tsv(df: pd.DataFrame, path: Path, index: bool = False) -> None:
+    """Write a tsv table through a large buffer, formatting a chunk of rows at a time
+
+    The fields are the same as from DataFrame.to_csv, which is used instead when
+    some column cannot be formatted by format_column().
+
+    Args:
+        df (pd.DataFrame): The table to write
+        path (Path): Output path, compressed when ending with an extension in compressed_io.COMPRESSIONS
+        index (bool, optional): Whether to write the index as the first column. Defaults to False.
+    """
+    header: list = df.columns.tolist()
+    if index:
+        header.insert(0, "" if df.index.name is None else df.index.name)
+        df = df.reset_index()
+    formatted_header: Optional[np.ndarray] = format_column(
+        pd.Series(header, dtype=object)
+    )
+    if formatted_header is not None and df.columns.is_unique:
+        with open_table(path, "w") as out_handle:
+            if len(formatted_header) == 1:
+                formatted_header = quote_empty_fields(formatted_header)
+            out_handle.write("\t".join(formatted_header) + "\n")
+            for start in range(0, len(df), WRITE_CHUNK_ROWS):
+                chunk: pd.DataFrame = df.iloc[start : start + WRITE_CHUNK_ROWS]
+                columns: list = [format_column(chunk[name]) for name in chunk.columns]
+                if any(column is None for column in columns):
+                    break
+                if len(columns) == 1:
+                    columns = [quote_empty_fields(columns[0])]
+                out_handle.write("\n".join(map("\t".join, zip(*columns))) + "\n")
+            else:
+                return
+    # Start over with pandas formatting
+    with open_table(path, "w") as out_handle:
+        df.to_csv(
+            out_handle,
+            sep="\t",
+            index=False,
+            header=header,
+            chunksize=WRITE_CHUNK_ROWS,
+        )
+
+
+def write_table(df: pd.DataFrame, path: Path, index: bool = False) -> None:
+    """Write a table in the format given by the file extension
+
+    Args:
+        df (pd.DataFrame): The table to write
+        path (Path): Output path, tsv unless the extension is in COLUMNAR_FORMATS, tsv
+            tables are compressed when ending with an extension in compressed_io.COMPRESSIONS
+        index (bool, optional): Whether to write the index as the first column. Defaults to False.
+    """
+    table_format: str = get_table_format(path)
+    if table_format == "tsv":
+        write_tsv(df, path, index)
+        return
+    feather = import_pyarrow()
+    df = df.reset_index() if index else df.reset_index(drop=True)
+    if table_format == "arrow":
+        # Uncompressed so that readers can memory-map the columns
+        feather.write_feather(df, path, compression="uncompressed")
+    else:
+        df.to_parquet(path, index=False)
+
+
+# Tsv parsers by name, each takes the arguments of read_table
+TSV_READERS: dict = {
+    "pyarrow": read_tsv_pyarrow,
+    "pandas": read_tsv_pandas,
+}
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if not args.input.is_file():
+        logger.error("The given input file %s was not found!", args.input)
+        sys.exit(1)
+    try:
+        write_table(read_table(args.input, index_col=False), args.output)
+    except ImportError as import_error_msg:
+        logger.error(import_error_msg)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
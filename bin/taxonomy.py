@@ -0,0 +1,530 @@
+#!/usr/bin/env python
+"""Build and query a compact, memory-mappable index of the NCBI taxonomy."""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from atomic_write import create_temp_file
+
+
+logger = logging.getLogger()
+
+# The snapshot starts with the magic bytes, the format version and the length of
+# a json header describing where each array is stored in the file
+SNAPSHOT_MAGIC: bytes = b"GMSTAXDB"
+SNAPSHOT_VERSION: int = 2
+SNAPSHOT_PREAMBLE: struct.Struct = struct.Struct("<8sII")
+# Arrays are aligned so that they can be viewed directly from the memory map
+SNAPSHOT_ALIGNMENT: int = 64
+
+# Taxdump files which the snapshot is built from, merged.dmp is optional
+TAXDUMP_FILES: tuple = ("nodes.dmp", "names.dmp", "merged.dmp")
+
+# Taxonkit leaves the root out of lineages
+ROOT_TAXID: int = 1
+
+
+class Taxonomy:
+    """
+    Array-backed NCBI taxonomy where every array is indexed by taxid.
+
+    Attributes:
+        parent (np.ndarray): Parent taxid of each taxid, 0 for taxids not in the taxonomy
+        rank_code (np.ndarray): Index into ranks for each taxid
+        ranks (list[str]): Rank names, e.g. 'species'
+        name_offsets (np.ndarray): Start of each taxid's scientific name in name_data,
+            the name ends where the next taxid's name starts
+        name_data (np.ndarray): Utf-8 encoded scientific names one after another
+        merged_from (np.ndarray): Sorted taxids that have been merged into another taxid
+        merged_to (np.ndarray): Taxids into which the taxids in merged_from were merged
+        entry (np.ndarray): Pre-order number of each taxid in a depth-first walk of the tree,
+            -1 for taxids not in the taxonomy
+        exit (np.ndarray): Largest pre-order number in the subtree of each taxid, so that
+            the descendants of a taxid are exactly the taxids with entry within
+            [entry, exit], -2 for taxids not in the taxonomy
+        source (dict): Sizes and modification times of the taxdump files the index was built from
+
+    """
+
+    def __init__(
+        self,
+        parent: np.ndarray,
+        rank_code: np.ndarray,
+        ranks: list[str],
+        name_offsets: np.ndarray,
+        name_data: np.ndarray,
+        merged_from: np.ndarray,
+        merged_to: np.ndarray,
+        entry: np.ndarray,
+        exit: np.ndarray,
+        source: Optional[dict] = None,
+    ) -> None:
+        self.parent: np.ndarray = parent
+        self.rank_code: np.ndarray = rank_code
+        self.ranks: list[str] = ranks
+        self.name_offsets: np.ndarray = name_offsets
+        self.name_data: np.ndarray = name_data
+        self.merged_from: np.ndarray = merged_from
+        self.merged_to: np.ndarray = merged_to
+        self.entry: np.ndarray = entry
+        self.exit: np.ndarray = exit
+        self.source: dict = source or {}
+
+    @classmethod
+    def from_taxdump(cls, taxdump_dir: Path) -> "Taxonomy":
+        """Build the index from 'nodes.dmp', 'names.dmp' and 'merged.dmp'
+
+        Args:
+            taxdump_dir (Path): Directory with the NCBI taxdump files
+
+        Returns:
+            Taxonomy: The taxonomy index
+        """
+        logger.info("Building taxonomy index from %s", taxdump_dir)
+        taxids: list[int] = []
+        parents: list[int] = []
+        rank_names: list[str] = []
+        with open(taxdump_dir / "nodes.dmp", encoding="utf8") as nodes:
+            for line in nodes:
+                fields: list[str] = line.split("\t|\t", 3)
+                taxids.append(int(fields[0]))
+                parents.append(int(fields[1]))
+                rank_names.append(fields[2])
+        size: int = max(taxids) + 1
+        parent: np.ndarray = np.zeros(size, dtype=np.int32)
+        parent[taxids] = parents
+        ranks, codes = np.unique(
+            np.array(rank_names, dtype=object), return_inverse=True
+        )
+        rank_code: np.ndarray = np.zeros(size, dtype=np.uint8)
+        rank_code[taxids] = codes
+
+        names: dict = {}
+        with open(taxdump_dir / "names.dmp", encoding="utf8") as names_dmp:
+            for line in names_dmp:
+                fields: list[str] = line.rstrip("\t|\n").split("\t|\t")
+                if fields[3] == "scientific name":
+                    names[int(fields[0])] = fields[1].encode("utf8")
+        name_lengths: np.ndarray = np.zeros(size, dtype=np.int64)
+        name_taxids: np.ndarray = np.fromiter(names.keys(), dtype=np.int64)
+        name_lengths[name_taxids] = [len(name) for name in names.values()]
+        name_offsets: np.ndarray = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(name_lengths, out=name_offsets[1:])
+        name_data: np.ndarray = np.frombuffer(
+            b"".join(names[taxid] for taxid in sorted(names)), dtype=np.uint8
+        )
+
+        merged: list[tuple[int, int]] = []
+        if (taxdump_dir / "merged.dmp").is_file():
+            with open(taxdump_dir / "merged.dmp", encoding="utf8") as merged_dmp:
+                for line in merged_dmp:
+                    fields: list[str] = line.rstrip("\t|\n").split("\t|\t")
+                    merged.append((int(fields[0]), int(fields[1])))
+        merged.sort()
+        merged_array: np.ndarray = np.array(merged, dtype=np.int32).reshape(-1, 2)
+        entry, exit = build_interval_index(parent)
+        return cls(
+            parent=parent,
+            rank_code=rank_code,
+            ranks=[str(rank) for rank in ranks],
+            name_offsets=name_offsets,
+            name_data=name_data,
+            merged_from=np.ascontiguousarray(merged_array[:, 0]),
+            merged_to=np.ascontiguousarray(merged_array[:, 1]),
+            entry=entry,
+            exit=exit,
+            source=get_taxdump_stats(taxdump_dir),
+        )
+
+    def _arrays(self) -> dict:
+        """Get the arrays stored in a snapshot by their names"""
+        return {
+            "parent": self.parent,
+            "rank_code": self.rank_code,
+            "name_offsets": self.name_offsets,
+            "name_data": self.name_data,
+            "merged_from": self.merged_from,
+            "merged_to": self.merged_to,
+            "entry": self.entry,
+            "exit": self.exit,
+        }
+
+    def save(self, snapshot: Path) -> None:
+        """Write the index into a versioned binary snapshot file
+
+        The file is written to a temporary file first and then renamed, so that
+        concurrent readers never see a partially written snapshot.
+
+        Args:
+            snapshot (Path): Path to the snapshot file
+        """
+        sections: dict = {}
+        offset: int = 0
+        for name, values in self._arrays().items():
+            offset = -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+            sections[name] = {
+                "offset": offset,
+                "dtype": values.dtype.str,
+                "count": int(values.size),
+            }
+            offset += values.nbytes
+        header: bytes = json.dumps(
+            {"ranks": self.ranks, "source": self.source, "sections": sections}
+        ).encode("utf8")
+        # Array offsets are relative to the aligned end of the header
+        data_start: int = SNAPSHOT_PREAMBLE.size + len(header)
+        data_start = -(-data_start // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+        snapshot.parent.mkdir(parents=True, exist_ok=True)
+        with create_temp_file(snapshot) as temp_snapshot:
+            pass
+        try:
+            with open(temp_snapshot.name, "wb") as out_handle:
+                out_handle.write(
+                    SNAPSHOT_PREAMBLE.pack(
+                        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)
+                    )
+                )
+                out_handle.write(header)
+                for name, values in self._arrays().items():
+                    out_handle.seek(data_start + sections[name]["offset"])
+                    out_handle.write(values.tobytes())
+            os.replace(temp_snapshot.name, snapshot)
+        except BaseException:
+            os.remove(temp_snapshot.name)
+            raise
+        logger.info("Wrote taxonomy snapshot %s", snapshot)
+
+    @classmethod
+    def load(cls, snapshot: Path) -> "Taxonomy":
+        """Memory-map a snapshot file written by Taxonomy.save
+
+        Args:
+            snapshot (Path): Path to the snapshot file
+
+        Raises:
+            ValueError: Error raised when the file is not a snapshot of the current version
+
+        Returns:
+            Taxonomy: The taxonomy index backed by the memory-mapped file
+        """
+        with open(snapshot, "rb") as snapshot_file:
+            buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = SNAPSHOT_PREAMBLE.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a taxonomy snapshot: {snapshot}")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Taxonomy snapshot version {version} is not supported, expected {SNAPSHOT_VERSION}"
+            )
+        header: dict = json.loads(
+            buffer[SNAPSHOT_PREAMBLE.size : SNAPSHOT_PREAMBLE.size + header_length]
+        )
+        data_start: int = SNAPSHOT_PREAMBLE.size + header_length
+        data_start = -(-data_start // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+        arrays: dict = {
+            name: np.frombuffer(
+                buffer,
+                dtype=np.dtype(section["dtype"]),
+                count=section["count"],
+                offset=data_start + section["offset"],
+            )
+            for name, section in header["sections"].items()
+        }
+        logger.info("Memory-mapped taxonomy snapshot %s", snapshot)
+        return cls(ranks=header["ranks"], source=header["source"], **arrays)
+
+    def resolve(self, taxid: int) -> int:
+        """Get the current taxid of a taxid, following merges
+
+        Args:
+            taxid (int): Taxid to resolve
+
+        Returns:
+            int: The taxid itself, the taxid it was merged into or 0 if it is unknown
+        """
+        if 0 < taxid < self.parent.size and self.parent[taxid]:
+            return taxid
+        index: int = int(np.searchsorted(self.merged_from, taxid))
+        if index < self.merged_from.size and self.merged_from[index] == taxid:
+            return int(self.merged_to[index])
+        return 0
+
+    def resolve_many(self, taxids: np.ndarray) -> np.ndarray:
+        """Get the current taxids of an array of taxids, following merges
+
+        Args:
+            taxids (np.ndarray): Integer taxids to resolve
+
+        Returns:
+            np.ndarray: The taxids themselves, the taxids they were merged into or 0 if unknown
+        """
+        taxids = np.asarray(taxids, dtype=np.int64)
+        in_range: np.ndarray = (taxids > 0) & (taxids < self.parent.size)
+        known: np.ndarray = np.zeros(taxids.shape, dtype=bool)
+        known[in_range] = self.parent[taxids[in_range]] != 0
+        resolved: np.ndarray = np.where(known, taxids, 0)
+        if self.merged_from.size:
+            index: np.ndarray = np.minimum(
+                np.searchsorted(self.merged_from, taxids), self.merged_from.size - 1
+            )
+            merged: np.ndarray = ~known & (self.merged_from[index] == taxids)
+            resolved[merged] = self.merged_to[index[merged]]
+        return resolved
+
+    def descends_from(self, taxids: np.ndarray, ancestors: list[int]) -> np.ndarray:
+        """Check which taxids are within the subtree of any of the given ancestors
+
+        A taxid counts as its own descendant. Each check is two integer
+        comparisons of pre-order numbers, so whole columns are checked at once.
+
+        Args:
+            taxids (np.ndarray): Current taxids to check, 0 for unknown taxids
+            ancestors (list[int]): Current taxids of the ancestor clades
+
+        Returns:
+            np.ndarray: Boolean mask which is True for taxids under any of the ancestors
+        """
+        positions: np.ndarray = self.entry[np.asarray(taxids, dtype=np.int64)]
+        mask: np.ndarray = np.zeros(positions.shape, dtype=bool)
+        for ancestor in ancestors:
+            mask |= (positions >= self.entry[ancestor]) & (
+                positions <= self.exit[ancestor]
+            )
+        return mask
+
+    def find_taxids(self, name: str) -> list[int]:
+        """Find the taxids which scientific name is exactly the given name
+
+        Args:
+            name (str): Scientific name, e.g. 'Viruses'
+
+        Returns:
+            list[int]: Taxids with the given name
+        """
+        encoded: bytes = name.encode("utf8")
+        data: bytes = self.name_data.tobytes()
+        taxids: list[int] = []
+        start: int = data.find(encoded)
+        while start >= 0:
+            # The match must start and end exactly at the boundaries of one name
+            taxid: int = (
+                int(np.searchsorted(self.name_offsets, start, side="right")) - 1
+            )
+            while taxid > 0 and self.name_offsets[taxid - 1] == start:
+                taxid -= 1
+            for candidate in range(taxid, self.name_offsets.size - 1):
+                if self.name_offsets[candidate] != start:
+                    break
+                if self.name_offsets[candidate + 1] == start + len(encoded):
+                    taxids.append(candidate)
+                    break
+            start = data.find(encoded, start + 1)
+        return taxids
+
+    def name(self, taxid: int) -> str:
+        """Get the scientific name of a known taxid"""
+        start, end = self.name_offsets[taxid], self.name_offsets[taxid + 1]
+        return self.name_data[start:end].tobytes().decode("utf8")
+
+    def rank(self, taxid: int) -> str:
+        """Get the rank of a known taxid"""
+        return self.ranks[self.rank_code[taxid]]
+
+    def lineage(self, taxid: int) -> list[int]:
+        """Get the taxids from the root down to a known taxid, the root excluded
+
+        Args:
+            taxid (int): A known taxid
+
+        Returns:
+            list[int]: Lineage taxids, for the root itself only the root
+        """
+        lineage: list[int] = [taxid]
+        while taxid != ROOT_TAXID:
+            taxid = int(self.parent[taxid])
+            lineage.append(taxid)
+        if len(lineage) > 1:
+            lineage.pop()
+        return lineage[::-1]
+
+
+def build_interval_index(parent: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Number the taxids in depth-first pre-order, i.e. an Euler tour of the tree
+
+    The tree is processed one depth level at a time with vectorized operations:
+    subtree sizes are summed bottom-up and then every child is numbered after its
+    parent and the subtrees of its preceding siblings, children ordered by taxid.
+
+    Args:
+        parent (np.ndarray): Parent taxid of each taxid, 0 for taxids not in the taxonomy
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Entry and exit pre-order numbers of each taxid
+
+    Raises:
+        ValueError: If a parent taxid is not in the taxonomy or a lineage does not
+            reach the root
+    """
+    taxids: np.ndarray = np.flatnonzero(parent)
+    parent_taxids: np.ndarray = parent[taxids]
+    known: np.ndarray = (parent_taxids > 0) & (parent_taxids < parent.size)
+    known[known] = parent[parent_taxids[known]] != 0
+    if not known.all():
+        raise ValueError(
+            f"Parent taxids not in the taxonomy, e.g. taxid {taxids[~known][0]} "
+            f"has parent {parent_taxids[~known][0]}"
+        )
+
+    depth: np.ndarray = np.zeros(parent.size, dtype=np.int32)
+    ancestors: np.ndarray = taxids[taxids != ROOT_TAXID]
+    active: np.ndarray = ancestors
+    # Every lineage is shorter than the number of taxids unless it has a cycle
+    for _ in range(taxids.size):
+        if not active.size:
+            break
+        depth[active] += 1
+        ancestors = parent[ancestors]
+        keep: np.ndarray = ancestors != ROOT_TAXID
+        ancestors, active = ancestors[keep], active[keep]
+    if active.size:
+        raise ValueError(
+            f"Lineages not reaching the root taxid {ROOT_TAXID}, "
+            f"e.g. of taxid {active[0]}"
+        )
+
+    levels: list[np.ndarray] = [
+        taxids[depth[taxids] == level] for level in range(depth.max() + 1)
+    ]
+    size: np.ndarray = np.zeros(parent.size, dtype=np.int64)
+    size[taxids] = 1
+    for level in reversed(levels[1:]):
+        size += np.bincount(
+            parent[level], weights=size[level], minlength=parent.size
+        ).astype(np.int64)
+
+    entry: np.ndarray = np.full(parent.size, -1, dtype=np.int32)
+    entry[ROOT_TAXID] = 0
+    for level in levels[1:]:
+        # Group siblings together and give each child the numbers after its siblings
+        children: np.ndarray = level[np.lexsort((level, parent[level]))]
+        parents: np.ndarray = parent[children]
+        preceding: np.ndarray = np.cumsum(size[children]) - size[children]
+        group_start: np.ndarray = np.flatnonzero(
+            np.r_[True, parents[1:] != parents[:-1]]
+        )
+        group_sizes: np.ndarray = np.diff(np.r_[group_start, children.size])
+        preceding -= np.repeat(preceding[group_start], group_sizes)
+        entry[children] = entry[parents] + 1 + preceding
+    exit: np.ndarray = np.where(entry >= 0, entry + size - 1, -2).astype(np.int32)
+    return entry, exit
+
+
+def get_taxdump_stats(taxdump_dir: Path) -> dict:
+    """Get the sizes and modification times of the taxdump files
+
+    Args:
+        taxdump_dir (Path): Directory with the NCBI taxdump files
+
+    Returns:
+        dict: File name mapped to its [size, mtime_ns] for each existing taxdump file
+    """
+    return {
+        file_name: [
+            (taxdump_dir / file_name).stat().st_size,
+            (taxdump_dir / file_name).stat().st_mtime_ns,
+        ]
+        for file_name in TAXDUMP_FILES
+        if (taxdump_dir / file_name).is_file()
+    }
+
+
+def load_taxonomy(taxdump_dir: Path, snapshot: Optional[Path] = None) -> Taxonomy:
+    """Memory-map a taxonomy snapshot, (re)building it if it is missing or outdated
+
+    Args:
+        taxdump_dir (Path): Directory with the NCBI taxdump files
+        snapshot (Optional[Path], optional): Path to the snapshot file. Defaults to
+            'gmsmetapost_taxonomy.bin' in the taxdump directory.
+
+    Returns:
+        Taxonomy: The taxonomy index
+    """
+    snapshot = snapshot or taxdump_dir / "gmsmetapost_taxonomy.bin"
+    if snapshot.is_file():
+        try:
+            taxonomy: Taxonomy = Taxonomy.load(snapshot)
+        except (OSError, ValueError) as snapshot_error_msg:
+            # e.g. a snapshot of another user of a shared taxdump which cannot be read
+            logger.warning("Rebuilding taxonomy snapshot:\n%s", snapshot_error_msg)
+        else:
+            # Snapshots can also be used without the taxdump they were built from
+            if not (taxdump_dir / "nodes.dmp").is_file():
+                return taxonomy
+            if taxonomy.source == get_taxdump_stats(taxdump_dir):
+                return taxonomy
+            logger.warning("Taxonomy snapshot %s is outdated, rebuilding", snapshot)
+    taxonomy = Taxonomy.from_taxdump(taxdump_dir)
+    try:
+        taxonomy.save(snapshot)
+    except OSError as os_error_msg:
+        logger.warning(
+            "Could not write taxonomy snapshot %s:\n%s", snapshot, os_error_msg
+        )
+    return taxonomy
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mappable taxonomy snapshot from NCBI taxdump files",
+        epilog="Example: python taxonomy.py taxdump taxdump/gmsmetapost_taxonomy.bin",
+    )
+    parser.add_argument(
+        "taxdump",
+        metavar="TAXDUMP",
+        type=Path,
+        help="Directory with 'nodes.dmp', 'names.dmp' and optionally 'merged.dmp'",
+    )
+    parser.add_argument(
+        "snapshot",
+        metavar="SNAPSHOT",
+        type=Path,
+        help="Output taxonomy snapshot file",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    taxdump: Path = args.taxdump
+    for file_name in TAXDUMP_FILES[:2]:
+        if not (taxdump / file_name).is_file():
+            logger.error("The given input file %s was not found!", taxdump / file_name)
+            sys.exit(1)
+    try:
+        taxonomy: Taxonomy = Taxonomy.from_taxdump(taxdump)
+    except ValueError as tree_error_msg:
+        logger.error("Could not build the taxonomy of %s:\n%s", taxdump, tree_error_msg)
+        sys.exit(2)
+    taxonomy.save(args.snapshot)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
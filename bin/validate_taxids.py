@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Find the taxids of a hits table which have no sequences in a BLAST database"""
+
+import argparse
+import csv
+import logging
+import sys
+from pathlib import Path
+import numpy as np
+from blastdb import find_database, read_taxids
+from compressed_io import open_table
+
+
+logger = logging.getLogger()
+
+
+def parse_args(argv=None):
+    """Define and immediately parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Find the taxids of a hits table which have no sequences in a BLAST database",
+        epilog="Example: python validate_taxids.py sample1.tsv blastdb/ sample1_excludable_taxids.txt",
+    )
+    parser.add_argument(
+        "input_tsv",
+        metavar="INPUT-TSV",
+        type=Path,
+        help="Hits table with a 'taxid' column",
+    )
+    parser.add_argument(
+        "blastdb",
+        metavar="BLASTDB",
+        type=Path,
+        help="Directory of the BLAST database files, or the database path without extension",
+    )
+    parser.add_argument(
+        "output_txt",
+        metavar="OUTPUT-TXT",
+        type=Path,
+        help="Output file of the excludable taxids, one per line",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        help="The desired log level (default WARNING).",
+        choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"),
+        default="WARNING",
+    )
+    return parser.parse_args(argv)
+
+
+def read_taxid_column(input_tsv: Path) -> list[str]:
+    """Read the taxid column of a tsv table
+
+    Args:
+        input_tsv (Path): The table, compressed or not
+
+    Raises:
+        KeyError: Error raised when the table has no 'taxid' column
+
+    Returns:
+        list[str]: Taxid of each row
+    """
+    with open_table(input_tsv) as tsv_handle:
+        reader = csv.DictReader(tsv_handle, delimiter="\t")
+        if "taxid" not in (reader.fieldnames or []):
+            raise KeyError(f"No 'taxid' column in {input_tsv}")
+        return [row["taxid"] for row in reader]
+
+
+def find_excludable_taxids(taxids: list[str], database_taxids: np.ndarray) -> list[str]:
+    """Find the taxids which have no sequences in a database
+
+    Args:
+        taxids (list[str]): Taxids of a table, as written in it
+        database_taxids (np.ndarray): Sorted taxids which have sequences in the database
+
+    Returns:
+        list[str]: The taxids not in the database or not integers, in table order
+            without repeats
+    """
+    unique_taxids: list[str] = list(dict.fromkeys(taxids))
+    # Taxids which are not integers are never found, like by blastdbcmd
+    found: np.ndarray = np.isin(
+        np.array(
+            [int(taxid) if taxid.isdigit() else -1 for taxid in unique_taxids],
+            dtype=np.int64,
+        ),
+        database_taxids,
+    )
+    return [taxid for taxid, is_found in zip(unique_taxids, found) if not is_found]
+
+
+def main(argv=None):
+    """Coordinate argument parsing and program execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
+    if not args.input_tsv.is_file():
+        logger.error("The given input file %s was not found!", args.input_tsv)
+        sys.exit(1)
+    try:
+        database_taxids: np.ndarray = read_taxids(find_database(args.blastdb))
+        taxids: list[str] = read_taxid_column(args.input_tsv)
+    except FileNotFoundError as missing_file_msg:
+        logger.error(missing_file_msg)
+        sys.exit(1)
+    except (KeyError, ValueError) as read_error_msg:
+        logger.error("Could not read the taxids:\n%s", read_error_msg)
+        sys.exit(2)
+    excludable_taxids: list[str] = find_excludable_taxids(taxids, database_taxids)
+    logger.info(
+        "%d of %d taxids have no sequences in the database",
+        len(excludable_taxids),
+        len(set(taxids)),
+    )
+    args.output_txt.write_text(
+        "".join(f"{taxid}\n" for taxid in excludable_taxids), encoding="utf8"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 process REMOVE_MISSING_TAXIDS {
     tag "${meta.sample}"
 
-    conda (params.enable_conda ? "conda-forge::python>=3.9 conda-forge::parallel=20220722 " : null)
+    conda (params.enable_conda ? "conda-forge::python>=3.9 " : null)
 
     container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
         'library://sofstam/gmsmetapost/gmsmetapost:latest' :
@@ -14,18 +14,16 @@ process REMOVE_MISSING_TAXIDS {
     tuple val(meta), path(fastq), path(blast_db), path('*.validated.tsv'), emit: tsv
     path "versions.yml"                                                  , emit: versions
 
-    script:
+    script: // This script is bundled with the pipeline, in nf-core/gmsmetapost/bin/
     """
-    cp $meta.path bak.tsv
-    cat $txt \
-    | parallel --jobs 1 --verbose \"sed -i '/\t{}\t/d' $meta.path\"
-    mv $meta.path ${meta.sample}.validated.tsv
-    mv bak.tsv $meta.path
+    remove_missing_taxids.py \
+        $meta.path \
+        $txt \
+        ${meta.sample}.validated.tsv
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
-        GNU parallel: \$(parallel --version | head -n 1 | sed 's/GNU parallel //')
-        sed: \$(sed --version | head -n 1 | sed 's/sed //')
+        python: \$(python --version | sed 's/Python //g')
     END_VERSIONS
     """
 }
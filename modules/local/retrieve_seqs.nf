@@ -1,7 +1,7 @@
 process RETRIEVE_SEQS {
     tag "$meta.sample, $meta.taxon: $meta.taxid"
 
-    conda (params.enable_conda ? "conda-forge::python>=3.9 bioconda::blast=2.13.0 " : null)
+    conda (params.enable_conda ? "conda-forge::python>=3.9 conda-forge::numpy=1.23.4 " : null)
     container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
         'library://sofstam/gmsmetapost/gmsmetapost:latest' :
         'genomicmedicinesweden/gmsmetapost:latest' }"
@@ -15,22 +15,18 @@ process RETRIEVE_SEQS {
 
     script: // This script is bundled with the pipeline, in nf-core/gmsmetapost/bin/
     """
-    DB_FNAME=`find -L ./ -name '*.nhr'`
-    FIRST_FN=`echo \$DB_FNAME | awk '{print \$1;}'`
-    DB=`basename \$FIRST_FN | sed 's/\\..*//'`
-
-    (cd $blastdb
-    blastdbcmd \
-    -db \$DB \
-    -taxids $meta.taxid \
-    -dbtype nucl) \
-    > temp.fa
+    blastdb.py \
+        seqs \
+        $blastdb \
+        --taxids $meta.taxid \
+        --threads $task.cpus \
+        --output-fasta temp.fa
     pick_a_genome.py temp.fa ${meta.taxid}_${meta.sample}.fna
     rm temp.fa
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
-        BLAST: \$(blastdbcmd -version 2>&1 | sed 's/^.*blastdbcmd: //; s/ .*\$//')
+        python: \$(python --version | sed 's/Python //g')
     END_VERSIONS
     """
 }
\ No newline at end of file
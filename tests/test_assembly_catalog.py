@@ -0,0 +1,52 @@
+"""Tests of building and querying the assembly catalog of bin/assembly_catalog.py."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import assembly_catalog  # noqa: E402
+
+SUMMARY_HEADER: str = (
+    "#assembly_accession\tbioproject\tbiosample\twgs_master\trefseq_category\t"
+    "taxid\tspecies_taxid\torganism_name\tinfraspecific_name\tisolate\t"
+    "version_status\tassembly_level\trelease_type\tgenome_rep\tseq_rel_date\tasm_name\n"
+)
+
+
+def write_summary(summary_file: Path, rows: list[tuple]) -> Path:
+    lines: list[str] = [
+        "# See ftp://ftp.ncbi.nlm.nih.gov/genomes/README_assembly_summary.txt\n"
+    ]
+    lines.append(SUMMARY_HEADER)
+    for accession, taxid, date in rows:
+        lines.append(
+            f"{accession}\tPRJNA1\tSAMN1\t\tna\t{taxid}\t{taxid}\tOrganism\t\t\t"
+            f"latest\tComplete Genome\tMajor\tFull\t{date}\tasm\n"
+        )
+    summary_file.write_text("".join(lines), encoding="utf8")
+    return summary_file
+
+
+def test_relisted_assembly_keeps_first_insertion_order(tmp_path):
+    first: Path = write_summary(
+        tmp_path / "first.txt", [("GCF_1", 5, "2020/01/01"), ("GCF_2", 5, "2020/01/01")]
+    )
+    second: Path = write_summary(tmp_path / "second.txt", [("GCF_1", 5, "2020/01/01")])
+    catalog_file: Path = tmp_path / "catalog.sqlite"
+    assert assembly_catalog.build_catalog([first, second], catalog_file) == 2
+    catalog = assembly_catalog.AssemblyCatalog(catalog_file)
+    assert catalog.best_assembly("5")[0] == "GCF_1"
+    catalog.close()
+
+
+def test_non_numeric_taxids_are_skipped(tmp_path):
+    summary: Path = write_summary(
+        tmp_path / "summary.txt",
+        [("GCF_1", "na", "2020/01/01"), ("GCF_2", 5, "2020/01/01")],
+    )
+    catalog_file: Path = tmp_path / "catalog.sqlite"
+    assert assembly_catalog.build_catalog([summary], catalog_file) == 1
+    catalog = assembly_catalog.AssemblyCatalog(catalog_file)
+    assert catalog.best_assembly("na") is None
+    catalog.close()
@@ -0,0 +1,26 @@
+"""Tests of the cohort sample x taxid matrix of bin/cohort_matrix.py."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import cohort_matrix  # noqa: E402
+
+HITS_TABLE: str = (
+    "taxid\ttaxon_name\tclassifier\trpm\treads_count\tsample_name\n"
+    "1511916\tUngulate tetraparvovirus 3\tkraken2\t752160.9\t8540463\t{sample}\n"
+)
+
+
+def write_table(table: Path, sample: str) -> Path:
+    table.write_text(HITS_TABLE.format(sample=sample), encoding="utf8")
+    return table
+
+
+def test_rpm_keeps_double_precision(tmp_path):
+    cohort_dir: Path = tmp_path / "cohort"
+    cohort_matrix.add_tables(cohort_dir, [write_table(tmp_path / "a.tsv", "a")])
+    cohort = cohort_matrix.load_cohort(cohort_dir)
+    assert cohort.entries["rpm"][0] == 752160.9
+
@@ -0,0 +1,315 @@
+"""Tests of the single-process postprocessing of bin/gmsmetapost_postprocess.py."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import add_metadata  # noqa: E402
+import concat_tables  # noqa: E402
+import gmsmetapost_postprocess  # noqa: E402
+import join_tables  # noqa: E402
+import kraken2_report  # noqa: E402
+import postprocess_table  # noqa: E402
+import rpm_filter  # noqa: E402
+import table_io  # noqa: E402
+
+SAMPLE: str = "SRR1_pe-SRR1"
+
+ASSETS_DIR: Path = Path(__file__).resolve().parents[1] / "assets" / "tsvs"
+
+# Report file name suffixes of the classifiers, as in assets/tsvs
+REPORT_SUFFIXES: dict = {
+    "kaiju": "kaiju.tsv",
+    "kraken2": "kraken2.kraken2.report.tsv",
+    "centrifuge": "centrifuge.report.tsv",
+}
+
+# rpm_filter.py options of each classifier in the chained pipeline
+RPM_FILTER_ARGUMENTS: dict = {
+    "kaiju": ["-n", "2", "-s", "taxon_id"],
+    "kraken2": ["-n", "2", "-c", ",".join(kraken2_report.KRAKEN2_COLUMNS)],
+    "centrifuge": ["-n", "5"],
+}
+
+# Keeps some rows of every classifier and filters out others
+RPM_THRESHOLD: str = "0.1"
+
+# Taxid, parent, rank and scientific name
+TAXA: list[tuple] = [
+    (1, 1, "no rank", "root"),
+    (2, 131567, "superkingdom", "Bacteria"),
+    (131567, 1, "no rank", "cellular organisms"),
+    (2093, 2, "genus", "Mycoplasma"),
+    (10239, 1, "superkingdom", "Viruses"),
+    (10780, 10239, "family", "Parvoviridae"),
+    (1511916, 10780, "species", "Ungulate tetraparvovirus 3"),
+    (11676, 10239, "species", "Human immunodeficiency virus 1"),
+    (11049, 10239, "no rank", "Lelystad virus"),
+]
+
+KAIJU: str = (
+    "file\tpercent\treads\ttaxon_id\ttaxon_name\n"
+    "k.tsv\t61.904762\t1300\t1511916\ttaxonid:1511916\n"
+    "k.tsv\t19.047619\t400\t11676\ttaxonid:11676\n"
+    "k.tsv\t9.523810\t200\t2093\ttaxonid:2093\n"
+    "k.tsv\t0.047619\t1\t11049\ttaxonid:11049\n"
+    "k.tsv\t9.476190\t199\tNA\tunclassified\n"
+)
+
+KRAKEN2: str = (
+    " 17.20\t2358\t2358\tU\t0\tunclassified\n"
+    " 82.80\t11354\t188\tR\t1\troot\n"
+    " 82.36\t11293\t0\tD\t10239\t  Viruses\n"
+    " 82.36\t11293\t666\tF\t10780\t    Parvoviridae\n"
+    " 75.06\t10292\t8540\tS\t1511916\t      Ungulate tetraparvovirus 3\n"
+    "  0.44\t61\t3\tS\t11676\t    Human immunodeficiency virus 1\n"
+)
+
+CENTRIFUGE: str = (
+    "name\ttaxID\ttaxRank\tgenomeSize\tnumReads\tnumUniqueReads\tabundance\n"
+    "Ungulate tetraparvovirus 3\t1511916\tspecies\t5533\t900\t850\t0.75\n"
+    "Lelystad virus\t11049\tleaf\t15111\t305\t305\t0.0\n"
+    "Human immunodeficiency virus 1\t11676\tspecies\t9181\t741\t0\t4.86857e-10\n"
+    "Mycoplasma\t2093\tgenus\t800000\t30\t30\t0.25\n"
+)
+
+CAMI_HEADER: str = (
+    f"@SampleID:{SAMPLE}\n@Version:0.9.1\n"
+    "@Ranks:superkingdom|phylum|class|order|family|genus|species|strain\n"
+    "@TaxonomyID:ncbi-taxonomy\n@@TAXID\tRANK\tTAXPATH\tTAXPATHSN\tPERCENTAGE\n"
+)
+
+# Cami profile rows of each classifier, not every taxid has one
+CAMI_ROWS: dict = {
+    "kaiju": "1511916\tspecies\t10239|1511916\tViruses|X1511916\t61.9\n",
+    "kraken2": (
+        "10780\tfamily\t10239|10780\tViruses|Parvoviridae\t8.47\n"
+        "1511916\tspecies\t10239|10780|1511916\tViruses|Parvoviridae|X1511916\t75.06\n"
+    ),
+    "centrifuge": "11676\tspecies\t10239|11676\tViruses|HIV-1\t0.5\n",
+}
+
+
+@pytest.fixture
+def reports(tmp_path) -> dict:
+    """Classifier reports, cami profiles and a taxdump of one sample"""
+    taxdump: Path = tmp_path / "taxdump"
+    taxdump.mkdir()
+    (taxdump / "nodes.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\t{parent}\t|\t{rank}\t|\t\t|\n"
+            for taxid, parent, rank, _ in TAXA
+        )
+    )
+    (taxdump / "names.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\t{name}\t|\t\t|\tscientific name\t|\n"
+            for taxid, *_, name in TAXA
+        )
+    )
+    files: dict = {"taxdump": taxdump}
+    for classifier, report in (
+        ("kaiju", KAIJU),
+        ("kraken2", KRAKEN2),
+        ("centrifuge", CENTRIFUGE),
+    ):
+        files[classifier] = tmp_path / f"{SAMPLE}-{REPORT_SUFFIXES[classifier]}"
+        files[classifier].write_text(report)
+        files[f"{classifier}_cami"] = (
+            tmp_path / f"{SAMPLE}-{classifier}.cami-profile.tsv"
+        )
+        files[f"{classifier}_cami"].write_text(CAMI_HEADER + CAMI_ROWS[classifier])
+    return files
+
+
+def write_asset_reports(tmp_path: Path, sample: str) -> dict:
+    """Copy the classifier reports of a sample in assets/tsvs and derive the rest
+
+    The cami profiles and the taxdump are derived from the tree of the kraken2 report.
+    """
+    report = kraken2_report.read_kraken2_report(
+        ASSETS_DIR / f"{sample}-{REPORT_SUFFIXES['kraken2']}"
+    )
+    classified: np.ndarray = report.taxid > 0
+    taxdump: Path = tmp_path / "taxdump"
+    taxdump.mkdir()
+    parents: np.ndarray = np.where(report.parent_taxid > 0, report.parent_taxid, 1)
+    (taxdump / "nodes.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\t{parent}\t|\t{rank}\t|\t\t|\n"
+            for taxid, parent, rank in zip(
+                report.taxid[classified].tolist(),
+                parents[classified].tolist(),
+                report.rank[classified],
+            )
+        )
+    )
+    (taxdump / "names.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\t{name.strip()}\t|\t\t|\tscientific name\t|\n"
+            for taxid, name in zip(
+                report.taxid[classified].tolist(), report.sci_name[classified]
+            )
+        )
+    )
+    files: dict = {"taxdump": taxdump}
+    for position, classifier in enumerate(gmsmetapost_postprocess.CLASSIFIERS):
+        files[classifier] = ASSETS_DIR / f"{sample}-{REPORT_SUFFIXES[classifier]}"
+        # Every classifier gets a different part of the taxa, the rest stays unjoined
+        cami_rows: list[str] = [
+            f"{taxid}\t{rank}\t{lineage}\t{names}\t{percentage}\n"
+            for taxid, rank, lineage, names, percentage in zip(
+                report.taxid[classified][position::2].tolist(),
+                report.rank[classified][position::2],
+                report.lineage[classified][position::2],
+                report.lineage_names[classified][position::2],
+                report.percentage_fragments_covered[classified][position::2].tolist(),
+            )
+        ]
+        files[f"{classifier}_cami"] = (
+            tmp_path / f"{sample}-{classifier}.cami-profile.tsv"
+        )
+        files[f"{classifier}_cami"].write_text(
+            CAMI_HEADER.replace(SAMPLE, sample) + "".join(cami_rows)
+        )
+    return files
+
+
+def run_chained_scripts(
+    reports: dict, out_dir: Path, sample: str, pairing: str, threshold: str
+) -> Path:
+    """Run the scripts which the fused entry point replaces one after another"""
+    out_dir.mkdir()
+    joined: dict = {}
+    for classifier in gmsmetapost_postprocess.CLASSIFIERS:
+        filtered: Path = out_dir / f"{classifier}.filtered.tsv"
+        rpm_filter.main(
+            [
+                str(reports[classifier]),
+                *RPM_FILTER_ARGUMENTS[classifier],
+                "-r",
+                threshold,
+                "-o",
+                str(filtered),
+            ]
+        )
+        joined[classifier] = out_dir / f"{classifier}.joined.tsv"
+        join_tables.main(
+            [
+                str(reports[f"{classifier}_cami"]),
+                str(filtered),
+                "-c",
+                classifier,
+                "-o",
+                str(joined[classifier]),
+            ]
+        )
+    concat: Path = out_dir / f"{sample}.concat.tsv"
+    concat_tables.main(
+        [
+            "-j",
+            str(joined["kaiju"]),
+            "-k",
+            str(joined["kraken2"]),
+            "-c",
+            str(joined["centrifuge"]),
+            "-o",
+            str(concat),
+        ]
+    )
+    meta: Path = out_dir / f"{sample}.meta.tsv"
+    add_metadata.main([str(concat), str(meta), "-p", pairing, "-s", sample])
+    final: Path = out_dir / f"{sample}.final.tsv"
+    postprocess_table.main([str(meta), str(final), "-t", str(reports["taxdump"])])
+    return final
+
+
+def run_fused(
+    reports: dict, out_dir: Path, sample: str, pairing: str, threshold: str
+) -> Path:
+    """Run the fused entry point, writing its intermediate tables into out_dir/debug"""
+    final: Path = out_dir / f"{sample}.final.tsv"
+    gmsmetapost_postprocess.main(
+        [
+            *(
+                argument
+                for classifier in gmsmetapost_postprocess.CLASSIFIERS
+                for argument in (
+                    f"--{classifier}",
+                    str(reports[classifier]),
+                    f"--{classifier}-cami",
+                    str(reports[f"{classifier}_cami"]),
+                )
+            ),
+            "-r",
+            threshold,
+            "-p",
+            pairing,
+            "-s",
+            sample,
+            "-t",
+            str(reports["taxdump"]),
+            "-o",
+            str(final),
+            "-d",
+            str(out_dir / "debug"),
+        ]
+    )
+    return final
+
+
+def assert_same_tables(tmp_path: Path, sample: str, reports: dict) -> None:
+    """Assert the fused final and intermediate tables equal the chained ones"""
+    chained_dir: Path = tmp_path / "chained"
+    debug_dir: Path = tmp_path / "debug"
+    for classifier in gmsmetapost_postprocess.CLASSIFIERS:
+        filtered_name: str = rpm_filter.get_default_output_file(
+            reports[classifier]
+        ).name
+        assert (debug_dir / filtered_name).read_bytes() == (
+            chained_dir / f"{classifier}.filtered.tsv"
+        ).read_bytes()
+        assert (debug_dir / f"{sample}-{classifier}.joined.tsv").read_bytes() == (
+            chained_dir / f"{classifier}.joined.tsv"
+        ).read_bytes()
+    for table in (".concat.tsv", ".meta.tsv", ".final.tsv"):
+        fused_dir: Path = tmp_path if table == ".final.tsv" else debug_dir
+        assert (fused_dir / f"{sample}{table}").read_bytes() == (
+            chained_dir / f"{sample}{table}"
+        ).read_bytes()
+
+
+@pytest.mark.parametrize("reader_name", sorted(table_io.TSV_READERS))
+def test_fused_output_equals_chained_scripts(
+    monkeypatch, tmp_path, reports, reader_name
+):
+    monkeypatch.setenv(table_io.TSV_READER_ENV, reader_name)
+    run_chained_scripts(
+        reports, tmp_path / "chained", SAMPLE, "paired_end", RPM_THRESHOLD
+    )
+    fused: Path = run_fused(reports, tmp_path, SAMPLE, "paired_end", RPM_THRESHOLD)
+    assert_same_tables(tmp_path, SAMPLE, reports)
+    assert len(table_io.read_table(fused)) > 1
+
+
+@pytest.mark.parametrize("reader_name", sorted(table_io.TSV_READERS))
+@pytest.mark.parametrize(
+    "sample, pairing",
+    [
+        ("SRR12875570_pe-SRR12875570", "paired_end"),
+        ("SRR12875558_se-SRR12875558", "single_end"),
+    ],
+)
+def test_fused_output_equals_chained_scripts_on_assets(
+    monkeypatch, tmp_path, sample, pairing, reader_name
+):
+    monkeypatch.setenv(table_io.TSV_READER_ENV, reader_name)
+    reports: dict = write_asset_reports(tmp_path, sample)
+    run_chained_scripts(reports, tmp_path / "chained", sample, pairing, "10")
+    fused: Path = run_fused(reports, tmp_path, sample, pairing, "10")
+    assert_same_tables(tmp_path, sample, reports)
+    assert len(table_io.read_table(fused)) > 1
@@ -0,0 +1,57 @@
+"""Tests of looking up taxids with taxonkit in bin/postprocess_table.py."""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import postprocess_table  # noqa: E402
+
+
+@pytest.fixture
+def taxonkit_runs(monkeypatch, tmp_path) -> Path:
+    """Put a taxonkit on PATH which records its runs and behaves as TAXONKIT_STUB says"""
+    bin_dir: Path = tmp_path / "bin"
+    bin_dir.mkdir()
+    runs: Path = tmp_path / "runs.txt"
+    taxonkit: Path = bin_dir / "taxonkit"
+    taxonkit.write_text(
+        "#!/bin/sh\n"
+        f"echo run >> {runs}\n"
+        'case "$TAXONKIT_STUB" in\n'
+        "  fail) echo 'taxonkit error' >&2; exit 1 ;;\n"
+        "  empty) exit 0 ;;\n"
+        "esac\n"
+    )
+    taxonkit.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return runs
+
+
+@pytest.mark.parametrize("stub, exit_code", [("fail", 2), ("empty", 3)])
+def test_taxonkit_error_stops_queued_chunks(
+    monkeypatch, tmp_path, taxonkit_runs, stub, exit_code
+):
+    monkeypatch.setenv("TAXONKIT_STUB", stub)
+    settings = postprocess_table.TaxonkitSettings(chunk_size=1, threads=1)
+    threads_before: set = set(threading.enumerate())
+    with pytest.raises(SystemExit) as exit_info:
+        postprocess_table.get_chunked_taxonkit_lineage_results(
+            [str(taxid) for taxid in range(1, 21)], tmp_path, False, True, settings
+        )
+    assert exit_info.value.code == exit_code
+    # The executor is shut down, so its worker threads exit after the running chunk
+    deadline: float = time.monotonic() + 2
+    worker_threads: set = set(threading.enumerate()) - threads_before
+    while time.monotonic() < deadline and any(
+        thread.is_alive() for thread in worker_threads
+    ):
+        time.sleep(0.05)
+    assert not any(thread.is_alive() for thread in worker_threads)
+    # The chunk which failed, and at most the one started meanwhile
+    assert len(taxonkit_runs.read_text().splitlines()) <= 2
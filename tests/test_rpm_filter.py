@@ -0,0 +1,43 @@
+"""Tests of the RPM calculation of bin/rpm_filter.py."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+from rpm_filter import MANIFEST_COLUMNS, calculate_rpm, read_manifest  # noqa: E402
+
+
+@pytest.mark.parametrize("col_sum_per_million", [0.05, 0.35, 1.15, 5.55, 0.3837])
+def test_calculate_rpm_rounds_like_python(col_sum_per_million):
+    reads_counts: np.ndarray = np.arange(1, 20001)
+    df = pd.DataFrame({"reads_count": reads_counts})
+    assert calculate_rpm(df, col_sum_per_million).tolist() == [
+        round(float(reads_count) * col_sum_per_million, 1)
+        for reads_count in reads_counts
+    ]
+
+
+def test_calculate_rpm_rounds_halves_of_the_exact_value():
+    df = pd.DataFrame({"reads_count": [1]})
+    # The doubles of 1.15, 0.35 and 5.55 are just below the half
+    assert calculate_rpm(df, 1.15).tolist() == [1.1]
+    assert calculate_rpm(df, 0.35).tolist() == [0.3]
+    assert calculate_rpm(df, 5.55).tolist() == [5.5]
+
+
+def test_read_manifest_requires_reads_column_number(tmp_path):
+    manifest: Path = tmp_path / "manifest.tsv"
+    manifest.write_text(
+        "\t".join(MANIFEST_COLUMNS + ("kraken2_report",))
+        + "\n"
+        + "report.tsv\t\t\ttaxid\t10\ttrue\n"
+        + "hits.tsv\t\tname,taxid,reads_count\ttaxid\t10\tfalse\n"
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        read_manifest(manifest)
+    assert exit_info.value.code == 2
@@ -0,0 +1,54 @@
+"""Tests of reading and writing tables through bin/table_io.py."""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import table_io  # noqa: E402
+
+ASSETS_DIR: Path = Path(__file__).resolve().parents[1] / "assets" / "ci"
+
+
+@pytest.mark.parametrize("reader_name", sorted(table_io.TSV_READERS))
+def test_read_table_with_short_rows(monkeypatch, reader_name):
+    # A 12-field row under a 17-column header
+    table: Path = ASSETS_DIR / "SRR12875558_se-SRR12875558_ci.tsv"
+    monkeypatch.setenv(table_io.TSV_READER_ENV, reader_name)
+    pd.testing.assert_frame_equal(
+        table_io.read_table(table, index_col=False),
+        pd.read_table(table, index_col=False),
+    )
+
+
+@pytest.mark.parametrize("reader_name", sorted(table_io.TSV_READERS))
+def test_read_table_with_trailing_tabs(monkeypatch, tmp_path, reader_name):
+    table: Path = tmp_path / "trailing_tabs.tsv"
+    table.write_text("taxid\trpm\n1\t2.5\t\n3\t4.5\n", encoding="utf8")
+    monkeypatch.setenv(table_io.TSV_READER_ENV, reader_name)
+    pd.testing.assert_frame_equal(
+        table_io.read_table(table, index_col=False),
+        pd.read_table(table, index_col=False),
+    )
+
+
+@pytest.mark.parametrize("reader_name", sorted(table_io.TSV_READERS))
+def test_read_table_dtypes_match_pandas(monkeypatch, tmp_path, reader_name):
+    table: Path = tmp_path / "dtypes.tsv"
+    table.write_text(
+        "big\tmissing\tname\trpm\n18446744073709551615\t\tx\t1.5\n1\t\ty\t2\n",
+        encoding="utf8",
+    )
+    monkeypatch.setenv(table_io.TSV_READER_ENV, reader_name)
+    pd.testing.assert_frame_equal(table_io.read_table(table), pd.read_table(table))
+
+
+def test_write_tsv_one_column_keeps_empty_rows(tmp_path):
+    table: Path = tmp_path / "one_column.tsv"
+    df = pd.DataFrame({"taxon_name": ["x", "", None]})
+    table_io.write_tsv(df, table)
+    assert table.read_text(encoding="utf8") == df.to_csv(sep="\t", index=False)
+    assert len(table_io.read_table(table)) == len(df)
@@ -0,0 +1,42 @@
+"""Tests of the taxonomy snapshot builder of bin/taxonomy.py."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bin"))
+
+import taxonomy  # noqa: E402
+
+
+def write_taxdump(taxdump: Path, nodes: list[tuple[int, int]]) -> Path:
+    taxdump.mkdir()
+    (taxdump / "nodes.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\t{parent}\t|\tno rank\t|\t\t|\n" for taxid, parent in nodes
+        )
+    )
+    (taxdump / "names.dmp").write_text(
+        "".join(
+            f"{taxid}\t|\ttaxon {taxid}\t|\t\t|\tscientific name\t|\n"
+            for taxid, _ in nodes
+        )
+    )
+    return taxdump
+
+
+@pytest.mark.parametrize(
+    "nodes",
+    [
+        pytest.param([(1, 1), (2, 1), (3, 7)], id="orphan"),
+        pytest.param([(1, 1), (2, 1), (3, 4), (4, 3)], id="cycle"),
+    ],
+)
+def test_broken_tree_exits(tmp_path, nodes):
+    taxdump: Path = write_taxdump(tmp_path / "taxdump", nodes)
+    snapshot: Path = tmp_path / "taxonomy.snapshot"
+    with pytest.raises(SystemExit) as exit_info:
+        taxonomy.main([str(taxdump), str(snapshot)])
+    assert exit_info.value.code == 2
+    assert not snapshot.exists()